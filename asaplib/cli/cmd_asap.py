@@ -86,13 +86,41 @@ def select(ctx, fxyz, design_matrix,
 @click.option('--periodic/--no-periodic', 
                      help='Is the system periodic? If not specified, will infer from the XYZ file.',
                      default=True)
+@click.option('--lazy/--no-lazy',
+                     help='Stream the frames from the input file in chunks instead of keeping all of them in memory.',
+                     default=False)
+@click.option('--chunk_size', type=int,
+                     help='Number of frames to handle at a time.',
+                     show_default=True, default=1000)
+@click.option('--binary_desc/--no-binary_desc',
+                     help='Write the descriptors to a binary container next to the output xyz file, instead of inside it.',
+                     default=False)
+@click.option('--cache_dir', type=str,
+                     help='Directory of the on-disk descriptor cache. Frames already in the cache are not recomputed.',
+                     show_default=False, default=None)
+@click.option('--cache_size', type=float,
+                     help='Maximum size of the descriptor cache in MB. The least recently used entries are deleted.',
+                     show_default=True, default=10240)
+@click.option('--neighbor_skin', type=float,
+                     help='Verlet skin in Angstrom. Reuse the neighbor list of periodic SOAP between consecutive frames of a trajectory until an atom has moved more than half the skin.',
+                     show_default=False, default=None)
+@click.option('--symmetry_unique', type=float,
+                     help='Tolerance of spglib. Only compute the atomic descriptors of the symmetry-unique atoms of crystals, and copy them to the equivalent atoms.',
+                     show_default=False, default=None)
+@click.option('--append_fxyz', type=str,
+                     help='Location of xyz file(s) with new frames to append to the input.',
+                     show_default=False, default=None)
+@click.option('--resume/--no-resume', '--incremental',
+                     help='Only compute the descriptors of the frames that do not have them yet, and merge with the existing state file.',
+                     default=False)
 @click.pass_context
 @state_input_options
 @file_input_options
 @file_input_format_options
 @file_output_options
 @para_options
-def gen_desc(ctx, in_file, fxyz, fxyz_format, prefix, stride, periodic, number_processes):
+def gen_desc(ctx, in_file, fxyz, fxyz_format, prefix, stride, periodic, lazy, chunk_size, binary_desc, cache_dir, cache_size,
+             neighbor_skin, symmetry_unique, append_fxyz, resume, number_processes):
     """
     Descriptor generation command
     This command function evaluated before the descriptor specific ones,
@@ -113,8 +141,18 @@ def gen_desc(ctx, in_file, fxyz, fxyz_format, prefix, stride, periodic, number_p
         ctx.obj['data']['fxyz_format'] = fxyz_format
         ctx.obj['data']['stride'] = stride
         ctx.obj['data']['periodic'] = periodic
+        ctx.obj['data']['lazy'] = lazy
+        ctx.obj['data']['chunk_size'] = chunk_size
+    if append_fxyz is not None:
+        ctx.obj['data']['append_fxyz'] = append_fxyz
     ctx.obj['desc_options']['prefix'] = prefix
     ctx.obj['desc_options']['N_processes'] = number_processes
+    ctx.obj['desc_options']['binary_desc'] = binary_desc
+    ctx.obj['desc_options']['cache_dir'] = cache_dir
+    ctx.obj['desc_options']['cache_size'] = cache_size
+    ctx.obj['desc_options']['resume'] = resume
+    ctx.obj['desc_options']['neighbor_skin'] = neighbor_skin
+    ctx.obj['desc_options']['symmetry_unique'] = symmetry_unique
 
 @gen_desc.command('soap')
 @click.option('--cutoff', '-c', type=float, 
@@ -142,11 +180,12 @@ def gen_desc(ctx, in_file, fxyz, fxyz_format, prefix, stride, periodic, number_p
 @click.pass_context
 @desc_options
 @atomic_to_global_desc_options
+@centers_options
 def soap(ctx, tag, cutoff, nmax, lmax, atom_gaussian_width, crossover, rbf, universal_soap,
-         reducer_type, zeta, element_wise, peratom):
+         reducer_type, zeta, element_wise, peratom, center_species, center_fraction):
     """Generate SOAP descriptors"""
     # load up the xyz
-    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'])
+    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'], ctx.obj['desc_options']['N_processes'])
  
     if crossover is False:
         print("Warning: atomic species cross terms are not included! use --crossover if you want cross terms.")
@@ -167,17 +206,17 @@ def soap(ctx, tag, cutoff, nmax, lmax, atom_gaussian_width, crossover, rbf, univ
     for k in soap_spec.keys():
         soap_spec[k]['rbf'] = rbf
         soap_spec[k]['crossover'] = crossover
+    set_centers(soap_spec, center_species, center_fraction)
     # The specification for the reducers
     reducer_spec = dict(set_reducer(reducer_type, element_wise, zeta))
     # The specification for the descriptor
-    desc_spec = {}
-    for k, v in soap_spec.items():
-        desc_spec[k] = {'atomic_descriptor': dict({k: v}),
-                        'reducer_function': reducer_spec}
+    # (all the SOAP descriptors are computed together, so the periodic ones share the periodic images)
+    desc_spec = {'soap': {'atomic_descriptor': soap_spec,
+                          'reducer_function': reducer_spec}}
     # specify descriptors using the cmd line tool
     ctx.obj['descriptors'][tag] = desc_spec
     # Compute the save the descriptors
-    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options']['prefix'], peratom, ctx.obj['desc_options']['N_processes'])
+    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options'], peratom)
 
 @gen_desc.command('acsf')
 @click.option('--cutoff', '-c', type=float,
@@ -190,11 +229,12 @@ def soap(ctx, tag, cutoff, nmax, lmax, atom_gaussian_width, crossover, rbf, univ
 @click.pass_context
 @desc_options
 @atomic_to_global_desc_options
+@centers_options
 def acsf(ctx, tag, cutoff, universal_acsf,
-    reducer_type, zeta, element_wise, peratom):
+    reducer_type, zeta, element_wise, peratom, center_species, center_fraction):
     """Generate ACSF descriptors"""
     # load up the xyz
-    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'])
+    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'], ctx.obj['desc_options']['N_processes'])
             
     from asaplib.hypers import universal_acsf_hyper
     global_species = ctx.obj['asapxyz'].get_global_species()
@@ -202,6 +242,7 @@ def acsf(ctx, tag, cutoff, universal_acsf,
         acsf_spec = universal_acsf_hyper(global_species, cutoff, dump=True, verbose=False)
     else:
         acsf_spec = universal_acsf_hyper(global_species, universal_acsf, dump=True, verbose=False)
+    set_centers(acsf_spec, center_species, center_fraction)
             
     # The specification for the reducers
     reducer_spec = dict(set_reducer(reducer_type, element_wise, zeta))
@@ -212,7 +253,7 @@ def acsf(ctx, tag, cutoff, universal_acsf,
     # specify descriptors using the cmd line tool
     ctx.obj['descriptors'][tag] = desc_spec
     # Compute the save the descriptors
-    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options']['prefix'], peratom, ctx.obj['desc_options']['N_processes'])
+    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options'], peratom)
 
 
 @gen_desc.command('cm')
@@ -221,20 +262,20 @@ def acsf(ctx, tag, cutoff, universal_acsf,
 def cm(ctx, tag):
     """Generate the Coulomb Matrix descriptors"""
     # load up the xyz
-    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'])
+    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'], ctx.obj['desc_options']['N_processes'])
     # The specification for the descriptor
     ctx.obj['descriptors'][tag] = {'cm':{'type': "CM"}}
     # Compute the save the descriptors
-    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options']['prefix'], False, ctx.obj['desc_options']['N_processes'])
+    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options'], False)
 
 @gen_desc.command('run')
 @click.pass_context
 def run(ctx):
     """ Running analysis using input files """
     # load up the xyz
-    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'])
+    ctx.obj['asapxyz'] = load_asapxyz(ctx.obj['data'], ctx.obj['desc_options']['N_processes'])
     # Compute the save the descriptors
-    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options']['prefix'])
+    output_desc(ctx.obj['asapxyz'], ctx.obj['descriptors'], ctx.obj['desc_options'])
 
 @asap.group('cluster', chain=True)
 @click.pass_context
@@ -551,7 +592,7 @@ def skpca(ctx, scale, dimension, axes,
     reduce_dict['skpca'] = {"type": 'SPARSE_KPCA', 
                             'parameter':{"n_components": dimension, 
                                          "sparse_mode": sparse_mode, "n_sparse": n_sparse,
-                                "kernel": {"first_kernel": {"type": kernel, "d": kernel_parameter}}}}
+                                "kernel": set_kernel(kernel, kernel_parameter)}}
     map_process(ctx.obj, reduce_dict, axes, map_name)
 
 @map.command('umap')
@@ -689,7 +730,7 @@ def ridge(ctx, sigma):
 def kernelridge(ctx, sigma, kernel, kernel_parameter, sparse_mode, n_sparse):
     """Kernel Ridge Regression (with sparsification)"""
     from asaplib.fit import SPARSE_KRR_Wrapper, KRRSparse
-    k_spec = {"first_kernel": {"type": kernel, "d": kernel_parameter}}
+    k_spec = set_kernel(kernel, kernel_parameter)
     krr = KRRSparse(0., None, sigma)
     skrr = SPARSE_KRR_Wrapper(k_spec, krr, sparse_mode=sparse_mode, n_sparse=n_sparse)
     # fit the model
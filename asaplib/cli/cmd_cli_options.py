@@ -95,6 +95,16 @@ def atomic_to_global_desc_options(f):
                      show_default=True, default=False, is_flag=True)(f)
     return f
 
+def centers_options(f):
+    """Create common options for computing the atomic descriptors of only some of the atoms"""
+    f = click.option('--center_species', '-cs', type=int, multiple=True,
+                     help='Only compute the atomic descriptors for atoms of this species (atomic number), can be used several times.',
+                     default=None)(f)
+    f = click.option('--center_fraction', type=float,
+                     help='Only compute the atomic descriptors for a random fraction of the atoms.',
+                     show_default=False, default=None)(f)
+    return f
+
 def map_setup_options(f):
     """Create common options for making 2D maps of the data set"""
     f = click.option('--peratom', 
@@ -183,10 +193,10 @@ def fit_setup_options(f):
 def kernel_options(f):
     """Create common options for compute kernel functions"""
     f = click.option('--kernel_parameter', '-kp', type=float, 
-              help='Parameter used in the kernel function.', 
+              help='Parameter used in the kernel function: the power of polynomial, the gamma of rbf and laplacian.', 
               default=None)(f)
     f = click.option('--kernel', '-k',
-              type=click.Choice(['linear', 'polynomial', 'cosine'], case_sensitive=False), 
+              type=click.Choice(['linear', 'polynomial', 'cosine', 'rbf', 'laplacian', 'tanimoto'], case_sensitive=False), 
               help='Kernel function for converting design matrix to kernel matrix.', 
               show_default=True, default='linear')(f)
     return f
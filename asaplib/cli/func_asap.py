@@ -22,9 +22,13 @@ def load_in_file(in_file):
     return state
 
 """ for load ASAPXYZ """
-def load_asapxyz(data_spec):
+def load_asapxyz(data_spec, n_process=1):
     from asaplib.data import ASAPXYZ
-    return ASAPXYZ(data_spec['fxyz'], data_spec['stride'], data_spec['periodic'], data_spec['fxyz_format'])
+    asapxyz = ASAPXYZ(data_spec['fxyz'], data_spec['stride'], data_spec['periodic'], data_spec['fxyz_format'],
+                   data_spec.get('lazy', False), data_spec.get('chunk_size', 1000), n_process)
+    if data_spec.get('append_fxyz') is not None:
+        asapxyz.append(data_spec['append_fxyz'])
+    return asapxyz
 
 """for gen_desc"""
 def set_reducer(reducer_type, element_wise, zeta):
@@ -40,18 +44,71 @@ def set_reducer(reducer_type, element_wise, zeta):
         reducer_func['zeta'] = zeta
     return reducer_func
 
-def output_desc(asapxyz, desc_spec, prefix, peratom=False, N_processes=8):
+def set_centers(atomic_desc_spec, center_species=None, center_fraction=None):
+    """
+    only compute the atomic descriptors for the atoms of some species, or for a random fraction of the atoms
+    """
+    if center_species:
+        centers = {'species': list(center_species)}
+    elif center_fraction is not None:
+        centers = {'fraction': center_fraction, 'method': 'random'}
+    else:
+        return
+    for k in atomic_desc_spec.keys():
+        atomic_desc_spec[k]['centers'] = centers
+
+"""for kernel methods"""
+def set_kernel(kernel, kernel_parameter=None):
+    """
+    setting up the kernel function that converts the design matrix into the kernel matrix,
+    the kernel_parameter is the power d of the polynomial kernel, and the gamma of the rbf and laplacian kernels
+    """
+    k_spec = {'type': kernel}
+    if kernel == 'polynomial':
+        k_spec['d'] = kernel_parameter
+    elif kernel in ['rbf', 'laplacian'] and kernel_parameter is not None:
+        k_spec['gamma'] = kernel_parameter
+    return {'first_kernel': k_spec}
+
+def output_desc(asapxyz, desc_spec, desc_options, peratom=False):
     """
     Compute and save the descriptors
+    desc_options: a dictionary with the keys
+        prefix: the prefix of the output files
+        N_processes: the number of processes
+        binary_desc: write the descriptors to a binary container next to the xyz file
+        cache_dir: the directory of the descriptor cache, None to disable the cache
+        cache_size: the maximum size of the descriptor cache in MB
+        resume: only compute the frames that do not have the descriptors yet,
+                and merge the existing state file of the same prefix
+        neighbor_skin: the Verlet skin of the neighbor list that is reused between consecutive frames, None to disable
+        symmetry_unique: the tolerance of spglib, to only compute the symmetry-unique atoms, None to disable
     """
+    prefix = desc_options['prefix']
+    N_processes = desc_options.get('N_processes', 8)
+    if desc_options.get('cache_dir') is not None:
+        from asaplib.descriptors import Descriptor_Cache
+        cache = Descriptor_Cache(desc_options['cache_dir'], desc_options.get('cache_size', 10240))
+    else:
+        cache = None
     for tag, desc in desc_spec.items():
         # compute the descripitors
         asapxyz.compute_global_descriptors(desc_spec_dict=desc,
                                        sbs=[],
                                        keep_atomic=peratom,
                                        tag=tag,
-                                       n_process=N_processes)
-    asapxyz.write(prefix)
+                                       n_process=N_processes,
+                                       cache=cache,
+                                       resume=desc_options.get('resume', False),
+                                       neighbor_skin=desc_options.get('neighbor_skin', None),
+                                       symprec=desc_options.get('symmetry_unique', None))
+    asapxyz.write(prefix, binary_desc=desc_options.get('binary_desc', False))
+    import os
+    if desc_options.get('resume', False) and os.path.isfile(prefix + '-state.yaml'):
+        # keep the descriptors recorded in the previous run
+        previous_state = load_in_file(prefix + '-state.yaml')
+        for tag, desc in previous_state.get('descriptors', {}).items():
+            asapxyz.computed_desc_dict['descriptors'].setdefault(tag, desc)
     asapxyz.save_state(prefix)
 
 """ for maps and fits """
@@ -73,7 +130,11 @@ def read_xyz_n_dm(fxyz, design_matrix, use_atomic_descriptors, only_use_species,
     if os.path.isfile(design_matrix[0]):
         try:
             import numpy as np
-            dm = np.genfromtxt(design_matrix[0], dtype=float)
+            if design_matrix[0].endswith('.npy'):
+                # no need to parse, the matrix is memory-mapped
+                dm = np.load(design_matrix[0], mmap_mode='r')
+            else:
+                dm = np.genfromtxt(design_matrix[0], dtype=float)
             print("loaded the descriptor matrix from file: ", design_matrix[0])
         except:
             raise ValueError('Cannot load the descriptor matrix from file')
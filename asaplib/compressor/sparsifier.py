@@ -54,6 +54,8 @@ class Sparsifier:
             raise ValueError("the sparsification ratio/number should be a float or int.")
  
         self._check(n_sparse, n_total)
+        if input_desc and self.sparse_mode in ['fps', 'cur'] and getattr(desc, 'dtype', None) == 'uint64':
+            raise ValueError("fps and cur cannot use packed fingerprints (np.uint64 words), use random or sequential.")
 
         if self.sparse_mode == 'fps':
             if not input_desc: 
@@ -1,2 +1,3 @@
 from .xyz import *
 from .design_matrix import *
+from .descriptor_store import *
@@ -0,0 +1,345 @@
+"""
+Columnar storage of the descriptors computed for a data set
+"""
+
+import numpy as np
+
+
+class Atomic_Descriptor_Store:
+    def __init__(self, natom_list, atomic_numbers=None):
+        """
+        Stores the atomic descriptors of all the frames in a CSR-like layout:
+        one contiguous array [total_natoms, n_desc] for each acronym, with the rows of frame i
+        being frame_offsets[i]:frame_offsets[i+1].
+        Selecting the atomic descriptors of a frame is a view of the array,
+        and selecting the ones of a species uses a cached index of the rows.
+
+        Parameters
+        ----------
+        natom_list: a list of int, the number of atoms in each frame
+        atomic_numbers: np.array [total_natoms], the atomic number of each atom.
+                        Can also be filled frame by frame using set_atomic_numbers.
+        """
+        self.nframes = len(natom_list)
+        self.frame_offsets = np.zeros(self.nframes + 1, dtype=np.int64)
+        self.frame_offsets[1:] = np.cumsum(natom_list)
+        self.total_natoms = int(self.frame_offsets[-1])
+
+        # the species index: the atomic number of each atom, 0 means that it is not known yet
+        self.atomic_numbers = np.zeros(self.total_natoms, dtype=np.int64)
+        self._known_frames = np.zeros(self.nframes, dtype=bool)
+        if atomic_numbers is not None:
+            self.atomic_numbers[:] = atomic_numbers
+            self._known_frames[:] = True
+        self._species_rows = {}
+
+        self.blocks = {} # acronym -> np.array [total_natoms, n_desc]
+        self.filled = {} # acronym -> np.array of bool [nframes], which frames have been computed
+
+    def frame_slice(self, i):
+        return slice(self.frame_offsets[i], self.frame_offsets[i + 1])
+
+    def extend(self, natom_list, atomic_numbers=None):
+        """
+        add new frames, which are marked as not computed for all the acronyms
+
+        Parameters
+        ----------
+        natom_list: a list of int, the number of atoms in each new frame
+        atomic_numbers: np.array, the atomic numbers of the atoms in the new frames, or None if they are not known yet
+        """
+        n_new, natoms_new = len(natom_list), int(np.sum(natom_list))
+        self.frame_offsets = np.concatenate([self.frame_offsets, self.total_natoms + np.cumsum(natom_list, dtype=np.int64)])
+        self.atomic_numbers = np.concatenate([self.atomic_numbers,
+                                              np.zeros(natoms_new, dtype=np.int64) if atomic_numbers is None else atomic_numbers])
+        self._known_frames = np.concatenate([self._known_frames, np.full(n_new, atomic_numbers is not None)])
+        self._species_rows = {}
+        for acronym, block in self.blocks.items():
+            self.blocks[acronym] = np.concatenate([block, np.zeros((natoms_new,) + block.shape[1:], dtype=block.dtype)])
+            self.filled[acronym] = np.concatenate([self.filled[acronym], np.zeros(n_new, dtype=bool)])
+        self.nframes += n_new
+        self.total_natoms += natoms_new
+
+    def set_atomic_numbers(self, i, numbers):
+        if not self._known_frames[i]:
+            self.atomic_numbers[self.frame_slice(i)] = numbers
+            self._known_frames[i] = True
+            self._species_rows = {}
+
+    def missing_atomic_numbers(self):
+        """the frames for which the atomic numbers have not been recorded"""
+        return np.flatnonzero(~self._known_frames).tolist()
+
+    def species_rows(self, species_name):
+        """the (cached) indices of the rows that belong to atoms of the species"""
+        if len(self.missing_atomic_numbers()) > 0:
+            raise ValueError("The atomic numbers of some of the frames are not known.")
+        if species_name not in self._species_rows:
+            self._species_rows[species_name] = np.flatnonzero(self.atomic_numbers == species_name)
+        return self._species_rows[species_name]
+
+    def acronyms(self):
+        return list(self.blocks.keys())
+
+    def frame_acronyms(self, i):
+        """the acronyms of the atomic descriptors available for frame i"""
+        return [acronym for acronym in self.blocks.keys() if self.filled[acronym][i]]
+
+    def is_complete(self, acronym, sbs=None):
+        """whether the atomic descriptor has been computed for all the (selected) frames"""
+        if acronym not in self.blocks:
+            return False
+        if sbs is None:
+            return bool(np.all(self.filled[acronym]))
+        return bool(np.all(self.filled[acronym][sbs]))
+
+    def set_frame(self, i, acronym, desc):
+        """store the atomic descriptors [natoms, n_desc] of frame i"""
+        desc = np.asarray(desc)
+        if acronym not in self.blocks or self.blocks[acronym].shape[1:] != desc.shape[1:]:
+            # np.zeros does not touch the memory of the frames that are never filled
+            self.blocks[acronym] = np.zeros((self.total_natoms,) + desc.shape[1:], dtype=desc.dtype)
+            self.filled[acronym] = np.zeros(self.nframes, dtype=bool)
+        elif not self.blocks[acronym].flags.writeable:
+            # e.g. memory-mapped from a descriptor container
+            self.blocks[acronym] = np.array(self.blocks[acronym])
+        self.blocks[acronym][self.frame_slice(i)] = desc
+        self.filled[acronym][i] = True
+
+    def set_all(self, acronym, desc):
+        """store the atomic descriptors [total_natoms, n_desc] of all the frames, without copying"""
+        desc = np.asanyarray(desc)
+        if len(desc) != self.total_natoms:
+            raise ValueError('The length of the atomic descriptor matrix is not the same as the total number of atoms.')
+        self.blocks[acronym] = desc
+        self.filled[acronym] = np.ones(self.nframes, dtype=bool)
+
+    def frame_rows(self, sbs):
+        """the rows of the atoms of the selected frames, in the order of sbs"""
+        sbs = np.asarray(sbs, dtype=np.int64)
+        starts = self.frame_offsets[sbs]
+        lengths = self.frame_offsets[sbs + 1] - starts
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(np.sum(lengths))
+
+    def set_frames(self, sbs, acronym, desc):
+        """
+        store the atomic descriptors of several frames at once
+
+        Parameters
+        ----------
+        sbs: array, integer
+        acronym: str, the array must have been set up already, e.g. by set_frame
+        desc: np.array [n_atoms of the selected frames, n_desc], the atoms of the frames in the order of sbs
+        """
+        if not self.blocks[acronym].flags.writeable:
+            self.blocks[acronym] = np.array(self.blocks[acronym])
+        self.blocks[acronym][self.frame_rows(sbs)] = desc
+        self.filled[acronym][sbs] = True
+
+    def get_frame(self, i, acronym):
+        """a view of the atomic descriptors of frame i"""
+        return self.blocks[acronym][self.frame_slice(i)]
+
+    def get(self, acronym, species_name=None):
+        """
+        the atomic descriptors of all the frames
+
+        Parameters
+        ----------
+        acronym: str
+        species_name: int, only return the rows of atoms of this species
+
+        Returns
+        -------
+        np.array [n_atoms, n_desc]. A view of the store if species_name is None.
+        """
+        if not self.is_complete(acronym):
+            raise ValueError("The atomic descriptor " + str(acronym) + " has not been computed for all the frames.")
+        if species_name is None:
+            return self.blocks[acronym]
+        return np.take(self.blocks[acronym], self.species_rows(species_name), axis=0)
+
+    def remove(self, acronym):
+        self.blocks.pop(acronym, None)
+        self.filled.pop(acronym, None)
+
+
+class Global_Descriptor_Store:
+    def __init__(self, nframes):
+        """
+        Stores the global descriptors of all the frames.
+        Each key (the name given in the descriptor specifications) has one preallocated array [nframes, n_desc],
+        the descriptors with different acronyms under the same key (e.g. element-wise reducers)
+        sit side by side, at the column offsets recorded in self.columns.
+
+        Parameters
+        ----------
+        nframes: int, the number of frames
+        """
+        self.nframes = nframes
+        self.blocks = {} # key -> np.array [nframes, n_desc]
+        self.columns = {} # key -> {acronym: (start, stop)}
+        self.filled = {} # key -> np.array of bool [nframes], which frames have been computed
+
+    def keys(self):
+        return list(self.blocks.keys())
+
+    def extend(self, n_new):
+        """add n_new frames, which are marked as not computed for all the keys"""
+        for key, block in self.blocks.items():
+            self.blocks[key] = np.concatenate([block, np.zeros((n_new,) + block.shape[1:], dtype=block.dtype)])
+            self.filled[key] = np.concatenate([self.filled[key], np.zeros(n_new, dtype=bool)])
+        self.nframes += n_new
+
+    def is_complete(self, key, sbs=None):
+        """whether the descriptors of the key have been computed for all the (selected) frames"""
+        if key not in self.blocks:
+            return False
+        if sbs is None:
+            return bool(np.all(self.filled[key]))
+        return bool(np.all(self.filled[key][sbs]))
+
+    def find(self, acronym):
+        """the key and the columns that hold the descriptor with this acronym"""
+        for key, columns in self.columns.items():
+            if acronym in columns:
+                return key, columns[acronym]
+        raise KeyError(acronym)
+
+    def acronyms(self):
+        return [acronym for columns in self.columns.values() for acronym in columns.keys()]
+
+    def has_acronym(self, acronym, sbs=None):
+        """whether the descriptor with this acronym has been computed for all the (selected) frames"""
+        try:
+            key, _ = self.find(acronym)
+        except KeyError:
+            return False
+        return self.is_complete(key, sbs)
+
+    def set_frame(self, i, key, acronym_desc_list):
+        """
+        store the global descriptors of frame i
+
+        Parameters
+        ----------
+        i: int, the index of the frame
+        key: str
+        acronym_desc_list: a list of (acronym, np.array [n_desc]), stored side by side in this order
+        """
+        acronym_desc_list = [(acronym, np.ravel(desc)) for acronym, desc in acronym_desc_list]
+        self._prepare(key, acronym_desc_list)
+        block, columns = self.blocks[key], self.columns[key]
+        for acronym, desc in acronym_desc_list:
+            start, stop = columns[acronym]
+            block[i, start:stop] = desc
+        self.filled[key][i] = True
+
+    def _prepare(self, key, acronym_desc_list):
+        """make sure there is a writable array for the key, with the columns of these acronyms"""
+        if key not in self.blocks or list(self.columns[key].keys()) != [acronym for acronym, _ in acronym_desc_list]:
+            # first frame of this key (or the key is reused for another descriptor): preallocate all the rows
+            columns, start = {}, 0
+            for acronym, desc in acronym_desc_list:
+                columns[acronym] = (start, start + np.shape(desc)[-1])
+                start += np.shape(desc)[-1]
+            dtypes = [np.asarray(desc).dtype for _, desc in acronym_desc_list]
+            if np.uint64 in dtypes and any(dtype != np.uint64 for dtype in dtypes):
+                # the packed fingerprints would be turned into floats
+                raise ValueError("The packed fingerprints cannot be stored together with other descriptors under " + str(key))
+            dtype = np.result_type(*dtypes)
+            self.blocks[key] = np.zeros((self.nframes, start), dtype=dtype)
+            self.columns[key] = columns
+            self.filled[key] = np.zeros(self.nframes, dtype=bool)
+        elif not self.blocks[key].flags.writeable:
+            # e.g. memory-mapped from a descriptor container
+            self.blocks[key] = np.array(self.blocks[key])
+
+    def set_acronym_frames(self, sbs, key, acronym_desc_list):
+        """
+        store the global descriptors of several frames at once, acronym by acronym
+
+        Parameters
+        ----------
+        sbs: array, integer
+        key: str
+        acronym_desc_list: a list of (acronym, np.array [len(sbs), n_desc]), stored side by side in this order
+        """
+        self._prepare(key, acronym_desc_list)
+        block, columns = self.blocks[key], self.columns[key]
+        for acronym, desc in acronym_desc_list:
+            start, stop = columns[acronym]
+            block[sbs, start:stop] = desc
+        self.filled[key][sbs] = True
+
+    def set_frames(self, sbs, key, desc):
+        """
+        store the global descriptors of several frames at once
+
+        Parameters
+        ----------
+        sbs: array, integer
+        key: str, the array must have been set up already, e.g. by set_frame
+        desc: np.array [len(sbs), n_desc], with the acronyms side by side as in self.columns[key]
+        """
+        if not self.blocks[key].flags.writeable:
+            self.blocks[key] = np.array(self.blocks[key])
+        self.blocks[key][sbs] = desc
+        self.filled[key][sbs] = True
+
+    def set_all(self, key, desc):
+        """store the descriptors [nframes] or [nframes, n_desc] of all the frames, under an acronym equal to the key"""
+        desc = np.asanyarray(desc)
+        if len(desc) != self.nframes:
+            raise ValueError('The length of the descriptor matrix is not the same as the number of frames.')
+        self.remove(key)
+        self.blocks[key] = desc
+        self.columns[key] = {key: None}
+        self.filled[key] = np.ones(self.nframes, dtype=bool)
+
+    def get_frame(self, i):
+        """a list of (acronym, descriptors) of frame i"""
+        desc_list = []
+        for key, block in self.blocks.items():
+            if not self.filled[key][i]: continue
+            for acronym, span in self.columns[key].items():
+                desc_list.append((acronym, block[i] if span is None else block[i, span[0]:span[1]]))
+        return desc_list
+
+    def get(self, keys, sbs=None):
+        """
+        the design matrix of the selected keys
+
+        Parameters
+        ----------
+        keys: a list of str
+        sbs: array, integer. None means all the frames
+
+        Returns
+        -------
+        np.array [n_frames, n_desc]. A view of the store if there is a single key and no selection.
+        """
+        for key in keys:
+            if not self.is_complete(key, sbs):
+                raise ValueError("The global descriptor " + str(key) + " has not been computed for the selected frames.")
+        if len(set(self.blocks[key].dtype == np.uint64 for key in keys)) > 1:
+            raise ValueError("The packed fingerprints cannot be combined with other descriptors into one design matrix.")
+        if len(keys) == 1 and self.blocks[keys[0]].ndim == 2:
+            block = self.blocks[keys[0]]
+            return block if sbs is None else block[sbs]
+        if sbs is None:
+            return np.column_stack([self.blocks[key] for key in keys])
+        return np.column_stack([self.blocks[key][sbs] for key in keys])
+
+    def get_acronym(self, acronym, sbs=None):
+        """the descriptors [n_frames, n_desc] with this acronym, as a view if sbs is None"""
+        key, span = self.find(acronym)
+        if not self.is_complete(key, sbs):
+            raise ValueError("The global descriptor " + str(acronym) + " has not been computed for the selected frames.")
+        block = self.blocks[key] if sbs is None else self.blocks[key][sbs]
+        return block if span is None else block[:, span[0]:span[1]]
+
+    def remove(self, key):
+        self.blocks.pop(key, None)
+        self.columns.pop(key, None)
+        self.filled.pop(key, None)
@@ -0,0 +1,103 @@
+"""
+Worker side of the parallel computation of descriptors:
+each worker gets a contiguous block of frames and writes the results straight into shared output arrays
+"""
+
+import json
+
+import numpy as np
+
+# the descriptor objects built in this (worker) process, so the DScribe objects are made once per worker
+_engines = {}
+
+
+def split_global_desc(desc_dict_now):
+    """
+    flatten the dictionary of computed global descriptors of a frame
+
+    Returns
+    -------
+    {key: a list of (acronym, descriptors)}
+    """
+    global_entries = {}
+    for e in desc_dict_now.keys():
+        if 'acronym' in desc_dict_now[e]:
+            global_entries[e] = [(desc_dict_now[e]['acronym'], desc_dict_now[e]['descriptors'])]
+        else:
+            # if we use atomic to global descriptor, this is a nested dictionary
+            global_entries[e] = [(desc_dict_now[e][e2][e3]['acronym'], desc_dict_now[e][e2][e3]['descriptors'])
+                                 for e2 in desc_dict_now[e].keys() for e3 in desc_dict_now[e][e2].keys()]
+    return global_entries
+
+
+def split_atomic_desc(atomic_desc_dict_now):
+    """a list of (acronym, atomic descriptors) from the dictionary of computed atomic descriptors of a frame"""
+    return [(atomic_desc_dict_now[e]['acronym'], atomic_desc_dict_now[e]['atomic_descriptors'])
+            for e in atomic_desc_dict_now.keys()]
+
+
+def split_result(result, kind, keep_atomic=True):
+    """
+    flatten the output of Global_Descriptors.compute (kind='global') or Atomic_Descriptors.compute (kind='atomic')
+
+    Returns
+    -------
+    global_entries: {key: a list of (acronym, descriptors)}
+    atomic_entries: a list of (acronym, atomic descriptors)
+    """
+    if kind == 'atomic':
+        return {}, split_atomic_desc(result)
+    desc_dict_now, atomic_desc_dict_now = result
+    atomic_entries = []
+    if keep_atomic:
+        for e in atomic_desc_dict_now.keys():
+            atomic_entries += split_atomic_desc(atomic_desc_dict_now[e])
+    return split_global_desc(desc_dict_now), atomic_entries
+
+
+def _get_engine(engine_class, packed_spec):
+    key = (engine_class.__name__, packed_spec)
+    if key not in _engines:
+        _engines[key] = engine_class(json.loads(packed_spec))
+    return _engines[key]
+
+
+def compute_block(engine_class, packed_spec, kind, keep_atomic, frames, row_start, atom_offsets,
+                  global_out, atomic_out, cache=None, cache_keys=None, neighbor_skin=None):
+    """
+    compute the descriptors of a contiguous block of frames, and write them into the shared output arrays
+
+    Parameters
+    ----------
+    engine_class: Global_Descriptors or Atomic_Descriptors
+    packed_spec: str, the output of .pack() of the descriptor object
+    kind: 'global' or 'atomic'
+    keep_atomic: bool, write the atomic descriptors of global descriptors
+    frames: a list of ASE atom objects
+    row_start: int, the row of global_out for the first frame
+    atom_offsets: array [len(frames)+1], the rows of atomic_out for the atoms of each frame
+    global_out: {key: np.memmap [n_frames, n_desc]}
+    atomic_out: {acronym: np.memmap [n_atoms, n_desc]}
+    cache: a Descriptor_Cache object, to store the results
+    cache_keys: the cache keys of the frames
+    neighbor_skin: float, reuse the neighbor list between the consecutive frames of the block
+
+    Returns
+    -------
+    the number of frames computed
+    """
+    engine = _get_engine(engine_class, packed_spec)
+    engine.set_neighbor_skin(neighbor_skin)
+    # without keep_atomic, the atomic descriptors are reduced and discarded here, and never leave the worker
+    options = {'keep_atomic': keep_atomic} if kind == 'global' else {}
+    for k, result in enumerate(engine.compute_batch(frames, use_cache=False, **options)):
+        if cache is not None:
+            cache.store(cache_keys[k], result)
+        global_entries, atomic_entries = split_result(result, kind, keep_atomic)
+        for key, acronym_desc_list in global_entries.items():
+            global_out[key][row_start + k] = np.concatenate([np.ravel(desc) for _, desc in acronym_desc_list])
+        for acronym, desc in atomic_entries:
+            atomic_out[acronym][atom_offsets[k]:atom_offsets[k + 1]] = desc
+    for out in list(global_out.values()) + list(atomic_out.values()):
+        out.flush()
+    return len(frames)
@@ -1,19 +1,26 @@
 import os
 import glob
 import json
+import shutil
+import tempfile
 from yaml import dump as ydump
 from yaml import Dumper
 import numpy as np
 from ase import Atoms
-from ase.io import read, write
+from ase.io import read, iread, write
 from tqdm.auto import tqdm
 from joblib import Parallel, delayed
 
-from ..io import randomString,  NpEncoder
-from ..descriptors import Atomic_Descriptors, Global_Descriptors
+from ..io import randomString,  NpEncoder, XYZ_Index, get_equivalent_atoms, compute_symmetry
+from ..io import DESC_CONTAINER_SUFFIX, Descriptor_Container_Writer, desc_container_path, load_desc_container
+from ..io import desc_container_is_current, remove_desc_container
+from ..descriptors import Atomic_Descriptors, Global_Descriptors, Atomic_2_Global_Descriptors
+from ..descriptors import is_packed_acronym, packed_to_xyz, packed_from_xyz
+from .descriptor_store import Atomic_Descriptor_Store, Global_Descriptor_Store
+from .parallel_compute import compute_block, split_result
 
 class ASAPXYZ:
-    def __init__(self, fxyz=None, stride=1, periodic=True, fileformat=None):
+    def __init__(self, fxyz=None, stride=1, periodic=True, fileformat=None, lazy=False, chunk_size=1000, n_process=1):
         """extended xyz class
 
         Parameters
@@ -22,6 +29,12 @@ class ASAPXYZ:
         fmat: string_like, the name of the descriptors in the extended xyz file
         use_atomic_desc: bool, return the descriptors for each atom, read from the xyz file
         stride: int, the stride when reading the xyz file
+        lazy: bool, do not keep the frames in memory, but stream them from the input file(s) when needed.
+              For extended xyz files a sidecar index with the byte offset of each frame is built (or reused),
+              so that the frames can be accessed randomly without parsing the whole file.
+        chunk_size: int, the number of frames handled at a time when iterating over the frames
+        n_process: int, the number of processes used for parsing extended xyz files.
+                   Each file is split into blocks on frame boundaries, and the blocks are parsed in parallel.
         """
         # compile a list of matching xyz files
         # in fact they don't strictly need to be xyz format, anything that can be read by ASE is fine
@@ -39,6 +52,10 @@ class ASAPXYZ:
             self.fileformat = ast.literal_eval(fileformat)
         else:
             self.fileformat = {}
+        # streaming mode
+        self.lazy = lazy
+        self.chunk_size = max(1, int(chunk_size))
+        self.n_process = n_process
 
         # store the xyz file
         self.frames = None
@@ -53,43 +70,289 @@ class ASAPXYZ:
         # the conversion between tag of the descriptors and their acronyms
         self.tag_to_acronym = {'global':{}, 'atomic':{}}
 
-        # we make a dictionary to store the computed descriptors
-        self.global_desc = {}
-        # this is for the atomic ones
-        self.atomic_desc = {}
+        # we make a store for the computed descriptors, with one [nframes, n_desc] array per key (see Global_Descriptor_Store)
+        self.global_desc = None
+        # this is for the atomic ones, stored as one contiguous array per acronym (see Atomic_Descriptor_Store)
+        self.atomic_desc = None
+        # in the lazy mode the frames are not kept, so removals are applied when writing
+        self._removed_desc = []
+        self._removed_atomic_desc = []
+        # the byte-offset index of each input file, and the (file, frame in file) of each frame
+        self._xyz_index = []
+        self._frame_location = []
 
         # try to read the xyz file
         try:
-            if isinstance(self.fxyz, (tuple, list)):
+            if self.lazy and self._load_index():
+                # all the metadata is in the index, no need to parse the frames at all
+                frame_iter = []
+                all_species = set(self.global_species)
+            elif self.lazy:
+                # only a single pass to collect the metadata, the frames are thrown away
+                frame_iter = self._stream_frames()
+            elif self.n_process > 1 and all(XYZ_Index.is_indexable(f, self.fileformat) for f in self._input_files()):
+                # parse blocks of each file in a pool of processes
                 self.frames = []
-                for f in self.fxyz:
-                    self.frames += read(f, slice(0, None, self.stride), **self.fileformat)
-            else: 
-                self.frames = read(self.fxyz, slice(0, None, self.stride), **self.fileformat)
+                for f in self._input_files():
+                    xyz_index = XYZ_Index(f, self.fileformat)
+                    self.frames += xyz_index.read_frames(range(0, xyz_index.get_num_frames(), self.stride), self.n_process)
+                frame_iter = self.frames
+            else:
+                if isinstance(self.fxyz, (tuple, list)):
+                    self.frames = []
+                    for f in self.fxyz:
+                        self.frames += read(f, slice(0, None, self.stride), **self.fileformat)
+                else:
+                    self.frames = read(self.fxyz, slice(0, None, self.stride), **self.fileformat)
+                frame_iter = self.frames
+            if not self._xyz_index:
+                all_species = set()
+            atomic_numbers = []
+            for i, frame in enumerate(frame_iter):
+                # record the total number of atoms
+                self.natom_list.append(len(frame.get_positions()))
+                atomic_numbers.append(frame.get_atomic_numbers())
+                all_species.update(atomic_numbers[-1])
+                self._prepare_frame(frame)
         except:
             raise ValueError('Exception occurred when loading the input file')
 
-        self.nframes = len(self.frames)
-        all_species = []
-        for i, frame in enumerate(self.frames):
-            # record the total number of atoms
-            self.natom_list.append(len(frame.get_positions()))
-            all_species.extend(frame.get_atomic_numbers())
-            if not self.periodic or not np.sum(frame.get_cell()) > 0:
-                frame.set_pbc([False, False, False])
-            # we also initialize the descriptor dictionary for each frame
-            self.global_desc[i] = {}
-            self.atomic_desc[i] = {}
+        # with the index the atomic numbers are only recorded when the frames are parsed
+        if self._xyz_index:
+            self.atomic_desc = Atomic_Descriptor_Store(self.natom_list)
+        else:
+            self.atomic_desc = Atomic_Descriptor_Store(self.natom_list, np.concatenate(atomic_numbers))
 
+        self.nframes = len(self.natom_list)
+        self.global_desc = Global_Descriptor_Store(self.nframes)
         self.total_natoms = np.sum(self.natom_list)
         self.max_atoms = max(self.natom_list)
         # Keep things in plain python for serialisation
-        self.global_species = np.unique(all_species).tolist()
+        self.global_species = np.unique(list(all_species)).tolist()
         print('load xyz file: ', self.fxyz,
               ', a total of ', str(self.nframes), 'frames',
               ', a total of ', str(self.total_natoms), 'atoms',
               ', with elements: ', self.global_species,'.')
 
+        # the descriptors may have been saved in a binary container next to the xyz file
+        self._load_desc_container()
+
+    def _load_desc_container(self):
+        """memory-map the descriptors from the binary container of the input file, if there is one"""
+        if isinstance(self.fxyz, (tuple, list)) or self.stride != 1:
+            return
+        path = desc_container_path(self.fxyz)
+        if not os.path.isdir(path):
+            return
+        manifest, global_desc, atomic_desc = load_desc_container(path)
+        if not desc_container_is_current(manifest, self.fxyz) \
+                or manifest['nframes'] != self.nframes or manifest['total_natoms'] != self.total_natoms:
+            print("Warning: the descriptor container ", path, " does not match the xyz file and is ignored.")
+            return
+        for acronym, desc in global_desc.items():
+            self.global_desc.set_all(acronym, desc)
+        for acronym, desc in atomic_desc.items():
+            self.atomic_desc.set_all(acronym, desc)
+        for k, v in manifest['computed_desc_dict'].items():
+            if isinstance(v, dict):
+                self.computed_desc_dict.setdefault(k, {}).update(v)
+            else:
+                self.computed_desc_dict[k] = v
+        for kind in ['global', 'atomic']:
+            self.tag_to_acronym[kind].update(manifest['tag_to_acronym'].get(kind, {}))
+        print("Load the descriptors from the binary container: ", path)
+
+    def append(self, frames_or_file):
+        """
+        append new frames to the data set.
+        The descriptors computed so far are kept, and the new frames are marked as not computed,
+        so they can be filled in with compute_*_descriptors(..., resume=True)
+
+        Parameters
+        ----------
+        frames_or_file: a list of ASE atom objects, or the path of a file (wildcards are allowed).
+                        In the lazy mode only files can be appended.
+        """
+        if isinstance(frames_or_file, (str, os.PathLike)):
+            new_files = glob.glob(str(frames_or_file)) if '*' in str(frames_or_file) else [str(frames_or_file)]
+        elif self.lazy:
+            raise ValueError("Only files can be appended in the lazy mode.")
+        else:
+            new_files = []
+
+        natom_list, atomic_numbers = [], []
+        if self.lazy:
+            if self._xyz_index and not all(XYZ_Index.is_indexable(f, self.fileformat) for f in new_files):
+                raise ValueError("The appended files cannot be indexed like the other input files.")
+            for f in new_files:
+                if self._xyz_index:
+                    xyz_index = XYZ_Index(f, self.fileformat)
+                    frame_ids = range(0, xyz_index.get_num_frames(), self.stride)
+                    self._frame_location += [(len(self._xyz_index), j) for j in frame_ids]
+                    self._xyz_index.append(xyz_index)
+                    natom_list += xyz_index.natoms[frame_ids].tolist()
+                else:
+                    for frame in iread(f, slice(0, None, self.stride), **self.fileformat):
+                        natom_list.append(len(frame))
+                        atomic_numbers.append(frame.get_atomic_numbers())
+        else:
+            if len(new_files) > 0:
+                new_frames = []
+                for f in new_files:
+                    new_frames += read(f, slice(0, None, self.stride), **self.fileformat)
+            else:
+                new_frames = list(frames_or_file)
+            for frame in new_frames:
+                self._prepare_frame(frame)
+                natom_list.append(len(frame))
+                atomic_numbers.append(frame.get_atomic_numbers())
+            self.frames += new_frames
+        if len(new_files) > 0:
+            self.fxyz = list(self._input_files()) + new_files
+
+        if self._xyz_index:
+            # the atomic numbers are recorded when the frames are parsed
+            self.atomic_desc.extend(natom_list)
+            species = set()
+            for xyz_index in self._xyz_index[len(self._xyz_index) - len(new_files):]:
+                species.update(np.asarray(xyz_index.species)[xyz_index.species_count[::self.stride].sum(axis=0) > 0].tolist())
+        else:
+            self.atomic_desc.extend(natom_list, np.concatenate(atomic_numbers) if len(atomic_numbers) > 0 else None)
+            species = set(np.unique(np.concatenate(atomic_numbers)).tolist()) if len(atomic_numbers) > 0 else set()
+        self.global_desc.extend(len(natom_list))
+
+        self.natom_list = list(self.natom_list) + natom_list
+        self.nframes = len(self.natom_list)
+        self.total_natoms = np.sum(self.natom_list)
+        self.max_atoms = max(self.natom_list)
+        self.global_species = sorted(set(self.global_species) | species)
+        print('append ', len(natom_list), ' frames, now a total of ', str(self.nframes), 'frames',
+              ', a total of ', str(self.total_natoms), 'atoms',
+              ', with elements: ', self.global_species,'.')
+
+    def _prepare_frame(self, frame):
+        """set the periodic boundary conditions of a freshly loaded frame"""
+        if not self.periodic or not np.sum(frame.get_cell()) > 0:
+            frame.set_pbc([False, False, False])
+        return frame
+
+    def _input_files(self):
+        if isinstance(self.fxyz, (tuple, list)):
+            return self.fxyz
+        else:
+            return [self.fxyz]
+
+    def _load_index(self):
+        """
+        load (or build) the byte-offset index of the input files,
+        and use it to set up the number of frames, atoms and species.
+        Returns False if any of the input files cannot be indexed.
+        """
+        if not all(XYZ_Index.is_indexable(f, self.fileformat) for f in self._input_files()):
+            return False
+        species = set()
+        for file_id, f in enumerate(self._input_files()):
+            xyz_index = XYZ_Index(f, self.fileformat)
+            self._xyz_index.append(xyz_index)
+            frame_ids = range(0, xyz_index.get_num_frames(), self.stride)
+            self._frame_location += [(file_id, j) for j in frame_ids]
+            self.natom_list += xyz_index.natoms[frame_ids].tolist()
+            species.update(np.asarray(xyz_index.species)[xyz_index.species_count[frame_ids].sum(axis=0) > 0].tolist())
+        self.global_species = sorted(species)
+        return True
+
+    def _read_indexed_frames(self, sbs):
+        """parse the selected frames using the byte-offset index"""
+        frames = {}
+        for file_id, xyz_index in enumerate(self._xyz_index):
+            sbs_in_file = sorted(set(i for i in sbs if self._frame_location[i][0] == file_id))
+            if len(sbs_in_file) == 0: continue
+            frame_ids = [self._frame_location[i][1] for i in sbs_in_file]
+            frames.update(zip(sbs_in_file, xyz_index.read_frames(frame_ids, self.n_process)))
+        return [self._prepare_frame(frames[i]) for i in sbs]
+
+    def _stream_frames(self):
+        """generator that parses the input file(s) one frame at a time"""
+        for f in self._input_files():
+            for frame in iread(f, slice(0, None, self.stride), **self.fileformat):
+                yield self._prepare_frame(frame)
+
+    def iter_frames(self, sbs=[]):
+        """
+        iterate over the selected frames
+        In the lazy mode the frames are parsed from the input file on the fly.
+        The frames are visited in the order of sbs, same as in the normal mode.
+        Without a byte-offset index, a selection in increasing order is read in one pass over the input,
+        otherwise the input is read once for each chunk of the selection.
+
+        Parameters
+        ----------
+        sbs: array, integer
+
+        Returns
+        -------
+        a generator of (index, frame)
+        """
+        if len(sbs) == 0:
+            sbs = range(self.nframes)
+        if not self.lazy:
+            for i in sbs:
+                yield i, self.frames[i]
+        elif self._xyz_index:
+            sbs = list(sbs)
+            for start in range(0, len(sbs), self.chunk_size):
+                sbs_now = sbs[start:start + self.chunk_size]
+                for i, frame in zip(sbs_now, self._read_indexed_frames(sbs_now)):
+                    self.atomic_desc.set_atomic_numbers(i, frame.get_atomic_numbers())
+                    yield i, frame
+        elif np.all(np.diff(sbs) > 0):
+            selected = set(sbs)
+            last = max(sbs)
+            for i, frame in enumerate(self._stream_frames()):
+                if i in selected:
+                    yield i, frame
+                if i == last: break
+        else:
+            sbs = list(sbs)
+            for start in range(0, len(sbs), self.chunk_size):
+                sbs_now = sbs[start:start + self.chunk_size]
+                selected, last = set(sbs_now), max(sbs_now)
+                frames = {}
+                for i, frame in enumerate(self._stream_frames()):
+                    if i in selected:
+                        frames[i] = frame
+                    if i == last: break
+                for i in sbs_now:
+                    yield i, frames[i]
+
+    def iter_chunks(self, sbs=[], chunk_size=None):
+        """
+        iterate over the selected frames in chunks, so only one chunk needs to be in memory
+
+        Parameters
+        ----------
+        sbs: array, integer
+        chunk_size: int, number of frames in each chunk. Default is self.chunk_size
+
+        Returns
+        -------
+        a generator of (a list of indices, a list of frames)
+        """
+        if chunk_size is None: chunk_size = self.chunk_size
+        sbs_now, frames_now = [], []
+        for i, frame in self.iter_frames(sbs):
+            sbs_now.append(i)
+            frames_now.append(frame)
+            if len(frames_now) == chunk_size:
+                yield sbs_now, frames_now
+                sbs_now, frames_now = [], []
+        if len(frames_now) > 0:
+            yield sbs_now, frames_now
+
+    def _first_frame(self):
+        for _, frame in self.iter_frames([0]):
+            return frame
+
     def get_xyz(self):
         return self.frames
 
@@ -108,8 +371,11 @@ class ASAPXYZ:
     def get_natom_list_by_species(self, species_name=None):
         if species_name is None:
             return self.natom_list
+        elif species_name in self.global_species and self._xyz_index:
+            # no need to parse the frames
+            return [ int(self._xyz_index[file_id].get_natom_list_by_species(species_name)[j]) for file_id, j in self._frame_location]
         elif species_name in self.global_species:
-            return [ a.get_atomic_numbers().tolist().count(species_name) for a in self.frames]
+            return [ a.get_atomic_numbers().tolist().count(species_name) for _, a in self.iter_frames()]
         else:
             raise ValueError("Cannot find the specified chemical species in the data set.")
 
@@ -130,28 +396,74 @@ class ASAPXYZ:
             with open(filename+'-descriptor-acronyms.json', 'w') as jd:
                 json.dump(self.tag_to_acronym, jd, sort_keys=True, cls=NpEncoder)
 
-    def symmetrise(self, sbs=[], symprec=1e-2):
-        import spglib
+    def symmetrise(self, sbs=[], symprec=1e-2, n_process=1, cache=None):
+        """
+        find the space group of the frames, and record it in frame.info['space_group']
+
+        Parameters
+        ----------
+        sbs: array, integer
+        symprec: float, the tolerance of spglib
+        n_process: int, number of worker processes
+        cache: a Descriptor_Cache object, frames that are in the cache are not analysed again
+        """
+        if self.lazy:
+            raise ValueError("symmetrise is not supported in the lazy mode.")
         if len(sbs) == 0:
             sbs = range(self.nframes)
-        for i in sbs:
-            frame = self.frames[i]
-            frame.info['space_group'] = spglib.get_spacegroup(frame, symprec=symprec)
+        space_groups = compute_symmetry([self.frames[i] for i in sbs], 'spacegroup', symprec, n_process, cache)
+        for i, space_group in zip(sbs, space_groups):
+            self.frames[i].info['space_group'] = space_group
 
-    def standardize(self, sbs=[], symprec=1e-2):
+    def standardize(self, sbs=[], symprec=1e-2, n_process=1, cache=None):
         """
         reduce to primitive cell
+
+        Parameters
+        ----------
+        sbs: array, integer
+        symprec: float, the tolerance of spglib
+        n_process: int, number of worker processes
+        cache: a Descriptor_Cache object, frames that are in the cache are not analysed again
         """
-        import spglib
+        if self.lazy:
+            raise ValueError("standardize is not supported in the lazy mode.")
+        if len(sbs) == 0:
+            sbs = range(self.nframes)
+        cells = compute_symmetry([self.frames[i] for i in sbs], 'standardize', symprec, n_process, cache)
+        for i, cell in zip(sbs, cells):
+            # spglib gives None if it fails, and the frame is kept as it is
+            if cell is None: continue
+            lattice, scaled_positions, numbers = cell
+            self.frames[i] = Atoms(numbers=numbers, cell=lattice, scaled_positions=scaled_positions, pbc=self.frames[i].get_pbc())
+
+    def find_equivalent_atoms(self, sbs=[], symprec=1e-2):
+        """
+        record the symmetry-unique atom of each atom in frame.arrays['equivalent_atoms'],
+        and the tolerance in frame.info['equivalent_atoms_symprec']
+        """
+        if self.lazy:
+            raise ValueError("find_equivalent_atoms is not supported in the lazy mode.")
         if len(sbs) == 0:
             sbs = range(self.nframes)
         for i in sbs:
             frame = self.frames[i]
-            lattice, scaled_positions, numbers = spglib.standardize_cell(frame,
-                                                                     to_primitive=1,
-                                                                     no_idealize=1,
-                                                                     symprec=symprec)
-            self.frames[i] = Atoms(numbers=numbers, cell=lattice, scaled_positions=scaled_positions, pbc=frame.get_pbc())
+            frame.set_array('equivalent_atoms', get_equivalent_atoms(frame, symprec))
+            frame.info['equivalent_atoms_symprec'] = symprec
+
+    def _add_symmetry_to_desc_spec(self, desc_spec_dict, symprec):
+        """
+        only compute the atomic descriptors of the symmetry-unique atoms
+        Parameters
+        ----------
+        desc_spec_dict: dictionaries that specify which atomic descriptors, or which global descriptors to use.
+        symprec: float, the tolerance of spglib
+        """
+        for element in desc_spec_dict.keys():
+            if 'atomic_descriptor' in desc_spec_dict[element]:
+                self._add_symmetry_to_desc_spec(desc_spec_dict[element]['atomic_descriptor'], symprec)
+            elif 'type' in desc_spec_dict[element]:
+                desc_spec_dict[element]['symmetry_unique'] = symprec
 
     def _add_info_to_desc_spec(self, desc_spec_dict):
         """
@@ -165,7 +477,8 @@ class ASAPXYZ:
             desc_spec_dict[element]['periodic'] = self.periodic
             desc_spec_dict[element]['max_atoms'] = self.max_atoms
 
-    def compute_atomic_descriptors(self, desc_spec_dict={}, sbs=[], tag=None, n_process = 1):
+    def compute_atomic_descriptors(self, desc_spec_dict={}, sbs=[], tag=None, n_process = 1, cache=None, resume=False,
+                                   neighbor_skin=None, symprec=None):
         """
         compute the atomic descriptors for selected frames
         Parameters
@@ -178,39 +491,38 @@ class ASAPXYZ:
         }
 
         sbs: array, integer
+        cache: a Descriptor_Cache object, frames that are in the cache are not recomputed
+        resume: bool, only compute the frames that do not have the descriptors yet
+                (in the store, or in the arrays of the frames read from the xyz file)
+        neighbor_skin: float, for trajectories where consecutive frames are close: the neighbor list of the periodic
+                       SOAP descriptors is reused until an atom has moved more than half the skin (in Angstrom)
+        symprec: float, for crystals: only compute the atomic descriptors of the atoms that are unique by symmetry
+                 (found by spglib with this tolerance), and copy them to the equivalent atoms.
+                 The mapping is recorded in frame.arrays['equivalent_atoms'].
         """
 
-        if len(sbs) == 0:
-            sbs = range(self.nframes)
         if tag is None: tag = randomString(6)
 
         # add some system specific information to the list to descriptor specifications
         self._add_info_to_desc_spec(desc_spec_dict)
+        if symprec is not None:
+            self._add_symmetry_to_desc_spec(desc_spec_dict, symprec)
+            if not self.lazy: self.find_equivalent_atoms(sbs, symprec)
 
         # business!
         atomic_desc = Atomic_Descriptors(desc_spec_dict)
+        atomic_desc.set_cache(cache)
+        atomic_desc.set_neighbor_skin(neighbor_skin)
 
-        for i in sbs:
-            frame = self.frames[sbs]
-            self.atomic_desc[i].update(atomic_desc.create(frame))
-        # serial computation
-        if n_process == 1:
-            for i in tqdm(sbs):
-                frame = self.frames[i]
-                # compute atomic descriptor
-                self.atomic_desc[i].update(atomic_desc.create(frame))
-        # parallel computation
-        elif n_process >= 2:
-            results = Parallel(n_jobs=n_process, verbose=1)(delayed(atomic_desc.compute)(self.frames[i]) for i in sbs)
-            for i, atomic_desc_dict_now in enumerate(results):
-                self.atomic_desc[i].update(atomic_desc_dict_now)
-        else:
-            raise ValueError("Please set the number of processes to be a positive integer.")
+        self._compute_descriptors(atomic_desc, 'atomic', sbs, tag, n_process, True, resume)
 
         # we mark down that this descriptor has been computed
         self.computed_desc_dict[tag] =  atomic_desc.desc_spec_dict
+        if cache is not None:
+            self.computed_desc_dict['cache'] = cache.get_state()
 
-    def compute_global_descriptors(self, desc_spec_dict={}, sbs=[], keep_atomic = False, tag = None, n_process = 1):
+    def compute_global_descriptors(self, desc_spec_dict={}, sbs=[], keep_atomic = False, tag = None, n_process = 1, cache=None, resume=False,
+                                   neighbor_skin=None, symprec=None):
         """
         compute the atomic descriptors for selected frames
         Parameters
@@ -235,39 +547,296 @@ class ASAPXYZ:
                           'element_wise': element_wise}}
 
         sbs: array, integer
+        cache: a Descriptor_Cache object, frames that are in the cache are not recomputed
+        resume: bool, only compute the frames that do not have the descriptors yet
+                (in the store, or in the info/arrays of the frames read from the xyz file)
+        neighbor_skin: float, for trajectories where consecutive frames are close: the neighbor list of the periodic
+                       SOAP descriptors is reused until an atom has moved more than half the skin (in Angstrom)
+        symprec: float, for crystals: only compute the atomic descriptors of the atoms that are unique by symmetry
+                 (found by spglib with this tolerance), and copy them to the equivalent atoms.
+                 The mapping is recorded in frame.arrays['equivalent_atoms'].
         """
 
-        if len(sbs) == 0:
-            sbs = range(self.nframes)
         if tag is None: tag = randomString(6)
 
         # add some system specific information to the list to descriptor specifications
         self._add_info_to_desc_spec(desc_spec_dict)
+        if symprec is not None:
+            self._add_symmetry_to_desc_spec(desc_spec_dict, symprec)
+            if not self.lazy: self.find_equivalent_atoms(sbs, symprec)
 
         # business! Intialize a Global_Descriptors object
         global_desc = Global_Descriptors(desc_spec_dict)
+        global_desc.set_cache(cache)
+        global_desc.set_neighbor_skin(neighbor_skin)
 
-        # serial computation
-        if n_process == 1:
-            for i in tqdm(sbs):
-                frame = self.frames[i]
-                # compute atomic descriptor
-                desc_dict_now, atomic_desc_dict_now = global_desc.compute(frame)
-                self.global_desc[i].update(desc_dict_now)
-                if keep_atomic:
-                    self.atomic_desc[i].update(atomic_desc_dict_now)
-        # parallel computation
-        elif n_process >= 2:
-            results = Parallel(n_jobs=n_process, verbose=1)(delayed(global_desc.compute)(self.frames[i]) for i in sbs)
-            for i, (desc_dict_now, atomic_desc_dict_now) in enumerate(results):
-                self.global_desc[i].update(desc_dict_now)
-                if keep_atomic:
-                    self.atomic_desc[i].update(atomic_desc_dict_now)
-        else:
-            raise ValueError("Please set the number of processes to be a positive integer.")
+        self._compute_descriptors(global_desc, 'global', sbs, tag, n_process, keep_atomic, resume)
 
         # we mark down that this descriptor has been computed
         self.computed_desc_dict['descriptors'][tag] = global_desc.desc_spec_dict
+        if cache is not None:
+            self.computed_desc_dict['cache'] = cache.get_state()
+
+    def reduce_atomic_descriptors(self, desc_name_list=[], reducer_spec_dict={}, sbs=[], tag=None):
+        """
+        compute global descriptors from atomic descriptors that have already been computed (or read from the xyz file).
+        Many frames are reduced at once, in a vectorised pass over the stacked atomic descriptors.
+
+        Parameters
+        ----------
+        desc_name_list: a list of the names of the atomic descriptors
+        reducer_spec_dict: dictionaries that specify the reducer functions, e.g.
+        reducer_dict = {'first_reducer': {'reducer_type': reducer_type,
+                          'zeta': zeta,
+                          'element_wise': element_wise}}
+        sbs: array, integer
+        tag: str, the key of the global descriptors
+        """
+        if tag is None: tag = randomString(6)
+        if isinstance(desc_name_list, str):
+            desc_name_list = [desc_name_list]
+        desc_name_list = self._desc_name_with_wild_card(desc_name_list, True)
+        if len(sbs) == 0:
+            sbs = range(self.nframes)
+        sbs = np.asarray(sbs, dtype=np.int64)
+
+        for element in reducer_spec_dict.keys():
+            reducer_spec_dict[element]['species'] = self.global_species
+        reducer = Atomic_2_Global_Descriptors(reducer_spec_dict)
+        self._ensure_atomic_numbers()
+
+        self.tag_to_acronym['global'][tag] = {desc_name: {} for desc_name in desc_name_list}
+        for start in tqdm(range(0, len(sbs), self.chunk_size)):
+            sbs_now = sbs[start:start + self.chunk_size]
+            rows = self.atomic_desc.frame_rows(sbs_now)
+            natom_list = self.atomic_desc.frame_offsets[sbs_now + 1] - self.atomic_desc.frame_offsets[sbs_now]
+            acronym_desc_list = []
+            for desc_name in desc_name_list:
+                if self.atomic_desc.is_complete(desc_name, sbs_now):
+                    atomic_desc_now = self.atomic_desc.blocks[desc_name][rows]
+                else:
+                    atomic_desc_now = np.concatenate([frame.get_array(desc_name) for _, frame in self.iter_frames(sbs_now)])
+                desc_dict = reducer.compute_batch(atomic_desc_now, natom_list, self.atomic_desc.atomic_numbers[rows])
+                for element, (k_acronym, desc) in desc_dict.items():
+                    acronym_desc_list.append((desc_name + k_acronym, desc))
+                    self.tag_to_acronym['global'][tag][desc_name][element] = desc_name + k_acronym
+            self.global_desc.set_acronym_frames(sbs_now, tag, acronym_desc_list)
+
+        # we mark down that this descriptor has been computed
+        self.computed_desc_dict['descriptors'][tag] = {'atomic_descriptor': desc_name_list,
+                                                       'reducer_function': reducer.k_spec_dict}
+
+    def _compute_descriptors(self, descriptors, kind, sbs, tag, n_process, keep_atomic, resume):
+        """
+        compute the descriptors of the selected frames, and put them into the stores
+
+        Parameters
+        ----------
+        descriptors: a Global_Descriptors (kind='global') or an Atomic_Descriptors (kind='atomic') object
+        sbs: array, integer
+        tag: str
+        n_process: int, number of worker processes
+        keep_atomic: bool, keep the atomic descriptors of global descriptors
+        resume: bool, only compute the frames that do not have the descriptors yet
+        """
+        if len(sbs) == 0:
+            sbs = range(self.nframes)
+        if n_process < 1:
+            raise ValueError("Please set the number of processes to be a positive integer.")
+
+        # the atomic descriptors of global descriptors are only returned if they are kept
+        options = {'keep_atomic': keep_atomic} if kind == 'global' else {}
+
+        if resume:
+            # the acronyms are known without computing anything, so only the missing frames are computed
+            sbs = self._frames_to_resume(sbs, *self._record_acronyms(descriptors, kind, tag, keep_atomic))
+
+        layout = None
+        if n_process > 1 and len(sbs) > 0:
+            # the first frame tells us the sizes of the outputs
+            i, frame = next(self.iter_frames(sbs[:1]))
+            result = descriptors.compute(frame, **options)
+            self._store_result(i, result, kind, tag, keep_atomic)
+            layout = split_result(result, kind, keep_atomic)
+            sbs = sbs[1:]
+
+        # work on one chunk of frames at a time, so that the memory is bounded
+        with tqdm(total=len(sbs)) as pbar, Parallel(n_jobs=n_process) as parallel:
+            # (an empty selection would mean all the frames in iter_chunks)
+            for sbs_now, frames_now in (self.iter_chunks(sbs) if len(sbs) > 0 else []):
+                # serial computation
+                if n_process == 1:
+                    # the descriptors of the whole chunk are computed in one batch
+                    for i, result in zip(sbs_now, descriptors.compute_batch(frames_now, **options)):
+                        self._store_result(i, result, kind, tag, keep_atomic)
+                        pbar.update(1)
+                # parallel computation
+                else:
+                    self._compute_in_parallel(parallel, descriptors, kind, tag, keep_atomic, layout, sbs_now, frames_now, n_process)
+                    pbar.update(len(sbs_now))
+
+    def _store_result(self, i, result, kind, tag, keep_atomic):
+        """put the output of descriptors.compute(frame) for frame i into the stores"""
+        if kind == 'atomic':
+            self._store_atomic_descriptors(i, tag, result)
+        else:
+            desc_dict_now, atomic_desc_dict_now = result
+            self._store_global_descriptors(i, desc_dict_now)
+            if keep_atomic:
+                for e in atomic_desc_dict_now.keys():
+                    self._store_atomic_descriptors(i, e, atomic_desc_dict_now[e])
+
+    def _record_acronyms(self, descriptors, kind, tag, keep_atomic):
+        """
+        record the acronyms of the descriptors in self.tag_to_acronym, as _store_result would do
+
+        Returns
+        -------
+        global_acronyms: dictionary, {key: a list of the acronyms under this key}
+        atomic_acronyms: a list of the acronyms of atomic descriptors
+        """
+        if kind == 'atomic':
+            atomic_acronyms = {tag: descriptors.get_acronyms()}
+            global_acronyms = {}
+        else:
+            global_acronyms, atomic_acronyms = descriptors.get_acronyms(keep_atomic)
+        global_lists = {}
+        for e, acronyms in global_acronyms.items():
+            self.tag_to_acronym['global'][e] = acronyms
+            if isinstance(acronyms, dict):
+                # atomic to global descriptors, {atomic descriptor: {reducer: acronym}}
+                global_lists[e] = [acronym for e2 in acronyms.keys() for acronym in acronyms[e2].values()]
+            else:
+                global_lists[e] = [acronyms]
+        atomic_list = []
+        for e, acronyms in atomic_acronyms.items():
+            if len(acronyms) == 0: continue
+            self.tag_to_acronym['atomic'].setdefault(e, {}).update(acronyms)
+            atomic_list += list(acronyms.values())
+        return global_lists, atomic_list
+
+    def _frames_to_resume(self, sbs, global_acronyms={}, atomic_acronyms=[]):
+        """
+        copy the descriptors that are already available for the selected frames into the stores,
+        either from the stores themselves (e.g. loaded from a binary container) or from the frames,
+        and return the frames that still need to be computed
+
+        Parameters
+        ----------
+        sbs: array, integer
+        global_acronyms: dictionary, {key: a list of the acronyms under this key}
+        atomic_acronyms: a list of the acronyms of atomic descriptors
+
+        Returns
+        -------
+        a list of the frames that need to be computed
+        """
+        sbs_missing = []
+        for i, frame in self.iter_frames(sbs):
+            complete = True
+            for key, acronyms in global_acronyms.items():
+                if self.global_desc.is_complete(key, [i]) and list(self.global_desc.columns[key].keys()) == acronyms:
+                    continue
+                acronym_desc_list = []
+                for acronym in acronyms:
+                    if self.global_desc.has_acronym(acronym, [i]):
+                        acronym_desc_list.append((acronym, self.global_desc.get_acronym(acronym, [i])[0]))
+                    elif acronym in frame.info:
+                        acronym_desc_list.append((acronym, self._read_desc_from_info(frame, acronym)))
+                if len(acronym_desc_list) == len(acronyms):
+                    self.global_desc.set_frame(i, key, acronym_desc_list)
+                else:
+                    complete = False
+            for acronym in atomic_acronyms:
+                if self.atomic_desc.is_complete(acronym, [i]):
+                    continue
+                elif acronym in frame.arrays:
+                    self.atomic_desc.set_frame(i, acronym, frame.arrays[acronym])
+                else:
+                    complete = False
+            if not complete:
+                sbs_missing.append(i)
+        print("Reuse the descriptors of ", len(sbs) - len(sbs_missing), " frames, and compute ", len(sbs_missing), " frames.")
+        return sbs_missing
+
+    def _compute_in_parallel(self, parallel, descriptors, kind, tag, keep_atomic, layout, sbs_now, frames_now, n_process):
+        """
+        compute the descriptors of a chunk of frames in a pool of processes.
+        The chunk is cut into one contiguous block of frames per process, and the workers write the results
+        into shared memory-mapped arrays at the right rows, which are then copied into the stores in one go.
+        The cache (if any) is looked up in this process, so only the missing frames are sent to the pool
+        and the hit/miss counts are kept.
+
+        Parameters
+        ----------
+        parallel: a joblib.Parallel object, which keeps the worker processes alive between the chunks
+        layout: the split_result of the first frame, which gives the acronyms and the sizes of the outputs
+        """
+        missing = list(range(len(frames_now)))
+        cache_keys = None
+        if descriptors.cache is not None:
+            options = {'keep_atomic': keep_atomic} if kind == 'global' else {}
+            cache_keys = [descriptors.cache_key(frame, **options) for frame in frames_now]
+            missing = []
+            for k, (i, key) in enumerate(zip(sbs_now, cache_keys)):
+                result = descriptors.cache.load(key)
+                if result is None:
+                    missing.append(k)
+                else:
+                    self._store_result(i, result, kind, tag, keep_atomic)
+        if len(missing) == 0:
+            return
+
+        global_layout, atomic_layout = layout
+        atom_offsets = np.zeros(len(missing) + 1, dtype=np.int64)
+        atom_offsets[1:] = np.cumsum([len(frames_now[k]) for k in missing])
+        tmp_dir = tempfile.mkdtemp(prefix='asap-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        try:
+            global_out, atomic_out = {}, {}
+            for n, (key, acronym_desc_list) in enumerate(global_layout.items()):
+                global_out[key] = np.memmap(os.path.join(tmp_dir, 'global-' + str(n)), mode='w+',
+                                            dtype=np.result_type(*[np.asarray(desc) for _, desc in acronym_desc_list]),
+                                            shape=(len(missing), sum(np.size(desc) for _, desc in acronym_desc_list)))
+            for n, (acronym, desc) in enumerate(atomic_layout):
+                atomic_out[acronym] = np.memmap(os.path.join(tmp_dir, 'atomic-' + str(n)), mode='w+', dtype=np.asarray(desc).dtype,
+                                                shape=(int(atom_offsets[-1]),) + np.shape(desc)[1:])
+
+            blocks = [block for block in np.array_split(np.arange(len(missing)), n_process) if len(block) > 0]
+            parallel(delayed(compute_block)(type(descriptors), descriptors.pack(), kind, keep_atomic,
+                                            [frames_now[missing[k]] for k in block], block[0], atom_offsets[block[0]:block[-1] + 2],
+                                            global_out, atomic_out, descriptors.cache,
+                                            None if cache_keys is None else [cache_keys[missing[k]] for k in block],
+                                            descriptors.neighbor_skin)
+                     for block in blocks)
+
+            sbs_missing = [sbs_now[k] for k in missing]
+            for key in global_out.keys():
+                self.global_desc.set_frames(sbs_missing, key, global_out[key])
+            for acronym in atomic_out.keys():
+                self.atomic_desc.set_frames(sbs_missing, acronym, atomic_out[acronym])
+        finally:
+            global_out, atomic_out = {}, {}
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _store_atomic_descriptors(self, i, tag, atomic_desc_dict_now):
+        """put the atomic descriptors of frame i into the columnar store, under their acronyms"""
+        if tag not in self.tag_to_acronym['atomic']:
+            self.tag_to_acronym['atomic'][tag] = {}
+        for e in atomic_desc_dict_now.keys():
+            self.atomic_desc.set_frame(i, atomic_desc_dict_now[e]['acronym'], atomic_desc_dict_now[e]['atomic_descriptors'])
+            self.tag_to_acronym['atomic'][tag][e] = atomic_desc_dict_now[e]['acronym']
+
+    def _ensure_atomic_numbers(self):
+        """make sure the atomic numbers of all the frames are known to the atomic store"""
+        missing = self.atomic_desc.missing_atomic_numbers()
+        if len(missing) > 0:
+            # parsing the frames records their atomic numbers
+            for _ in self.iter_frames(missing): pass
+
+    def _species_rows(self, species_name):
+        """the rows of the atomic descriptor arrays that belong to atoms of the species"""
+        self._ensure_atomic_numbers()
+        return self.atomic_desc.species_rows(species_name)
 
     def fetch_computed_descriptors(self, desc_dict_keys=[], sbs=[]):
         """
@@ -282,57 +851,61 @@ class ASAPXYZ:
         desc: np.matrix [n_frame, n_desc]
         """
         if len(sbs) == 0:
-            sbs = list(range(self.nframes))
-        return np.row_stack([self._parse_computed_descriptors_singleframe(desc_dict_keys, i) for i in sbs])
-
-    def _parse_computed_descriptors_singleframe(self, desc_dict_keys=[], i=0):
-        """return the global descriptor computed for frame i"""
-        # TODO: use the nested dictionaty search `extract_from_nested_dict` in ..io
-        desc_array = np.array([])
-        for e in desc_dict_keys:
-            try:
-                desc_array = np.append(desc_array,self.global_desc[i][e]['descriptors'])
-            except:
-                # if we use atomic to global descriptor, this is a nested dictionary
-                for e2 in self.global_desc[i][e].keys():
-                    for e3 in self.global_desc[i][e][e2].keys():
-                        desc_array = np.append(desc_array,self.global_desc[i][e][e2][e3]['descriptors'])
-        return desc_array
+            # a view of the store if there is a single key
+            return self.global_desc.get(list(desc_dict_keys))
+        return self.global_desc.get(list(desc_dict_keys), np.asarray(sbs))
 
-    def _write_computed_descriptors_to_xyz(self, desc_dict_now, frame):
-        """  
-        we recorded the computed descriptors to the xyz object
-        we use acronym to record the entry in the extended xyz file, so it's much easier to ready by human
+    def _store_global_descriptors(self, i, desc_dict_now):
         """
-        for e in desc_dict_now.keys():            
-            try:
-                frame.info[desc_dict_now[e]['acronym']] = desc_dict_now[e]['descriptors']
+        put the global descriptors of frame i into the preallocated store,
+        the descriptors under the same key are kept side by side
+        """
+        for e in desc_dict_now.keys():
+            if 'acronym' in desc_dict_now[e]:
+                self.global_desc.set_frame(i, e, [(desc_dict_now[e]['acronym'], desc_dict_now[e]['descriptors'])])
                 self.tag_to_acronym['global'][e] = desc_dict_now[e]['acronym']
-            except:
+            else:
                 # if we use atomic to global descriptor, this is a nested dictionary
+                acronym_desc_list = []
                 self.tag_to_acronym['global'][e] = {}
                 for e2 in desc_dict_now[e].keys():
                     self.tag_to_acronym['global'][e][e2] = {}
                     for e3 in desc_dict_now[e][e2].keys():
-                        frame.info[desc_dict_now[e][e2][e3]['acronym']] = desc_dict_now[e][e2][e3]['descriptors']
+                        acronym_desc_list.append((desc_dict_now[e][e2][e3]['acronym'], desc_dict_now[e][e2][e3]['descriptors']))
                         self.tag_to_acronym['global'][e][e2][e3] = desc_dict_now[e][e2][e3]['acronym']
+                self.global_desc.set_frame(i, e, acronym_desc_list)
 
-    def _write_computed_atomic_descriptors_to_xyz(self, atomic_desc_dict_now, frame):
+    def _write_computed_descriptors_to_xyz(self, i, frame):
         """  
-        we recorded the computed descriptors to the xyz object
+        we recorded the computed descriptors of frame i to the xyz object
         we use acronym to record the entry in the extended xyz file, so it's much easier to ready by human
         """
-        for e in atomic_desc_dict_now.keys():
-            self.tag_to_acronym['atomic'][e] = {}
-            for e2 in atomic_desc_dict_now[e].keys():
-                frame.new_array(atomic_desc_dict_now[e][e2]['acronym'], atomic_desc_dict_now[e][e2]['atomic_descriptors'])
-                self.tag_to_acronym['atomic'][e][e2] = atomic_desc_dict_now[e][e2]['acronym']
+        for acronym, desc in self.global_desc.get_frame(i):
+            # the packed fingerprints are written as signed integers, as unsigned 64-bit words would be read back as floats
+            frame.info[acronym] = packed_to_xyz(desc) if is_packed_acronym(acronym) else desc
+
+    @staticmethod
+    def _read_desc_from_info(frame, desc_name):
+        """the global descriptor desc_name from frame.info, with the packed fingerprints as np.uint64 words"""
+        if is_packed_acronym(desc_name):
+            return packed_from_xyz(desc_name, frame.info[desc_name])
+        return frame.info[desc_name]
+
+    def _write_computed_atomic_descriptors_to_xyz(self, i, frame):
+        """  
+        we recorded the computed atomic descriptors of frame i to the xyz object
+        the acronyms were recorded in self.tag_to_acronym when the descriptors were computed
+        """
+        for acronym in self.atomic_desc.frame_acronyms(i):
+            frame.set_array(acronym, self.atomic_desc.get_frame(i, acronym))
 
     def _desc_name_with_wild_card(self, desc_name_list, atomic_desc=False):
         """
         Use a wildcard when specifying the name of the descriptors
         """
         new_desc_name = []
+        if any('*' in desc_name for desc_name in desc_name_list):
+            frame_0 = self._first_frame()
         for desc_name in desc_name_list:
             #print("desc_name", desc_name)
             if desc_name == '*':
@@ -340,27 +913,35 @@ class ASAPXYZ:
                 possible_desc_prefix = [ 'SOAP', 'ACSF', 'LMBTR', 'FCHL19', 'CM', 'pca', 'skpca', 'umap', 'tsne']
                 for pre in possible_desc_prefix:
                     if atomic_desc:
-                        for key in self.frames[0].arrays.keys():
+                        for key in self._atomic_desc_names(frame_0):
                             if re.search(pre+'.+', key):
                                 new_desc_name.append(key)
                     else:
-                        for key in self.frames[0].info.keys():
+                        for key in self._global_desc_names(frame_0):
                             if re.search(pre+'.+', key):
                                 new_desc_name.append(key)
             elif '*' in desc_name:
                 import re
                 if atomic_desc:
-                    for key in self.frames[0].arrays.keys():
+                    for key in self._atomic_desc_names(frame_0):
                         if re.search(desc_name.replace('*','.+'), key):
                             new_desc_name.append(key)
                 else:
-                    for key in self.frames[0].info.keys():
+                    for key in self._global_desc_names(frame_0):
                         if re.search(desc_name.replace('*','.+'), key):
                             new_desc_name.append(key)
             else:
                 new_desc_name.append(desc_name)
         return new_desc_name
 
+    def _global_desc_names(self, frame):
+        """names of the info entries in the frame and of the global descriptors in the store"""
+        return list(frame.info.keys()) + [key for key in self.global_desc.acronyms() if key not in frame.info]
+
+    def _atomic_desc_names(self, frame):
+        """names of the atomic arrays in the frame and of the atomic descriptors in the store"""
+        return list(frame.arrays.keys()) + [key for key in self.atomic_desc.acronyms() if key not in frame.arrays]
+
     def get_descriptors(self, desc_name_list=[], use_atomic_desc=False, species_name=None):
         """ extract the descriptor array from each frame
 
@@ -385,11 +966,29 @@ class ASAPXYZ:
 
         desc_name_list = self._desc_name_with_wild_card(desc_name_list)
         print("Find the following descriptor names that match the specifications: ", desc_name_list)
+        n_packed = len([desc_name for desc_name in desc_name_list if is_packed_acronym(desc_name)])
+        if 0 < n_packed < len(desc_name_list):
+            raise ValueError("The packed fingerprints cannot be combined with other descriptors into one design matrix.")
  
         # load from xyz file
         try:
             # retrieve the descriptor vectors --- both of these throw a ValueError if any are missing or are of wrong shape
-            desc = np.column_stack(np.row_stack([a.info[desc_name] for a in self.frames]) for desc_name in desc_name_list)
+            # the computed descriptors are taken directly from the store, the others are read from the frames
+            desc_by_name = {}
+            from_frames = [desc_name for desc_name in desc_name_list if not self.global_desc.has_acronym(desc_name)]
+            if len(from_frames) > 0:
+                for _, a in self.iter_frames():
+                    for desc_name in from_frames:
+                        desc_by_name.setdefault(desc_name, []).append(self._read_desc_from_info(a, desc_name))
+                desc_by_name = {desc_name: np.row_stack(d) for desc_name, d in desc_by_name.items()}
+            for desc_name in desc_name_list:
+                if desc_name not in desc_by_name:
+                    desc_by_name[desc_name] = self.global_desc.get_acronym(desc_name)
+            if len(desc_name_list) == 1 and np.ndim(desc_by_name[desc_name_list[0]]) == 2:
+                # no need to copy
+                desc = desc_by_name[desc_name_list[0]]
+            else:
+                desc = np.column_stack([desc_by_name[desc_name] for desc_name in desc_name_list])
             print("Use global descriptor matrix with shape: ", np.shape(desc))
             # get the atomic descriptors with the same name
             if use_atomic_desc:
@@ -424,12 +1023,31 @@ class ASAPXYZ:
     
         # load from xyz file
         try:
-            if species_name is None:
-                atomic_desc = np.column_stack(np.concatenate([a.get_array(desc_name) for a in self.frames]) for desc_name in desc_name_list)
-            elif species_name in self.global_species:
-                atomic_desc = np.column_stack(np.concatenate([self._get_atomic_descriptors_by_species(a, desc_name, species_name) for a in self.frames]) for desc_name in desc_name_list)
-            else:
+            if species_name is not None and species_name not in self.global_species:
                 raise ValueError("Cannot find the specified chemical species in the data set.")
+            # the computed atomic descriptors are taken directly from the store,
+            # the others are read from the frames
+            atomic_desc_by_name = {}
+            from_frames = [desc_name for desc_name in desc_name_list if not self.atomic_desc.is_complete(desc_name)]
+            if len(from_frames) > 0:
+                for _, a in self.iter_frames():
+                    for desc_name in from_frames:
+                        if species_name is None:
+                            atomic_desc_by_name.setdefault(desc_name, []).append(a.get_array(desc_name))
+                        else:
+                            atomic_desc_by_name.setdefault(desc_name, []).append(self._get_atomic_descriptors_by_species(a, desc_name, species_name))
+                atomic_desc_by_name = {desc_name: np.concatenate(d) for desc_name, d in atomic_desc_by_name.items()}
+            for desc_name in desc_name_list:
+                if desc_name not in atomic_desc_by_name:
+                    if species_name is not None:
+                        # make sure the atomic numbers of all the frames are known
+                        self._species_rows(species_name)
+                    atomic_desc_by_name[desc_name] = self.atomic_desc.get(desc_name, species_name)
+            if len(desc_name_list) == 1 and np.ndim(atomic_desc_by_name[desc_name_list[0]]) == 2:
+                # no need to copy
+                atomic_desc = atomic_desc_by_name[desc_name_list[0]]
+            else:
+                atomic_desc = np.column_stack([atomic_desc_by_name[desc_name] for desc_name in desc_name_list])
             print("Use atomic descriptor matrix with shape: ", np.shape(atomic_desc))
         except:
             print("Cannot find the specified atomic descriptors from xyz")
@@ -456,10 +1074,28 @@ class ASAPXYZ:
         if len(sbs) == 0:
             sbs = range(self.nframes)
 
+        if isinstance(y_key, str) and self.global_desc.has_acronym(y_key, list(sbs)):
+            # the values from set_descriptors, which are only attached to the frames when writing
+            y_all = np.asarray(self.global_desc.get_acronym(y_key, list(sbs)))
+            if extensive:
+                y_all = y_all / np.asarray(self.natom_list)[list(sbs)]
+        elif isinstance(y_key, str) and self.atomic_desc.is_complete(y_key, list(sbs)):
+            if extensive:
+                # use the sum of atomic properties
+                y_all = [np.sum(self.atomic_desc.get_frame(i, y_key)) for i in sbs]
+            else:
+                # use the average of atomic properties
+                y_all = [np.mean(self.atomic_desc.get_frame(i, y_key)) for i in sbs]
+        else:
+            y_all = self._get_property_from_frames(y_key, extensive, sbs)
+        if len(np.shape(y_all)) > 1:
+            raise ValueError('The property from the xyz file has more than one column')
+        return np.array(y_all)
+
+    def _get_property_from_frames(self, y_key, extensive, sbs):
         y_all = []
         try:
-            for i in sbs:
-                frame = self.frames[i]
+            for i, frame in self.iter_frames(sbs):
                 if y_key == 'volume' or y_key == 'Volume':
                     y_all.append(frame.get_volume() / len(frame.get_positions()))
                 elif y_key == 'size' or y_key == 'Size':
@@ -475,8 +1111,8 @@ class ASAPXYZ:
                     y_all.append(frame.info[y_key])
         except:
             try:
-                for i in sbs:
-                    frame = self.frames[i]
+                y_all = []
+                for _, frame in self.iter_frames(sbs):
                     if extensive:
                         # use the sum of atomic properties
                         y_all.append(np.sum(frame.get_array(y_key)))
@@ -485,9 +1121,7 @@ class ASAPXYZ:
                         y_all.append(np.mean(frame.get_array(y_key)))
             except:
                 raise ValueError('Cannot load the property vector')
-        if len(np.shape(y_all)) > 1:
-            raise ValueError('The property from the xyz file has more than one column')
-        return np.array(y_all)
+        return y_all
 
     def get_atomic_property(self, y_key=None, extensive=False, sbs=[], species_name=None):
         """ extract the property array from each atom
@@ -508,10 +1142,20 @@ class ASAPXYZ:
             sbs = range(self.nframes)
 
         y_all = []
+        if self.atomic_desc.is_complete(y_key, list(sbs)):
+            # the values from set_descriptors, which are only attached to the frames when writing
+            rows = self.atomic_desc.frame_rows(list(sbs))
+            if species_name is not None:
+                if species_name not in self.global_species:
+                    raise ValueError("Cannot find the specified chemical species in the data set.")
+                rows = rows[self.atomic_desc.atomic_numbers[rows] == species_name]
+            y_all = np.asarray(self.atomic_desc.blocks[y_key][rows])
+            if len(np.shape(y_all)) > 1:
+                raise ValueError('The property from the xyz file has more than one column')
+            return y_all
         try:
             #y_all = np.concatenate([a.get_array(y_key) for a in self.frames[sbs]]) # this doesn't work ?!
-            for i in sbs:
-                frame = self.frames[i]
+            for _, frame in self.iter_frames(sbs):
                 if species_name is None:
                     y_all = np.append(y_all, frame.get_array(y_key))
                 elif species_name in self.global_species:
@@ -546,10 +1190,10 @@ class ASAPXYZ:
             raise ValueError('The length of the descriptor matrix is not the same as the number of atoms.')
 
         if self.nframes > 1:
-            for i, frame in enumerate(self.frames):
-                frame.info[desc_name] = desc[i]
+            # the values are attached to the frames when writing
+            self.global_desc.set_all(desc_name, desc)
         else:
-            self.frames[0].new_array(desc_name, desc)
+            self.atomic_desc.set_all(desc_name, desc)
 
     def set_atomic_descriptors(self, atomic_desc=None, atomic_desc_name=None, species_name=None):
         """ write the descriptor array to the atom object
@@ -565,27 +1209,18 @@ class ASAPXYZ:
         if species_name is None and len(atomic_desc) != self.total_natoms:
             raise ValueError('The length of the atomic descriptor matrix is not the same as the total number of atoms.')
 
-        atom_index = 0
-
         if species_name is None:
-            for i, frame in enumerate(self.frames):
-                natomnow = self.natom_list[i]
-                frame.new_array(atomic_desc_name, np.array(atomic_desc)[atom_index:atom_index + natomnow])
-                atom_index += natomnow
+            self.atomic_desc.set_all(atomic_desc_name, atomic_desc)
         else:
-            if atomic_desc.ndim == 1:
+            if np.ndim(atomic_desc) == 1:
                 n_desc = 1
             else:
                 n_desc = np.shape(atomic_desc)[1]
-            for i, frame in enumerate(self.frames):
-                array_now = np.zeros((self.natom_list[i],n_desc), dtype=float)
-                for j, s in enumerate(frame.get_atomic_numbers()):
-                    if s == species_name:
-                        array_now[j] = atomic_desc[atom_index]
-                        atom_index += 1
-                    else:
-                        array_now[j] = np.nan
-                frame.new_array(atomic_desc_name, np.array(array_now))
+            # the atoms of the other species are filled with nan
+            species_rows = self._species_rows(species_name)
+            array_all = np.full((self.total_natoms, n_desc), np.nan)
+            array_all[species_rows] = np.reshape(atomic_desc, (len(species_rows), n_desc))
+            self.atomic_desc.set_all(atomic_desc_name, array_all)
             
     def remove_descriptors(self, desc_name_list=[]):
         """
@@ -597,6 +1232,13 @@ class ASAPXYZ:
         desc_name_list = self._desc_name_with_wild_card(desc_name_list)
         print("removing the global descriptors from output xyz with the names: ", desc_name_list)
 
+        for dn in desc_name_list:
+            self.global_desc.remove(dn)
+
+        if self.lazy:
+            self._removed_desc.extend(desc_name_list)
+            return
+
         for dn in desc_name_list:
             for frame in self.frames:
                 if dn in frame.info:
@@ -614,6 +1256,13 @@ class ASAPXYZ:
         desc_name_list = self._desc_name_with_wild_card(desc_name_list, True)
         print("removing the atomic descriptors from output xyz with the names: ", desc_name_list)
 
+        for dn in desc_name_list:
+            self.atomic_desc.remove(dn)
+
+        if self.lazy:
+            self._removed_atomic_desc.extend(desc_name_list)
+            return
+
         for dn in desc_name_list:
             for frame in self.frames:
                 if dn in frame.arrays:
@@ -622,33 +1271,115 @@ class ASAPXYZ:
                     pass
                     #print("Warning: Cannot parse desc_name "+str(dn)+" when remove_descriptors.")
 
-    def write(self, filename, sbs=[], save_acronym=False, wrap_output=True):
+    def _attach_to_frame(self, i, frame, wrap_output=True, attach_desc=True):
+        """put the computed descriptors of frame i into the ase object before output"""
+        if wrap_output: frame.wrap()
+        for dn in self._removed_desc:
+            frame.info.pop(dn, None)
+        for dn in self._removed_atomic_desc:
+            frame.arrays.pop(dn, None)
+        if attach_desc:
+            self._write_computed_descriptors_to_xyz(i, frame)
+            self._write_computed_atomic_descriptors_to_xyz(i, frame)
+        return frame
+
+    def write(self, filename, sbs=[], save_acronym=False, wrap_output=True, binary_desc=False):
         """
         write the selected frames or all the frames to a xyz file
+        The frames are written one at a time, so this also works in the lazy mode.
 
         Parameters
         ----------
         filename: str
         sbs: array, integer
+        binary_desc: bool, write the computed descriptors to a binary container (filename + '.asapdesc')
+                     instead of the xyz file. The container is loaded automatically together with the xyz file.
+                     Otherwise an old container of the same name is removed.
         """
 
         if len(sbs) == 0:
             sbs = range(self.nframes)
 
-        # prepare for the output
-        if os.path.isfile(str(filename) + ".xyz"): 
-            os.rename(str(filename) + ".xyz", "bck." + str(filename) + ".xyz")
-
-        for i in sbs:
-            if wrap_output: self.frames[i].wrap()
-            self._write_computed_descriptors_to_xyz(self.global_desc[i], self.frames[i])
-            self._write_computed_atomic_descriptors_to_xyz(self.atomic_desc[i], self.frames[i])
-            write(str(filename) + ".xyz", self.frames[i], append=True)
+        # the frames are written to a temporary file first, as in the lazy mode they may be read from the output file
+        fxyz = str(filename) + ".xyz"
+        fd, ftmp = tempfile.mkstemp(prefix='.asap-', suffix='.xyz', dir=os.path.dirname(os.path.abspath(fxyz)))
+        try:
+            # mkstemp makes the file only readable by the owner
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(ftmp, 0o666 & ~umask)
+            with os.fdopen(fd, 'w') as fout:
+                for i, frame in self.iter_frames(sbs):
+                    write(fout, self._attach_to_frame(i, frame, wrap_output, not binary_desc), format='extxyz')
+        except:
+            os.remove(ftmp)
+            raise
+
+        # keep the old output as a backup
+        if os.path.isfile(fxyz):
+            fbck = os.path.join(os.path.dirname(fxyz), "bck." + os.path.basename(fxyz))
+            os.rename(fxyz, fbck)
+            self._input_moved(fxyz, fbck)
+        os.rename(ftmp, fxyz)
+
+        # the container is written after the xyz file, as it records the size and modification time of the xyz file
+        if binary_desc:
+            self.write_desc_container(filename, sbs)
+        else:
+            remove_desc_container(str(filename) + DESC_CONTAINER_SUFFIX)
 
         # this acronym state file lets us know how the descriptors correspond to the outputs in the xyz file
         if save_acronym:
             self.save_descriptor_acronym_state(filename)
 
+    def _input_moved(self, old, new):
+        """in the lazy mode, keep reading the frames from an input file that has been renamed"""
+        if not self.lazy:
+            return
+        moved = [new if os.path.abspath(f) == os.path.abspath(old) else f for f in self._input_files()]
+        self.fxyz = moved if isinstance(self.fxyz, (tuple, list)) else moved[0]
+        for xyz_index in self._xyz_index:
+            if os.path.abspath(xyz_index.fxyz) == os.path.abspath(old):
+                xyz_index.fxyz = new
+
+    def write_desc_container(self, filename, sbs=[]):
+        """
+        write the computed descriptors of the selected frames to a binary container,
+        with one .npy file per acronym and a JSON manifest
+
+        Parameters
+        ----------
+        filename: str, the container is filename + '.asapdesc'.
+                  It is only loaded together with filename + '.xyz' as it is now, so the xyz file is written first.
+        sbs: array, integer
+        """
+        if len(sbs) == 0:
+            sbs = range(self.nframes)
+        sbs = np.asarray(sbs, dtype=int)
+        natom_list = np.asarray(self.natom_list)[sbs]
+        writer = Descriptor_Container_Writer(str(filename) + DESC_CONTAINER_SUFFIX, len(sbs), np.sum(natom_list))
+
+        for acronym in self.global_desc.acronyms():
+            if not self.global_desc.has_acronym(acronym, sbs): continue
+            desc_now = self.global_desc.get_acronym(acronym, sbs[:1])
+            desc_out = writer.new_array('global', acronym, (len(sbs),) + desc_now.shape[1:], desc_now.dtype)
+            for start in range(0, len(sbs), self.chunk_size):
+                desc_out[start:start + self.chunk_size] = self.global_desc.get_acronym(acronym, sbs[start:start + self.chunk_size])
+            desc_out.flush()
+
+        offsets = self.atomic_desc.frame_offsets
+        for acronym in self.atomic_desc.acronyms():
+            if not self.atomic_desc.is_complete(acronym, sbs): continue
+            block = self.atomic_desc.blocks[acronym]
+            desc_out = writer.new_array('atomic', acronym, (np.sum(natom_list),) + block.shape[1:], block.dtype)
+            atom_index = 0
+            for i, natomnow in zip(sbs, natom_list):
+                desc_out[atom_index:atom_index + natomnow] = block[offsets[i]:offsets[i + 1]]
+                atom_index += natomnow
+            desc_out.flush()
+
+        writer.close(self.computed_desc_dict, self.tag_to_acronym, str(filename) + '.xyz')
+
     def write_chemiscope(self, filename, sbs=None, save_acronym=False, cutoff=None, wrap_output=True):
         """
         write the selected frames or all the frames to ChemiScope JSON
@@ -669,17 +1400,15 @@ class ASAPXYZ:
         if os.path.isfile(str(filename) + ".xyz"): 
             os.rename(str(filename) + ".xyz", "bck." + str(filename) + ".xyz")
 
-        for i in sbs:
-            if wrap_output: self.frames[i].wrap()
-            self._write_computed_descriptors_to_xyz(self.global_desc[i], self.frames[i])
-            self._write_computed_atomic_descriptors_to_xyz(self.atomic_desc[i], self.frames[i])
+        # the ChemiScope input holds all the selected frames anyway
+        frames = [self._attach_to_frame(i, frame, wrap_output) for i, frame in self.iter_frames(sbs)]
 
         # this acronym state file lets us know how the descriptors correspond to the outputs in the xyz file
         if save_acronym:
             self.save_descriptor_acronym_state(filename)
 
         # Disable atomic environments if there isn't any data
-        write_chemiscope_input(filename + '.json.gz', self.frames, cutoff=cutoff)
+        write_chemiscope_input(filename + '.json.gz', frames, cutoff=cutoff)
 
     def write_descriptor_matrix(self, filename, desc_name_list, sbs=[], comment=''):
         """
@@ -1,3 +1,4 @@
 from .atomic_descriptors import *
 from .atomic_to_global import *
 from .global_descriptors import *
+from .descriptor_cache import *
@@ -3,7 +3,8 @@ Methods and functions to compute atomic desciptors
 """
 import numpy as np
 import json
-from ..io import NpEncoder
+import zlib
+from ..io import NpEncoder, get_equivalent_atoms
 
 class Atomic_Descriptors:
     def __init__(self, desc_spec_dict={}):
@@ -17,11 +18,21 @@ class Atomic_Descriptors:
         "firstsoap": 
         {"type": 'SOAP',"species": [1, 6, 7, 8], "cutoff": 2.0, "atom_gaussian_width": 0.2, "n": 4, "l": 4}
         }
+        Each specification can have a "centers" entry, so the descriptors are only computed
+        for some of the atoms (see select_centers), the rows of the other atoms are NaN.
+        Each specification can have a "symmetry_unique" entry with the tolerance of spglib (e.g. 0.01),
+        so the descriptors are only computed for the symmetry-unique atoms of crystals,
+        and copied to their symmetry-equivalent atoms.
         """
         self.desc_spec_dict = desc_spec_dict
         # list of Atomic_Descriptor objections
         self.engines = {}
         self.acronym = ""
+        # an optional Descriptor_Cache
+        self.cache = None
+        # the Verlet skin of the neighbor list that is kept between the frames of a trajectory (None means no reuse)
+        self.neighbor_skin = None
+        self.neighbor_list = None
 
         self.bind()
 
@@ -37,12 +48,44 @@ class Atomic_Descriptors:
     def pack(self):
         return json.dumps(self.desc_spec_dict, sort_keys=True, cls=NpEncoder)
 
+    def set_cache(self, cache):
+        """use a Descriptor_Cache, so the descriptors of frames that have been seen before are not recomputed"""
+        self.cache = cache
+
+    def set_neighbor_skin(self, skin=None):
+        """
+        reuse the neighbor list between consecutive frames (e.g. of an MD trajectory),
+        until an atom has moved more than skin/2 since the list was built.
+        This applies to the periodic SOAP descriptors, which are then computed from
+        the extended systems made with the neighbor list (see Neighbor_List.get_extended_system):
+        the periodic images within the cutoff of the centers, taken from the pairs of the list.
+        DScribe cannot take the pairs themselves, so it still finds the neighbors within these small systems.
+        The frames need to be computed in the order of the trajectory for the list to be reused.
+
+        Parameters
+        ----------
+        skin: float, the Verlet skin in Angstrom. None switches the reuse off.
+        """
+        if skin is not None and skin < 0:
+            raise ValueError("The neighbor skin should not be negative.")
+        if skin == self.neighbor_skin:
+            return
+        self.neighbor_skin = skin
+        self._bind_shared_soap()
+
+    def cache_key(self, frame):
+        return self.cache.frame_key(frame, self.desc_spec_dict)
+
     def get_acronym(self):
         if self.acronym == "":
             for element in self.desc_spec_dict.keys():
                 self.acronym += self.engines[element].get_acronym()
         return self.acronym
 
+    def get_acronyms(self):
+        """the acronyms of the atomic descriptors that compute returns, {element: acronym}"""
+        return {element: self.engines[element].get_acronym() for element in self.desc_spec_dict.keys()}
+
     def bind(self):
         """
         binds the objects that actually compute the descriptors
@@ -52,8 +95,52 @@ class Atomic_Descriptors:
         self.engines = {}
         for element in self.desc_spec_dict.keys():
             self.engines[element] = self._call(self.desc_spec_dict[element])
+            self.engines[element].acronym += centers_acronym(self.desc_spec_dict[element].get('centers', None))
             self.desc_spec_dict[element]['acronym'] = self.engines[element].get_acronym()
 
+        self._bind_shared_soap()
+
+    def _bind_shared_soap(self):
+        """
+        the periodic SOAP descriptors with different cutoffs share the periodic images of each frame,
+        made once for the largest cutoff, and each SOAP gets the extended system with only the images within its own cutoff.
+        With a neighbor skin the images come from a neighbor list that is reused between frames,
+        and are also filtered to the ones within the cutoff of the centers of each SOAP.
+        A single periodic SOAP without a skin is left to DScribe.
+        """
+        self.shared_soap = [element for element, engine in self.engines.items()
+                            if isinstance(engine, Atomic_Descriptor_SOAP) and engine.periodic]
+        if self.neighbor_skin is None and len(self.shared_soap) < 2:
+            self.shared_soap = []
+        self.extension_cutoff = max([self.engines[element].get_extension_cutoff() for element in self.shared_soap], default=0)
+        self.neighbor_list = None
+        if self.neighbor_skin is not None and len(self.shared_soap) > 0:
+            from ..neighbors import Neighbor_List
+            self.neighbor_list = Neighbor_List(self.extension_cutoff, self.neighbor_skin)
+
+    def _extend_frames(self, frames, computed_now):
+        """
+        the periodically extended systems of the frames for each of the shared SOAPs,
+        covering the extension cutoff of the SOAP (around the atoms that are computed, with a neighbor skin)
+        """
+        from ..neighbors import extended_systems
+        extended_now = {element: [] for element in self.shared_soap}
+        for n, frame in enumerate(frames):
+            cell = frame.get_cell()
+            if np.cross(cell[0], cell[1]).dot(cell[2]) == 0:
+                raise ValueError("System doesn't have cell to justify periodicity.")
+            # the atoms of the original cell come first, so the centers keep their indices
+            if self.neighbor_list is None:
+                systems = extended_systems(frame, [self.engines[element].get_extension_cutoff() for element in self.shared_soap])
+                for element, system in zip(self.shared_soap, systems):
+                    extended_now[element].append(system)
+            else:
+                for element in self.shared_soap:
+                    centers = None if computed_now[element] is None else computed_now[element][n]
+                    extended_now[element].append(self.neighbor_list.get_extended_system(
+                        frame, self.engines[element].get_extension_cutoff(), centers))
+        return extended_now
+
     def _call(self, desc_spec):
         """
         call the specific descriptor objects
@@ -73,12 +160,13 @@ class Atomic_Descriptors:
         else:
             raise NotImplementedError 
 
-    def compute(self, frame):
+    def compute(self, frame, use_cache=True):
         """
         compute the global descriptor vector for a frame from atomic contributions
         Parameters
         ----------
         frame: ASE atom object. Coordinates of a frame.
+        use_cache: bool, look up and store the result in self.cache (if any)
 
         Returns
         -------
@@ -86,11 +174,68 @@ class Atomic_Descriptors:
                           and a np.array [N_desc*N_atoms]. Atomic descriptors for a frame.
                           e.g. {'ad1':{'acronym':'soap-1', 'atomic_descriptors': `a np.array [N_desc*N_atoms]`}}
         """
-        atomic_desc_dict = {}
+        return self.compute_batch([frame], use_cache)[0]
+
+    def compute_batch(self, frames, use_cache=True):
+        """
+        compute the atomic descriptors for a list of frames,
+        each descriptor object is called once for all the frames (that are not in the cache)
+        Parameters
+        ----------
+        frames: a list of ASE atom objects
+        use_cache: bool, look up and store the results in self.cache (if any)
+
+        Returns
+        -------
+        a list of atomic_desc_dict, one for each frame, same as the output of compute()
+        """
+        results = [None] * len(frames)
+        if use_cache and self.cache is not None:
+            keys = [self.cache_key(frame) for frame in frames]
+            results = [self.cache.load(key) for key in keys]
+        todo = [k for k, result in enumerate(results) if result is None]
+        if len(todo) == 0:
+            return results
+
+        frames_now = [frames[k] for k in todo]
+        batch_now, centers_now, equivalent_now, computed_now = {}, {}, {}, {}
+        # the symmetry-equivalent atoms of each frame, for each tolerance
+        equivalent_by_symprec = {}
         for element in self.desc_spec_dict.keys():
-            atomic_desc_dict[element] = {}
-            atomic_desc_dict[element]['acronym'], atomic_desc_dict[element]['atomic_descriptors'] = self.engines[element].create(frame)
-        return atomic_desc_dict
+            centers_spec = self.desc_spec_dict[element].get('centers', None)
+            centers_now[element] = None if centers_spec is None else [select_centers(frame, centers_spec) for frame in frames_now]
+            computed_now[element] = centers_now[element]
+            symprec = self.desc_spec_dict[element].get('symmetry_unique', None)
+            if symprec is not None:
+                if symprec not in equivalent_by_symprec:
+                    equivalent_by_symprec[symprec] = [frame_equivalent_atoms(frame, symprec) for frame in frames_now]
+                equivalent_now[element] = equivalent_by_symprec[symprec]
+                # only the representatives of the centers are computed
+                computed_now[element] = [np.unique(equivalent if centers is None else equivalent[centers])
+                                         for equivalent, centers in zip(equivalent_now[element],
+                                                                        centers_now[element] or [None] * len(frames_now))]
+        extended_now = self._extend_frames(frames_now, computed_now) if len(self.shared_soap) > 0 else None
+        for element in self.desc_spec_dict.keys():
+            if element in self.shared_soap:
+                centers_list = computed_now[element]
+                if centers_list is None:
+                    centers_list = [np.arange(len(frame)) for frame in frames_now]
+                batch_now[element] = self.engines[element].create_batch_extended(extended_now[element], centers_list)
+            else:
+                batch_now[element] = self.engines[element].create_batch(frames_now, computed_now[element])
+        for n, k in enumerate(todo):
+            results[k] = {}
+            for element in self.desc_spec_dict.keys():
+                acronym, desc_list = batch_now[element]
+                centers = None if centers_now[element] is None else centers_now[element][n]
+                if element in equivalent_now:
+                    atomic_desc = _broadcast_equivalent(desc_list[n], computed_now[element][n], equivalent_now[element][n], centers)
+                else:
+                    atomic_desc = _expand_centers(desc_list[n], centers, len(frames[k]))
+                results[k][element] = {'acronym': acronym, 'atomic_descriptors': atomic_desc}
+            if use_cache and self.cache is not None:
+                self.cache.store(keys[k], results[k])
+        return results
 
 class Atomic_Descriptor_Base:
     def __init__(self, desc_spec):
@@ -102,9 +247,115 @@ class Atomic_Descriptor_Base:
     def get_acronym(self):
         # we use an acronym for each descriptor, so it's easy to find it and refer to it
         return self.acronym
-    def create(self, frame):
+    def create(self, frame, centers=None):
         # notice that we return the acronym here!!!
+        # centers: the indices of the atoms to compute the descriptors for, None means all the atoms
         return self.acronym, []
+    def create_batch(self, frames, centers_list=None):
+        # the descriptors of each frame, returned as a list
+        if centers_list is None:
+            return self.acronym, [self.create(frame)[1] for frame in frames]
+        return self.acronym, [self.create(frame, centers)[1] for frame, centers in zip(frames, centers_list)]
+
+def select_centers(frame, centers_spec=None):
+    """
+    the atoms of a frame for which the atomic descriptors are computed
+
+    Parameters
+    ----------
+    frame: ASE atom object
+    centers_spec: None for all the atoms, or a dictionary with one of
+        {'species': [8]}: the atoms of these species
+        {'info_key': 'centers'}: the list of atom indices stored in frame.info['centers']
+        {'fraction': 0.1, 'method': 'random', 'seed': 0}: a random subsample of the atoms
+        {'fraction': 0.1, 'method': 'fps'}: a subsample of the atoms, by farthest point sampling of their positions
+
+    Returns
+    -------
+    np.array of int, the indices of the selected atoms. None means all the atoms.
+    """
+    if centers_spec is None:
+        return None
+    if 'species' in centers_spec:
+        return np.flatnonzero(np.isin(frame.get_atomic_numbers(), centers_spec['species']))
+    if 'info_key' in centers_spec:
+        return np.sort(np.asarray(frame.info[centers_spec['info_key']], dtype=int).reshape(-1))
+    if 'fraction' in centers_spec:
+        n_centers = int(np.ceil(centers_spec['fraction'] * len(frame)))
+        if centers_spec.get('method', 'random') == 'fps':
+            from ..compressor import fps
+            return np.sort(fps(frame.get_positions(), n_centers, 0)[0])
+        # the random selection only depends on the frame and the seed, so it is the same in every process
+        seed = zlib.crc32(np.ascontiguousarray(frame.get_positions()).tobytes()) + int(centers_spec.get('seed', 0))
+        return np.sort(np.random.RandomState(seed % 2**32).choice(len(frame), n_centers, replace=False))
+    raise ValueError("Cannot understand the specification of the centers: " + str(centers_spec))
+
+def centers_acronym(centers_spec=None):
+    """the part of the acronym that tells which atoms are the centers"""
+    if centers_spec is None:
+        return ""
+    if 'species' in centers_spec:
+        return "-cZ" + "-".join(str(z) for z in np.atleast_1d(centers_spec['species']))
+    if 'info_key' in centers_spec:
+        return "-c" + str(centers_spec['info_key'])
+    if 'fraction' in centers_spec:
+        return "-cf" + str(centers_spec['fraction']) + "-" + centers_spec.get('method', 'random')
+    raise ValueError("Cannot understand the specification of the centers: " + str(centers_spec))
+
+def _expand_centers(atomic_desc, centers, n_atoms):
+    """put the descriptors of the centers into the rows of all the atoms, the other rows are NaN"""
+    if centers is None:
+        return atomic_desc
+    atomic_desc = np.asarray(atomic_desc)
+    n_desc = np.shape(atomic_desc)[-1] if np.ndim(atomic_desc) == 2 else 0
+    desc = np.full((n_atoms, n_desc), np.nan, dtype=np.result_type(atomic_desc, np.float32))
+    desc[centers] = np.reshape(atomic_desc, (len(centers), n_desc))
+    return desc
+
+def frame_equivalent_atoms(frame, symprec=1e-2):
+    """
+    the representative symmetry-unique atom of each atom of the frame (see get_equivalent_atoms),
+    from frame.arrays['equivalent_atoms'] if it has been recorded with the same tolerance
+    """
+    if 'equivalent_atoms' in frame.arrays and frame.info.get('equivalent_atoms_symprec', None) == symprec:
+        return np.asarray(frame.arrays['equivalent_atoms'], dtype=int)
+    return get_equivalent_atoms(frame, symprec)
+
+def _broadcast_equivalent(atomic_desc, computed, equivalent, centers=None):
+    """
+    copy the descriptors of the symmetry-unique atoms (computed) to all their equivalent atoms,
+    the rows of the atoms that are not centers are NaN
+    """
+    desc = _expand_centers(atomic_desc, computed, len(equivalent))[equivalent]
+    if centers is not None:
+        others = np.ones(len(equivalent), dtype=bool)
+        others[centers] = False
+        desc[others] = np.nan
+    return desc
+
+def _dscribe_create(descriptor, frame, centers=None):
+    """call a DScribe descriptor for a frame, for all the atoms or only for the centers"""
+    if centers is None:
+        return descriptor.create(frame, n_jobs=1)
+    return _dscribe_create_batch(descriptor, [frame], [centers])[0]
+
+def _dscribe_create_batch(descriptor, frames, centers_list=None):
+    """
+    call a DScribe descriptor once for a list of frames,
+    and split the stacked descriptors of all the atoms (or centers) into one array per frame
+    """
+    if centers_list is None:
+        # all the atoms of each frame, the LMBTR of DScribe needs the positions of every frame even then
+        desc = descriptor.create(frames, positions=[None] * len(frames), n_jobs=1)
+        return np.split(desc, np.cumsum([len(frame) for frame in frames])[:-1])
+    # DScribe does not take frames without any center
+    todo = [k for k, centers in enumerate(centers_list) if len(centers) > 0]
+    desc_list = [np.zeros((0, descriptor.get_number_of_features()), dtype=np.float32) for _ in frames]
+    if len(todo) > 0:
+        desc = descriptor.create([frames[k] for k in todo], positions=[list(centers_list[k]) for k in todo], n_jobs=1)
+        for k, desc_now in zip(todo, np.split(desc, np.cumsum([len(centers_list[k]) for k in todo])[:-1])):
+            desc_list[k] = desc_now
+    return desc_list
 
 class Atomic_Descriptor_SOAP(Atomic_Descriptor_Base):
     def __init__(self, desc_spec):
@@ -147,15 +398,37 @@ class Atomic_Descriptor_SOAP(Atomic_Descriptor_Base):
         self.soap = SOAP(species=self.species, rcut=self.cutoff, nmax=self.n, lmax=self.l,
                                          sigma=self.g, rbf=self.rbf, crossover=self.crossover, average=False,
                                          periodic=self.periodic)
+        # the same SOAP for periodically extended systems, which are treated as finite
+        self.soap_extended = None
 
         print("Using SOAP Descriptors ...")
 
         # make an acronym
         self.acronym = "SOAP-n" + str(self.n) + "-l" + str(self.l) + "-c" + str(self.cutoff) + "-g" + str(self.g)
 
-    def create(self, frame):
+    def create(self, frame, centers=None):
         # notice that we return the acronym here!!!
-        return self.acronym, self.soap.create(frame, n_jobs=1)
+        return self.acronym, _dscribe_create(self.soap, frame, centers)
+
+    def create_batch(self, frames, centers_list=None):
+        # DScribe takes the list of frames in one go, and stacks the descriptors of all the atoms
+        return self.acronym, _dscribe_create_batch(self.soap, frames, centers_list)
+
+    def get_extension_cutoff(self):
+        # DScribe extends the cutoff by the distance at which the atomic gaussians decay to 0.001
+        return self.cutoff + self.g * np.sqrt(-2 * np.log(0.001))
+
+    def create_batch_extended(self, extended_frames, centers_list):
+        """
+        compute the descriptors from the periodically extended systems (see Atomic_Descriptors._extend_frames)
+        that cover at least get_extension_cutoff(). centers_list gives the atoms of the original cells.
+        """
+        if self.soap_extended is None:
+            from dscribe.descriptors import SOAP
+            self.soap_extended = SOAP(species=self.species, rcut=self.cutoff, nmax=self.n, lmax=self.l,
+                                      sigma=self.g, rbf=self.rbf, crossover=self.crossover, average=False,
+                                      periodic=False)
+        return self.acronym, _dscribe_create_batch(self.soap_extended, extended_frames, centers_list)
 
 
 class Atomic_Descriptor_ACSF(Atomic_Descriptor_Base):
@@ -212,9 +485,13 @@ class Atomic_Descriptor_ACSF(Atomic_Descriptor_Base):
         if self.acsf_dict['g4_params'] is not None: self.acronym += "-g4-" + str(len(self.acsf_dict['g4_params']))
         if self.acsf_dict['g5_params'] is not None: self.acronym += "-g5-" + str(len(self.acsf_dict['g5_params']))
 
-    def create(self, frame):
+    def create(self, frame, centers=None):
         # notice that we return the acronym here!!!
-        return self.acronym, self.acsf.create(frame, n_jobs=1)
+        return self.acronym, _dscribe_create(self.acsf, frame, centers)
+
+    def create_batch(self, frames, centers_list=None):
+        # DScribe takes the list of frames in one go, and stacks the descriptors of all the atoms
+        return self.acronym, _dscribe_create_batch(self.acsf, frames, centers_list)
 
 class Atomic_Descriptor_LMBTR(Atomic_Descriptor_Base):
     def __init__(self, desc_spec):
@@ -285,9 +562,13 @@ class Atomic_Descriptor_LMBTR(Atomic_Descriptor_Base):
         else:
             self.periodic = True
 
-    def create(self, frame):
+    def create(self, frame, centers=None):
         # notice that we return the acronym here!!!
-        return self.acronym, self.lmbtr.create(frame, n_jobs=1)
+        return self.acronym, _dscribe_create(self.lmbtr, frame, centers)
+
+    def create_batch(self, frames, centers_list=None):
+        # DScribe takes the list of frames in one go, and stacks the descriptors of all the atoms
+        return self.acronym, _dscribe_create_batch(self.lmbtr, frames, centers_list)
 
 class Atomic_Descriptor_LMBTR_K2(Atomic_Descriptor_LMBTR):
     def __init__(self, desc_spec):
@@ -434,6 +715,7 @@ class Atomic_Descriptor_FCHL19(Atomic_Descriptor_Base):
         rep_out = rep_out.reshape(len(rep_out), -1)
         return rep_out
 
-    def create(self, frame):
+    def create(self, frame, centers=None):
         # notice that we return the acronym here!!!
-        return self.acronym, self_repr_wrapper(frame, self.species, **self.fchl_acsf_dict)
+        rep = self_repr_wrapper(frame, self.species, **self.fchl_acsf_dict)
+        return self.acronym, rep if centers is None else rep[centers]
@@ -86,13 +86,76 @@ class Atomic_2_Global_Descriptors:
         for atomic_desc_element in atomic_desc_dict.keys():
             atomic_desc_now = atomic_desc_dict[atomic_desc_element]['atomic_descriptors']
             desc_dict[atomic_desc_element]  = {}
+            # all the reducers are computed together, in one pass over the atomic descriptors
+            reduced_now = self.compute_batch(atomic_desc_now, [len(atomic_desc_now)], atomic_numbers)
             for element in self.k_spec_dict.keys():
-                desc_dict[atomic_desc_element][element] = {}
-                k_acronym, desc_dict[atomic_desc_element][element]['descriptors'] = self.engines[element].create(atomic_desc_now, atomic_numbers)
+                k_acronym, desc = reduced_now[element]
+                desc_dict[atomic_desc_element][element] = {'descriptors': desc[0]}
                 # we use a combination of the acronym of the descriptor and of the reducer function
                 desc_dict[atomic_desc_element][element]['acronym'] = atomic_desc_dict[atomic_desc_element]['acronym'] + k_acronym
         return desc_dict
 
+    @staticmethod
+    def _plan_key(engine):
+        # the reducers with the same segments share the sorting of the atoms
+        return tuple(engine.species) if engine.element_wise else None
+
+    def compute_batch(self, atomic_desc, natom_list, atomic_numbers):
+        """
+        compute the global descriptors of many frames at once from the stacked atomic descriptors.
+        All the reducers are fused: the atoms are sorted into segments once, each power zeta of the
+        atomic descriptors is computed once (from the previous one), and the averages and sums share the same segment sums.
+
+        Parameters
+        ----------
+        atomic_desc: np.array [N_atoms_total, N_desc]. The atomic descriptors of all the frames, frame after frame.
+        natom_list: the number of atoms of each frame
+        atomic_numbers: np.array [N_atoms_total]. Atomic numbers for all the atoms.
+                        The rows of atoms that are not centers of the atomic descriptors are NaN, and are left out.
+
+        Returns
+        -------
+        desc_dict: {reducer: (acronym of the reducer, np.array [N_frames, N_desc(*N_species)])}
+        """
+        atomic_desc = np.asarray(atomic_desc)
+        n_frames = len(natom_list)
+        frame_ids = np.repeat(np.arange(n_frames), natom_list)
+        # the atoms that are not centers of the atomic descriptors (NaN rows) are left out
+        if np.ndim(atomic_desc) == 2 and np.shape(atomic_desc)[1] > 0 and np.issubdtype(atomic_desc.dtype, np.floating):
+            centers = ~np.isnan(atomic_desc[:, 0])
+            if not np.all(centers):
+                atomic_desc, frame_ids, atomic_numbers = atomic_desc[centers], frame_ids[centers], np.asarray(atomic_numbers)[centers]
+        # the segments are the frames, or the species in each frame for the element-wise reducers
+        plans = {}
+        for engine in self.engines.values():
+            plan_key = self._plan_key(engine)
+            if plan_key not in plans:
+                if engine.element_wise:
+                    plans[plan_key] = segment_plan(_species_segment_ids(frame_ids, atomic_numbers, engine.species),
+                                                   n_frames * len(engine.species))
+                else:
+                    plans[plan_key] = segment_plan(frame_ids, n_frames)
+
+        # the sums of each power of the atomic descriptors, in increasing order of zeta,
+        # each power is computed from the previous one and shared by all the reducers that need it
+        sums = {}
+        power, power_zeta = atomic_desc, 1
+        for zeta in sorted(set(engine.zeta for engine in self.engines.values())):
+            power_now = next_power(atomic_desc, power, power_zeta, zeta)
+            if zeta >= power_zeta:
+                power, power_zeta = power_now, zeta
+            for plan_key in set(self._plan_key(engine) for engine in self.engines.values() if engine.zeta == zeta):
+                sums[(zeta, plan_key)] = segment_sum(power_now, plans[plan_key])
+
+        desc_dict = {}
+        for element, engine in self.engines.items():
+            plan = plans[self._plan_key(engine)]
+            desc = sums[(engine.zeta, self._plan_key(engine))]
+            if engine.average:
+                desc = desc / np.maximum(plan[3], 1)[:, None]
+            desc_dict[element] = (engine.get_acronym(), desc.reshape(n_frames, -1))
+        return desc_dict
+
 class Atomic_2_Global_Base:
     def __init__(self, k_spec):
         self.acronym = ""
@@ -108,6 +171,9 @@ class Atomic_2_Global_Base:
             except:
                 raise ValueError("Cannot do element-wise operations without specifying the global species")
             self.acronym = "-e"
+        # the power of the atomic descriptors that is reduced, and whether to average or to sum
+        self.zeta = 1
+        self.average = True
 
     def get_acronym(self):
         # we use an acronym for each descriptor, so it's easy to find it and refer to it
@@ -126,7 +192,30 @@ class Atomic_2_Global_Base:
         acronym: self.acronym
         desc:  a np.array [N_desc]. Global descriptors for a frame.
         """
-        return self.acronym, []
+        return self.acronym, self.create_batch(atomic_desc, [len(atomic_desc)], atomic_numbers)[1][0]
+
+    def create_batch(self, atomic_desc, natom_list, atomic_numbers=[]):
+        """
+        compute the global descriptor vectors for many frames at once from their atomic contributions
+        Parameters
+        ----------
+        atomic_desc: a np.array [N_atoms_total, N_desc]. Atomic descriptors of all the frames, frame after frame.
+        natom_list: the number of atoms of each frame
+        atomic_numbers: np.array [N_atoms_total]. Atomic numbers for all the atoms.
+
+        Returns
+        -------
+        acronym: self.acronym
+        desc:  a np.array [N_frames, N_desc], or [N_frames, N_desc*N_species] if element_wise
+        """
+        atomic_desc = np.asarray(atomic_desc)
+        if self.zeta != 1:
+            atomic_desc = next_power(atomic_desc, atomic_desc, 1, self.zeta)
+        frame_ids = np.repeat(np.arange(len(natom_list)), natom_list)
+        if self.element_wise:
+            return self.acronym, Descriptor_By_Species_Batch(atomic_desc, frame_ids, len(natom_list), atomic_numbers,
+                                                               self.species, self.average)
+        return self.acronym, segment_reduce(atomic_desc, frame_ids, len(natom_list), self.average)
 
 
 class Atomic_2_Global_Average(Atomic_2_Global_Base):
@@ -140,12 +229,6 @@ class Atomic_2_Global_Average(Atomic_2_Global_Base):
 
         print("Using Atomic_2_Global_Average reducer ...")
 
-    def create(self, atomic_desc, atomic_numbers=[]):
-        if self.element_wise:
-            return self.acronym, Descriptor_By_Species(atomic_desc, atomic_numbers, self.species, True)
-        else:
-            return self.acronym, np.mean(atomic_desc, axis=0)
-
 
 class Atomic_2_Global_Sum(Atomic_2_Global_Base):
     """ We just take the sum soap for all atoms"""
@@ -158,12 +241,7 @@ class Atomic_2_Global_Sum(Atomic_2_Global_Base):
 
         print("Using Atomic_2_Global_Sum reducer ...")
         self.acronym += "-sum"
-
-    def create(self, atomic_desc, atomic_numbers=[]):
-        if self.element_wise:
-            return self.acronym, Descriptor_By_Species(atomic_desc, atomic_numbers, self.species, False)
-        else:
-            return self.acronym, np.sum(atomic_desc, axis=0)
+        self.average = False
 
 class Atomic_2_Global_Moment_Average(Atomic_2_Global_Base):
     """ 
@@ -190,12 +268,6 @@ class Atomic_2_Global_Moment_Average(Atomic_2_Global_Base):
         print("Using Atomic_2_Global_Moment_Average reducer ...")
         self.acronym += "-z-"+str(self.zeta)
 
-    def create(self, atomic_desc, atomic_numbers=[]):
-        if self.element_wise:
-            return self.acronym, Descriptor_By_Species(np.power(atomic_desc, self.zeta), atomic_numbers, self.species, True)
-        else:
-            return self.acronym, np.mean(np.power(atomic_desc, self.zeta), axis=0)
-
 class Atomic_2_Global_Moment_Sum(Atomic_2_Global_Base):
     """ 
     get the global descriptor from atomic ones 
@@ -220,12 +292,128 @@ class Atomic_2_Global_Moment_Sum(Atomic_2_Global_Base):
 
         print("Using Atomic_2_Global_Moment_Sum reducer ...")
         self.acronym += "-z-"+str(self.zeta)+"-sum"
+        self.average = False
 
-    def create(self, atomic_desc, atomic_numbers=[]):
-        if self.element_wise:
-            return self.acronym, Descriptor_By_Species(np.power(atomic_desc, self.zeta), atomic_numbers, self.species, False)
-        else:
-            return self.acronym, np.sum(np.power(atomic_desc, self.zeta), axis=0)
+def segment_plan(segment_ids, n_segments):
+    """
+    group the rows by segment, so that the sums over the segments can be taken by np.add.reduceat.
+    The plan only depends on the segment ids, so it is shared by all the reductions of the same atoms.
+
+    Parameters
+    ----------
+    segment_ids: np.array of int [N_atoms]. The segment of each row, rows with a negative id are left out.
+    n_segments: int, the number of segments
+
+    Returns
+    -------
+    rows: the rows sorted by segment (None if they are already in order), or a boolean mask of the rows that are kept
+    starts: the first position of each non-empty segment among the sorted rows
+    segments: the id of each non-empty segment
+    counts: np.array [n_segments], the number of rows in each segment
+    """
+    segment_ids = np.asarray(segment_ids, dtype=np.int64)
+    rows = None
+    keep = segment_ids >= 0
+    if not np.all(keep):
+        rows = np.flatnonzero(keep)
+        segment_ids = segment_ids[rows]
+    # sort the rows by segment (the frames are usually sorted already)
+    if np.any(segment_ids[1:] < segment_ids[:-1]):
+        order = np.argsort(segment_ids, kind='stable')
+        rows = order if rows is None else rows[order]
+        segment_ids = segment_ids[order]
+    starts = np.flatnonzero(np.r_[True, segment_ids[1:] != segment_ids[:-1]]) if len(segment_ids) > 0 else np.zeros(0, dtype=np.int64)
+    counts = np.bincount(segment_ids, minlength=n_segments)
+    return rows, starts, segment_ids[starts], counts
+
+def segment_sum(atomic_desc, plan):
+    """
+    sum the rows of atomic_desc in each segment of the plan made by segment_plan
+
+    Returns
+    -------
+    desc: np.matrix [n_segments, N_desc]. Empty segments are zero.
+    """
+    rows, starts, segments, counts = plan
+    atomic_desc = np.asarray(atomic_desc)
+    desc = np.zeros((len(counts), np.shape(atomic_desc)[1]), dtype=np.result_type(atomic_desc, float))
+    if len(starts) == 0:
+        return desc
+    if rows is not None:
+        atomic_desc = atomic_desc[rows]
+    desc[segments] = np.add.reduceat(atomic_desc, starts, axis=0)
+    return desc
+
+def segment_reduce(atomic_desc, segment_ids, n_segments, average=True):
+    """
+    sum (or average) the rows of atomic_desc that have the same segment id
+
+    Parameters
+    ----------
+    atomic_desc: np.matrix. [N_atoms, N_desc].
+    segment_ids: np.array of int [N_atoms]. The segment of each row, rows with a negative id are left out.
+    n_segments: int, the number of segments
+    average: normalized by number of the rows in each segment
+
+    Returns
+    -------
+    desc: np.matrix [n_segments, N_desc]. Empty segments are zero.
+    """
+    plan = segment_plan(segment_ids, n_segments)
+    desc = segment_sum(atomic_desc, plan)
+    if average:
+        desc /= np.maximum(plan[3], 1)[:, None]
+    return desc
+
+def next_power(atomic_desc, power, power_zeta, zeta):
+    """
+    atomic_desc to the power of zeta, from power = atomic_desc to the power of power_zeta.
+    For integer powers this only takes one multiplication when zeta is power_zeta+1 or 2*power_zeta.
+    """
+    if zeta == power_zeta:
+        return power
+    if float(zeta).is_integer() and float(power_zeta).is_integer() and zeta > power_zeta:
+        if zeta == power_zeta + 1:
+            return power * atomic_desc
+        if zeta == 2 * power_zeta:
+            return power * power
+        return power * np.power(atomic_desc, int(zeta - power_zeta))
+    return np.power(atomic_desc, zeta)
+
+def _species_index(atomic_numbers, global_species):
+    """the position of each atomic number in global_species, -1 if it is not there"""
+    atomic_numbers = np.asarray(atomic_numbers, dtype=np.int64)
+    global_species = np.asarray(global_species, dtype=np.int64)
+    lookup = np.full(max(np.max(global_species), np.max(atomic_numbers, initial=0)) + 1, -1, dtype=np.int64)
+    lookup[global_species] = np.arange(len(global_species))
+    return lookup[atomic_numbers]
+
+def _species_segment_ids(frame_ids, atomic_numbers, global_species):
+    """the segment of each atom for the element-wise reductions: frame * N_species + species, or -1"""
+    species_ids = _species_index(atomic_numbers, global_species)
+    return np.where(species_ids >= 0, np.asarray(frame_ids) * len(global_species) + species_ids, -1)
+
+def Descriptor_By_Species_Batch(atomic_desc, frame_ids, n_frames, atomic_numbers, global_species, average_over_natom=True):
+    """
+    compute the average/sum descriptors for each species of each frame in one pass,
+    and concatenate the species of each frame.
+
+    Parameters
+    ----------
+    atomic_desc: np.matrix. [N_atoms_total, N_desc]. Atomic descriptors of all the frames.
+    frame_ids: np.array of int [N_atoms_total]. The frame of each atom.
+    n_frames: int, the number of frames
+    atomic_numbers: np.matrix. [N_atoms_total]. Atomic numbers for all the atoms.
+    global_species: a list of all atomic species in all frames
+    average_over_natom: normalized by number of the atoms of the same species
+
+    Returns
+    -------
+    desc: np.matrix [n_frames, N_desc*len(global_species)]. Global descriptors for the frames.
+    """
+    segment_ids = _species_segment_ids(frame_ids, atomic_numbers, global_species)
+    desc = segment_reduce(atomic_desc, segment_ids, n_frames * len(global_species), average_over_natom)
+    return desc.reshape(n_frames, -1)
 
 def Descriptor_By_Species(atomic_desc, atomic_numbers, global_species, average_over_natom=True):
     """ 
@@ -243,20 +431,5 @@ def Descriptor_By_Species(atomic_desc, atomic_numbers, global_species, average_o
     -------
     desc: np.matrix [N_desc*len(global_species)]. Global descriptors for a frame.
     """
-    desc_by_species = {}
-    for species in global_species:
-        atomic_desc_by_species = [atomic_desc[i] for i,at in enumerate(atomic_numbers) if at==species]
-        if average_over_natom and len(atomic_desc_by_species) > 0:
-            # normalize by the number of atoms
-            desc_by_species[species] = np.mean(atomic_desc_by_species, axis=0)
-        elif len(atomic_desc_by_species) > 0:
-            desc_by_species[species] = np.sum(atomic_desc_by_species, axis=0)
-        else:
-            desc_by_species[species] = 0
-        #print(np.shape(atomic_desc),len(atomic_desc))
-
-    desc_len = np.shape(atomic_desc)[1]
-    desc = np.zeros(desc_len*len(global_species),dtype=float)
-    for i, species in enumerate(global_species):
-        desc[i*desc_len:(i+1)*desc_len] = desc_by_species[species]
-    return np.asarray(desc)
+    return Descriptor_By_Species_Batch(atomic_desc, np.zeros(len(atomic_desc), dtype=np.int64), 1,
+                                       atomic_numbers, global_species, average_over_natom)[0]
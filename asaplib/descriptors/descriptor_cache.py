@@ -0,0 +1,135 @@
+"""
+On-disk cache of the computed descriptors, keyed by the content of the frame and the descriptor specifications
+"""
+import os
+import json
+import pickle
+import hashlib
+
+import numpy as np
+from ..io import NpEncoder
+
+
+def _strip_acronyms(desc_spec):
+    """the acronyms are derived from the specifications (or random), so they are left out of the key"""
+    if isinstance(desc_spec, dict):
+        return {k: _strip_acronyms(v) for k, v in desc_spec.items() if k != 'acronym'}
+    return desc_spec
+
+
+def _info_keys(desc_spec):
+    """the entries of frame.info that the descriptors read: the lists of centers, and the SMILES of the Morgan fingerprints"""
+    keys = set()
+    if isinstance(desc_spec, dict):
+        if 'info_key' in desc_spec:
+            keys.add(str(desc_spec['info_key']))
+        if desc_spec.get('type', None) == 'MORGAN':
+            keys.update(['smiles', 'SMILES'])
+        for v in desc_spec.values():
+            keys.update(_info_keys(v))
+    return keys
+
+
+class Descriptor_Cache:
+    def __init__(self, cache_dir='asap-desc-cache', max_size=10240):
+        """
+        A content-addressed cache of the descriptors of single frames.
+        The key is the sha1 hash of the positions, atomic numbers, cell and pbc of the frame,
+        the entries of frame.info that the descriptors read (e.g. the SMILES string, the list of centers),
+        together with the specifications of the descriptors.
+        Each entry is a small file in cache_dir, the least recently used entries are deleted
+        when the total size exceeds max_size.
+
+        Parameters
+        ----------
+        cache_dir: str, the directory of the cache
+        max_size: float, the maximum size of the cache in MB
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None # total size of the entries in bytes, computed on the first store
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def frame_key(self, frame, desc_spec_dict):
+        """
+        the key of the descriptors of a frame
+
+        Parameters
+        ----------
+        frame: ASE atom object
+        desc_spec_dict: dictionary, the specifications of the descriptors
+
+        Returns
+        -------
+        str, a hex digest
+        """
+        sha = hashlib.sha1()
+        sha.update(np.ascontiguousarray(frame.get_positions(), dtype=np.float64).tobytes())
+        sha.update(np.ascontiguousarray(frame.get_atomic_numbers(), dtype=np.int64).tobytes())
+        sha.update(np.ascontiguousarray(frame.get_cell()[:], dtype=np.float64).tobytes())
+        sha.update(np.ascontiguousarray(frame.get_pbc(), dtype=bool).tobytes())
+        for info_key in sorted(_info_keys(desc_spec_dict)):
+            sha.update(json.dumps([info_key, frame.info.get(info_key, None)], cls=NpEncoder).encode())
+        sha.update(json.dumps(_strip_acronyms(desc_spec_dict), sort_keys=True, cls=NpEncoder).encode())
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pkl')
+
+    def load(self, key):
+        """return the cached descriptors, or None if they are not in the cache"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        # mark the entry as recently used
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def store(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, so other processes never see a partial entry
+        tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_size * 1024 ** 2:
+            self.evict()
+
+    def _entries(self):
+        """(last used, path, size) of all the entries"""
+        entries = []
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir(): continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def evict(self):
+        """delete the least recently used entries, until the cache is below 90% of the maximum size"""
+        entries = sorted(self._entries())
+        self._size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._size <= 0.9 * self.max_size * 1024 ** 2:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._size -= size
+
+    def get_state(self):
+        return {'cache_dir': self.cache_dir, 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
@@ -43,6 +43,10 @@ class Global_Descriptors:
         # list of Atomic_Descriptor objections
         self.engines = {}
         self.acronym = ""
+        # an optional Descriptor_Cache
+        self.cache = None
+        # the Verlet skin of the neighbor lists that are kept between frames
+        self.neighbor_skin = None
 
         self.bind()
 
@@ -58,6 +62,23 @@ class Global_Descriptors:
     def pack(self):
         return json.dumps(self.desc_spec_dict, sort_keys=True, cls=NpEncoder)
 
+    def set_cache(self, cache):
+        """use a Descriptor_Cache, so the descriptors of frames that have been seen before are not recomputed"""
+        self.cache = cache
+
+    def set_neighbor_skin(self, skin=None):
+        """reuse the neighbor list between consecutive frames, see Atomic_Descriptors.set_neighbor_skin"""
+        self.neighbor_skin = skin
+        for engine in self.engines.values():
+            if isinstance(engine, Global_Descriptor_from_Atomic):
+                engine.atomic_desc.set_neighbor_skin(skin)
+
+    def cache_key(self, frame, keep_atomic=True):
+        if keep_atomic:
+            return self.cache.frame_key(frame, self.desc_spec_dict)
+        # the entries without the atomic descriptors are kept apart
+        return self.cache.frame_key(frame, {'desc_spec_dict': self.desc_spec_dict, 'keep_atomic': False})
+
     def bind(self):
         """
         binds the objects that actually compute the descriptors
@@ -69,6 +90,22 @@ class Global_Descriptors:
             self.engines[element] = self._call(self.desc_spec_dict[element])
             self.desc_spec_dict[element]['acronym'] = self.engines[element].get_acronym()
 
+    def get_acronyms(self, keep_atomic=True):
+        """
+        the acronyms of the descriptors that compute returns, without computing anything
+
+        Returns
+        -------
+        global_acronyms: {key: acronym}, or {key: {atomic descriptor: {reducer: acronym}}} for atomic to global descriptors
+        atomic_acronyms: {key: {atomic descriptor: acronym}}
+        """
+        global_acronyms, atomic_acronyms = {}, {}
+        for element in self.desc_spec_dict.keys():
+            global_acronyms[element], atomic_acronyms[element] = self.engines[element].get_acronyms()
+            if not keep_atomic:
+                atomic_acronyms[element] = {}
+        return global_acronyms, atomic_acronyms
+
     def _call(self, desc_spec):
         """
         call the specific descriptor objects
@@ -84,12 +121,14 @@ class Global_Descriptors:
         else:
             raise NotImplementedError 
 
-    def compute(self, frame):
+    def compute(self, frame, use_cache=True, keep_atomic=True):
         """
         compute the global descriptor vector and atomic descriptor matrix (if any) for a frame
         Parameters
         ----------
         frame: ASE atom object. Coordinates of a frame.
+        use_cache: bool, look up and store the result in self.cache (if any)
+        keep_atomic: bool, return the atomic descriptors. If False, they are discarded as soon as they are reduced.
 
         Returns
         -------
@@ -100,15 +139,59 @@ class Global_Descriptors:
                           and a np.array [N_desc*N_atoms]. Atomic descriptors for a frame.
                           e.g. {'ad1':{'acronym':'soap-1', 'atomic_descriptors': `a np.array [N_desc*N_atoms]`}}
         """
+        if use_cache and self.cache is not None:
+            key = self.cache_key(frame, keep_atomic)
+            result = self.cache.load(key)
+            if result is not None:
+                return result
         global_desc_dict = {} 
         atomic_desc_dict = {}
         for element in self.desc_spec_dict.keys():
             global_desc_dict[element], atomic_desc_dict[element] = self.engines[element].create(frame)
+            if not keep_atomic:
+                atomic_desc_dict[element] = {}
             #global_desc_dict_new, atomic_desc_dict_new = self.engines[element].create(frame)
             #global_desc_dict.update(global_desc_dict_new)
             #atomic_desc_dict.update(atomic_desc_dict_new)
+        if use_cache and self.cache is not None:
+            self.cache.store(key, (global_desc_dict, atomic_desc_dict))
         return global_desc_dict, atomic_desc_dict
 
+    def compute_batch(self, frames, use_cache=True, keep_atomic=True):
+        """
+        compute the global descriptors and the atomic descriptors (if any) for a list of frames,
+        each descriptor object is called once for all the frames (that are not in the cache)
+        Parameters
+        ----------
+        frames: a list of ASE atom objects
+        use_cache: bool, look up and store the results in self.cache (if any)
+        keep_atomic: bool, return the atomic descriptors. If False, they are discarded as soon as they are reduced.
+
+        Returns
+        -------
+        a list of (desc_dict, atomic_desc_dict), one for each frame, same as the output of compute()
+        """
+        results = [None] * len(frames)
+        if use_cache and self.cache is not None:
+            keys = [self.cache_key(frame, keep_atomic) for frame in frames]
+            results = [self.cache.load(key) for key in keys]
+        todo = [k for k, result in enumerate(results) if result is None]
+        if len(todo) == 0:
+            return results
+
+        batch_now = {}
+        for element in self.desc_spec_dict.keys():
+            batch_now[element] = self.engines[element].create_batch([frames[k] for k in todo], keep_atomic)
+        for n, k in enumerate(todo):
+            global_desc_dict = {}
+            atomic_desc_dict = {}
+            for element in self.desc_spec_dict.keys():
+                global_desc_dict[element], atomic_desc_dict[element] = batch_now[element][n]
+            results[k] = (global_desc_dict, atomic_desc_dict)
+            if use_cache and self.cache is not None:
+                self.cache.store(keys[k], results[k])
+        return results
+
 class Global_Descriptor_Base:
     def __init__(self, desc_spec):
         self._is_atomic = False
@@ -119,9 +202,17 @@ class Global_Descriptor_Base:
     def get_acronym(self):
         # we use an acronym for each descriptor, so it's easy to find it and refer to it
         return self.acronym
+    def get_acronyms(self):
+        # the acronyms of the global descriptors and of the atomic descriptors (if any) that create returns
+        return self.acronym, {}
     def create(self, frame):
         # return the dictionaries for global descriptors and atomic descriptors (if any)
         return {'acronym': self.acronym, 'descriptors': []}, {}
+    def create_batch(self, frames, keep_atomic=True):
+        # a list of the outputs of create(), one for each frame
+        if keep_atomic:
+            return [self.create(frame) for frame in frames]
+        return [(self.create(frame)[0], {}) for frame in frames]
 
 class Global_Descriptor_from_Atomic(Global_Descriptor_Base):
     def __init__(self, desc_spec):
@@ -178,6 +269,20 @@ class Global_Descriptor_from_Atomic(Global_Descriptor_Base):
     def pack(self):
         return {'atomic_descriptor': self.atomic_desc.pack(), 'reducer_function': atomic_2_global.pack() }
 
+    def get_acronyms(self):
+        """
+        the acronyms that create returns, which combine the acronyms of the atomic descriptors and of the reducers
+
+        Returns
+        -------
+        global_acronyms: {atomic descriptor: {reducer: acronym}}
+        atomic_acronyms: {atomic descriptor: acronym}
+        """
+        atomic_acronyms = self.atomic_desc.get_acronyms()
+        global_acronyms = {e2: {e3: atomic_acronyms[e2] + engine.get_acronym() for e3, engine in self.atomic_2_global.engines.items()}
+                           for e2 in atomic_acronyms.keys()}
+        return global_acronyms, atomic_acronyms
+
     def create(self, frame):
         """
         compute the global descriptor vector for a frame from atomic contributions
@@ -199,15 +304,32 @@ class Global_Descriptor_from_Atomic(Global_Descriptor_Base):
         # compute global descriptor for the frame
         return self.atomic_2_global.compute(atomic_desc_dict, frame.get_atomic_numbers()), atomic_desc_dict
 
+    def create_batch(self, frames, keep_atomic=True):
+        """
+        the atomic descriptors of all the frames are computed in one batch, and then reduced frame by frame.
+        If keep_atomic is False, the atomic descriptors are dropped once they are reduced,
+        so only the global descriptors are returned (e.g. sent back from a worker process).
+        """
+        atomic_desc_dict_list = self.atomic_desc.compute_batch(frames)
+        results = []
+        for k, frame in enumerate(frames):
+            desc_dict = self.atomic_2_global.compute(atomic_desc_dict_list[k], frame.get_atomic_numbers())
+            if keep_atomic:
+                results.append((desc_dict, atomic_desc_dict_list[k]))
+            else:
+                atomic_desc_dict_list[k] = None
+                results.append((desc_dict, {}))
+        return results
+
 
 class Global_Descriptor_CM(Global_Descriptor_Base):
     def __init__(self, desc_spec):
         """
-        make a DScribe CM object
+        make a Coulomb matrix descriptor, with the rows and columns sorted by their L2 norms
+        (same as the CoulombMatrix of DScribe with permutation='sorted_l2').
+        The matrices of many frames are computed together, padded to [N_frames, max_atoms, max_atoms].
         """
 
-        from dscribe.descriptors import CoulombMatrix
-
         if "type" not in desc_spec.keys() or desc_spec["type"] != "CM":
             raise ValueError("Type is not CM or cannot find the type of the descriptor")
 
@@ -220,8 +342,9 @@ class Global_Descriptor_CM(Global_Descriptor_Base):
         if 'periodic' in desc_spec.keys() and desc_spec['periodic'] == True:
             raise ValueError("Coulomb Matrix cannot be used for periodic systems")
 
+        # the number of matrix elements that are computed at a time, which bounds the memory of the temporary arrays
+        self.chunk_elements = 2 ** 22
 
-        self.cm = CoulombMatrix(self.max_atoms)
         print("Using CoulombMatrix ...")
         # make an acronym
         self.acronym = "CM" + "-" + str(self.max_atoms)
@@ -240,12 +363,63 @@ class Global_Descriptor_CM(Global_Descriptor_Base):
                    e.g. {'d1':{ 'acronym': 'CM-*', 'descriptors': `a np.array [N_desc]`}}
         atomic_desc_dict : {}
         """
-        if len(frame.get_positions()) > self.max_atoms:
+        return self.create_batch([frame])[0]
+
+    def create_batch(self, frames, keep_atomic=True):
+        """
+        compute the CM descriptor vectors for a list of frames, in chunks of frames
+
+        Returns
+        -------
+        a list of the outputs of create(), one for each frame
+        """
+        if max([len(frame) for frame in frames], default=0) > self.max_atoms:
             raise ValueError('the size of the system is larger than the max_atoms of the CM descriptor')
+        desc = np.zeros((len(frames), self.max_atoms ** 2))
+        chunk_size = max(1, self.chunk_elements // self.max_atoms ** 2)
+        for start in range(0, len(frames), chunk_size):
+            desc[start:start + chunk_size] = sorted_coulomb_matrices(frames[start:start + chunk_size], self.max_atoms).reshape(-1, self.max_atoms ** 2)
         # notice that we return an empty dictionary for "atomic descriptors"
-        return {'acronym': self.acronym, 'descriptors': self.cm.create(frame, n_jobs=1)}, {}
-        
-        
+        return [({'acronym': self.acronym, 'descriptors': desc[k]}, {}) for k in range(len(frames))]
+
+
+def sorted_coulomb_matrices(frames, max_atoms):
+    """
+    the Coulomb matrices of a list of frames, C_ij = Z_i Z_j / |R_i - R_j| and C_ii = 0.5 Z_i^2.4.
+    The rows and columns of each matrix are sorted by descending L2 norm of the rows,
+    and padded with zeros to max_atoms.
+
+    Parameters
+    ----------
+    frames: a list of ASE atom objects, each with at most max_atoms atoms
+    max_atoms: int
+
+    Returns
+    -------
+    np.array [N_frames, max_atoms, max_atoms]
+    """
+    n_atoms = np.array([len(frame) for frame in frames], dtype=int)
+    # the atoms of all the frames are padded into [N_frames, max_atoms]
+    real = np.arange(max_atoms)[None, :] < n_atoms[:, None]
+    numbers = np.zeros((len(frames), max_atoms))
+    positions = np.zeros((len(frames), max_atoms, 3))
+    if len(frames) > 0:
+        numbers[real] = np.concatenate([frame.get_atomic_numbers() for frame in frames])
+        positions[real] = np.concatenate([frame.get_positions() for frame in frames])
+
+    distances = np.sqrt(np.sum((positions[:, :, None, :] - positions[:, None, :, :]) ** 2, axis=-1))
+    # the padded atoms have no charge, so only the distances between real atoms matter
+    inverse_distances = np.divide(1., distances, out=np.zeros_like(distances), where=distances > 0)
+    cm = numbers[:, :, None] * numbers[:, None, :] * inverse_distances
+    diagonal = np.arange(max_atoms)
+    cm[:, diagonal, diagonal] = 0.5 * numbers ** 2.4
+
+    # descending norms, the padded rows have zero norms and go to the end
+    order = np.argsort(np.sqrt(np.sum(cm ** 2, axis=2)), axis=1, kind='stable')[:, ::-1]
+    cm = np.take_along_axis(cm, order[:, :, None], axis=1)
+    return np.take_along_axis(cm, order[:, None, :], axis=2)
+
+
 class Global_Descriptor_Morgan(Global_Descriptor_Base):
     def __init__(self, desc_spec):
     
@@ -266,9 +440,16 @@ class Global_Descriptor_Morgan(Global_Descriptor_Base):
         if 'periodic' in desc_spec.keys() and desc_spec['periodic'] == True:
             raise ValueError("Morgan Fingerprints cannot be used for periodic systems")
 
+        # the bits can be packed into np.uint64 words (see pack_bits), which only the 'tanimoto' kernel can use
+        if "packed" in desc_spec.keys():
+            self.packed = bool(desc_spec["packed"])
+        else:
+            self.packed = False
+
         print("Using Morgan Fingerprints ...")
         # make an acronym
         self.acronym = "MORGAN"
+        if self.packed: self.acronym += "-packed"
         
     def _get_smiles(self, frame):
         if "smiles" in frame.info:
@@ -281,8 +462,13 @@ class Global_Descriptor_Morgan(Global_Descriptor_Base):
 
     def create(self, frame):
         """
+        compute the Morgan fingerprint of the molecule given by the SMILES string in frame.info
+
         Returns
         -------
+        desc_dict: {'acronym': 'MORGAN-packed', 'descriptors': np.array of np.uint64 [ceil(length/64)]},
+                   or np.array [length] of 0. and 1. if the fingerprint is not packed
+        atomic_desc_dict : {}
         """
         
         from rdkit.Chem import MolFromSmiles
@@ -291,6 +477,55 @@ class Global_Descriptor_Morgan(Global_Descriptor_Base):
         smiles = self._get_smiles(frame)
         mol = MolFromSmiles(smiles)
         fps = GetMorganFingerprintAsBitVect(mol, radius=self.radius, nBits=self.length)
-        fps = np.array(fps, dtype='float64')
+        bits = np.frombuffer(fps.ToBitString().encode(), dtype=np.uint8) - ord('0')
+        if self.packed:
+            fps = pack_bits(bits)
+        else:
+            fps = np.array(bits, dtype='float64')
             
-        return {'acronym': self.acronym, 'descriptors': fps}
+        return {'acronym': self.acronym, 'descriptors': fps}, {}
+
+
+def pack_bits(bits):
+    """
+    pack bit vectors into 64-bit words, bit k is bit k % 64 of word k // 64
+
+    Parameters
+    ----------
+    bits: array-like of 0 and 1, [..., N_bits]
+
+    Returns
+    -------
+    np.array of np.uint64 [..., ceil(N_bits / 64)]
+    """
+    bits = np.asarray(bits, dtype=bool)
+    n_words = -(-bits.shape[-1] // 64)
+    padded = np.zeros(bits.shape[:-1] + (64 * n_words,), dtype=bool)
+    padded[..., :bits.shape[-1]] = bits
+    return np.ascontiguousarray(np.packbits(padded, axis=-1, bitorder='little')).view('<u8').astype(np.uint64)
+
+
+def is_packed_acronym(acronym):
+    """whether the descriptor with this acronym holds bit vectors packed by pack_bits, e.g. MORGAN-packed"""
+    return str(acronym).endswith('-packed')
+
+
+def packed_to_xyz(packed):
+    """the packed words as signed 64-bit integers, which the extended xyz format keeps without loss"""
+    return np.asarray(packed, dtype=np.uint64).view(np.int64)
+
+
+def packed_from_xyz(acronym, value):
+    """the inverse of packed_to_xyz, for the value of the descriptor with this acronym read from an extended xyz file"""
+    value = np.atleast_1d(value)
+    if not np.issubdtype(value.dtype, np.integer):
+        raise ValueError("The packed fingerprints " + str(acronym) + " were not read as integers, so their bits may be lost. "
+                         "Please compute them again.")
+    return value.astype(np.int64).view(np.uint64)
+
+
+def unpack_bits(packed, n_bits):
+    """the inverse of pack_bits, an array of 0. and 1. [..., n_bits]"""
+    packed = np.ascontiguousarray(packed, dtype='<u8')
+    bits = np.unpackbits(packed.view(np.uint8), axis=-1, bitorder='little')
+    return np.asarray(bits[..., :n_bits], dtype=float)
@@ -82,14 +82,27 @@ class KRRSparse(RegressorBase):
         # if (kMM.shape[0] != kMM.shape[1]):# or kMM.shape[0] != kNM.shape[1] or kNM.shape[0] != y.shape[0]):
         # raise ValueError('Shape of the kernel matrix is not consistent!')
 
+        self.fit_blocks(kMM, y, [(0, len(kNM), kNM)])
+
+    def fit_blocks(self, kMM, y, kNM_blocks):
+        '''the same as fit, with kNM given as blocks of rows'''
+        '''kNM_blocks: (start, stop, kNM[start:stop]) for consecutive blocks, e.g. from Descriptors_to_Kernels.iter_blocks,'''
+        '''so only kNM.T kNM and kNM.T y, of shape (M,M) and (M), are accumulated and the full kNM is never held'''
+        y = np.asarray(y)
+
         if self.delta is None:
             self.delta = np.std(y) / (np.trace(kMM) / len(kMM))
 
         if self.sigma is None:
             self.sigma = 0.001 * np.std(y)
 
-        sparseK = kMM * self.delta * self.sigma ** 2 + np.dot(kNM.T, kNM) * self.delta ** 2
-        sparseY = np.dot(kNM.T, y)
+        kNM_kNM = np.zeros(np.shape(kMM))
+        sparseY = np.zeros((len(kMM),) + y.shape[1:])
+        for start, stop, kNM in kNM_blocks:
+            kNM_kNM += np.dot(kNM.T, kNM)
+            sparseY += np.dot(kNM.T, y[start:stop])
+
+        sparseK = kMM * self.delta * self.sigma ** 2 + kNM_kNM * self.delta ** 2
         reg = np.eye(kMM.shape[0]) * self.jitter
 
         self.alpha = np.linalg.solve(sparseK + reg, sparseY)
@@ -10,10 +10,11 @@ import numpy as np
 from ..compressor import Sparsifier
 from ..kernel import Descriptors_to_Kernels
 from .base import RegressorBase
+from .krr import KRRSparse
 
 class SPARSE_KRR_Wrapper(RegressorBase):
 
-    def __init__(self, kernel, krr_obj, sparse_mode="fps", n_sparse=None):
+    def __init__(self, kernel, krr_obj, sparse_mode="fps", n_sparse=None, memory_budget=None):
         """
         Parameters
         ----------
@@ -27,10 +28,15 @@ class SPARSE_KRR_Wrapper(RegressorBase):
         {'k0':{"type": "cosine"}} 
         e.g.
         { 'k1': {"type": "polynomial", "d": power}}
+        e.g.
+        { 'k2': {"type": "rbf", "gamma": gamma}}
 
         krr_obj: object for doing krr. Must have .fit() and .predict() methods
         sparsemode: str, default='fps', Sparsification method to use ([fps], [cur])'
         n_sparse: int, number of the representative samples, negative means no sparsification
+        memory_budget: float, in MB. If given, the kernel matrices are computed in blocks of rows within the budget,
+                       and fit (with KRRSparse) and predict work on one block at a time,
+                       so the full kNM is never held in memory.
          
         """
         self.sparse_mode = sparse_mode
@@ -42,7 +48,7 @@ class SPARSE_KRR_Wrapper(RegressorBase):
 
         self.kernel = kernel
         # object for transform design matrix to kernel matrix
-        self.k_transform = Descriptors_to_Kernels(kernel)
+        self.k_transform = Descriptors_to_Kernels(kernel, memory_budget)
 
         # object for doing krr
         self.krr = krr_obj
@@ -90,9 +96,13 @@ class SPARSE_KRR_Wrapper(RegressorBase):
         '''kNM: the kernel matrix between the representative and the train structures with shape (N,M)'''
         self._sparsify(X)
         kMM = self.k_transform.compute(self.desc_sbs)
-        kNM = self.k_transform.compute(X, self.desc_sbs)
-        print(np.shape(kNM))
-        self.krr.fit(kMM, y, kNM)
+        if isinstance(self.krr, KRRSparse):
+            # only kNM.T kNM and kNM.T y are needed, which are summed over the blocks of rows of kNM
+            self.krr.fit_blocks(kMM, y, self.k_transform.iter_blocks(X, self.desc_sbs))
+        else:
+            kNM = self.k_transform.compute(X, self.desc_sbs)
+            print(np.shape(kNM))
+            self.krr.fit(kMM, y, kNM)
 
         self._fitted = True
 
@@ -100,8 +110,8 @@ class SPARSE_KRR_Wrapper(RegressorBase):
         '''desc.shape is expected as [n_descriptors, n_samples]'''
         if not self._fitted:
             raise RuntimeError("The model has not been fitted yet, please fit it and then use predict.")
-        kNM = self.k_transform.compute(X, self.desc_sbs)
-        return self.krr.predict(kNM)
+        # the prediction of each sample only depends on its row of kNM
+        return np.concatenate([self.krr.predict(kNM) for _, _, kNM in self.k_transform.iter_blocks(X, self.desc_sbs)])
 
     def get_params(self, deep=True):
         pass
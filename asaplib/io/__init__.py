@@ -1,2 +1,5 @@
 from .io_cell import *
 from .io_parse import *
+from .xyz_index import *
+from .desc_container import *
+from .io_symmetry import *
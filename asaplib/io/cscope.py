@@ -70,6 +70,8 @@ def _frame_to_json(frame):
 
 
 def _generate_environments(frames, cutoff):
+    # chemiscope finds the neighbors within the cutoff itself, and needs one environment
+    # per atom to match the atomic properties, so no neighbor search is done here
     environments = []
     for frame_id, frame in enumerate(frames):
         for center in range(len(frame)):
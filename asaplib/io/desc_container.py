@@ -0,0 +1,119 @@
+"""
+Binary container for the descriptors, stored next to the xyz file:
+a directory with one .npy file per acronym, which can be memory-mapped,
+and a JSON manifest that records the descriptor specifications and the acronyms
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .io_parse import NpEncoder
+from .xyz_index import file_stamp
+
+DESC_CONTAINER_SUFFIX = '.asapdesc'
+MANIFEST_NAME = 'manifest.json'
+
+
+def desc_container_path(fxyz):
+    """the binary descriptor container that goes with an xyz file, e.g. ASAP-desc.xyz -> ASAP-desc.asapdesc"""
+    return os.path.splitext(str(fxyz))[0] + DESC_CONTAINER_SUFFIX
+
+
+def _array_file_name(acronym):
+    return acronym.replace(os.sep, '_') + '.npy'
+
+
+def remove_desc_container(path):
+    """
+    remove a binary descriptor container.
+    Arrays that are memory-mapped from it stay readable until they are closed.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def desc_container_is_current(manifest, fxyz):
+    """whether the container was written for the xyz file as it is now (same size and modification time)"""
+    stamp = manifest.get('xyz_stamp', None)
+    return stamp is not None and os.path.isfile(fxyz) and np.array_equal(stamp, file_stamp(fxyz))
+
+
+class Descriptor_Container_Writer:
+    def __init__(self, path, nframes, total_natoms):
+        """
+        Write the descriptors into a binary container, one array at a time.
+        The arrays are written through a memory map, so only the rows being copied need to be in memory.
+        An existing container at the same path is replaced.
+
+        Parameters
+        ----------
+        path: str, the directory of the container
+        nframes: int, number of frames
+        total_natoms: int, number of atoms of all the frames
+        """
+        self.path = path
+        remove_desc_container(self.path)
+        os.makedirs(os.path.join(self.path, 'global'), exist_ok=True)
+        os.makedirs(os.path.join(self.path, 'atomic'), exist_ok=True)
+        self.manifest = {'nframes': int(nframes), 'total_natoms': int(total_natoms), 'global': {}, 'atomic': {}}
+
+    def new_array(self, kind, acronym, shape, dtype=float):
+        """
+        make a memory-mapped .npy file for the descriptor
+
+        Parameters
+        ----------
+        kind: 'global' or 'atomic'
+        acronym: str, the name of the descriptor
+        shape: the shape of the array
+
+        Returns
+        -------
+        a writable np.memmap
+        """
+        file_name = os.path.join(kind, _array_file_name(acronym))
+        self.manifest[kind][acronym] = file_name
+        return open_memmap(os.path.join(self.path, file_name), mode='w+', dtype=dtype, shape=tuple(shape))
+
+    def close(self, computed_desc_dict={}, tag_to_acronym={}, fxyz=None):
+        """
+        write the manifest
+
+        Parameters
+        ----------
+        fxyz: str, the xyz file that the container goes with.
+              Its size and modification time are recorded, and the container is only loaded together with the same file.
+        """
+        self.manifest['computed_desc_dict'] = computed_desc_dict
+        self.manifest['xyz_stamp'] = file_stamp(fxyz) if fxyz is not None and os.path.isfile(fxyz) else None
+        self.manifest['tag_to_acronym'] = tag_to_acronym
+        with open(os.path.join(self.path, MANIFEST_NAME), 'w') as jd:
+            json.dump(self.manifest, jd, sort_keys=True, cls=NpEncoder)
+
+
+def load_desc_container(path, mmap_mode='r'):
+    """
+    load a binary descriptor container
+
+    Parameters
+    ----------
+    path: str, the directory of the container
+    mmap_mode: passed to np.load, None reads the arrays into memory
+
+    Returns
+    -------
+    manifest: dict
+    global_desc: dict, acronym -> np.array [nframes, n_desc]
+    atomic_desc: dict, acronym -> np.array [total_natoms, n_desc]
+    """
+    with open(os.path.join(path, MANIFEST_NAME), 'r') as jd:
+        manifest = json.load(jd)
+    global_desc = {acronym: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+                   for acronym, file_name in manifest['global'].items()}
+    atomic_desc = {acronym: np.load(os.path.join(path, file_name), mmap_mode=mmap_mode)
+                   for acronym, file_name in manifest['atomic'].items()}
+    return manifest, global_desc, atomic_desc
@@ -8,10 +8,19 @@ import numpy as np
 
 
 def pbcdist(q1, q2, h, ih):
-    s = np.dot(ih, q1 - q2)
-    for i in range(3):
-        s[i] -= round(s[i])
-    return np.dot(h, s)
+    """Returns the minimum image of the separation vectors q1 - q2.
+
+    Args:
+       q1, q2: positions, either single vectors [3] or arrays of vectors [N, 3].
+       h: Cell matrix in column vector form.
+       ih: Inverse of the cell matrix.
+
+    Returns:
+       The separation vector(s), same shape as q1 - q2.
+    """
+    s = np.dot(np.asarray(q1) - np.asarray(q2), np.transpose(ih))
+    s -= np.round(s)
+    return np.dot(s, np.transpose(h))
 
 
 def h2abc(h):
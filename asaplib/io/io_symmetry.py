@@ -0,0 +1,112 @@
+"""
+Functions for the crystal symmetry of frames, using spglib
+"""
+
+import numpy as np
+
+
+def spglib_cell(frame):
+    """the (lattice, scaled positions, atomic numbers) tuple of an ASE atom object, as taken by spglib"""
+    return (np.asarray(frame.get_cell()[:], dtype=float), frame.get_scaled_positions(wrap=False),
+            np.asarray(frame.get_atomic_numbers(), dtype=int))
+
+
+def has_cell(frame):
+    """whether the frame is periodic along all directions, with a cell of finite volume"""
+    return bool(np.all(frame.get_pbc())) and abs(np.linalg.det(frame.get_cell()[:])) > 1e-12
+
+
+def get_equivalent_atoms(frame, symprec=1e-2):
+    """
+    the symmetry-equivalent atoms of a crystal
+
+    Parameters
+    ----------
+    frame: ASE atom object
+    symprec: float, the tolerance of spglib in Angstrom
+
+    Returns
+    -------
+    np.array of int [N_atoms], the index of the representative (symmetry-unique) atom of each atom.
+    For frames without a periodic cell, or if spglib cannot find the symmetry, each atom is its own representative.
+    """
+    if not has_cell(frame):
+        return np.arange(len(frame))
+    import spglib
+    dataset = spglib.get_symmetry_dataset(spglib_cell(frame), symprec=symprec)
+    if dataset is None:
+        return np.arange(len(frame))
+    equivalent_atoms = dataset['equivalent_atoms'] if isinstance(dataset, dict) else dataset.equivalent_atoms
+    return np.asarray(equivalent_atoms, dtype=int)
+
+
+def get_spacegroup(frame, symprec=1e-2):
+    """the international symbol and number of the space group, e.g. 'Fm-3m (225)', None if spglib cannot find it"""
+    import spglib
+    return spglib.get_spacegroup(spglib_cell(frame), symprec=symprec)
+
+
+def get_standardized_cell(frame, symprec=1e-2):
+    """
+    the primitive cell of a crystal
+
+    Returns
+    -------
+    (lattice, scaled_positions, numbers), see spglib.standardize_cell
+    """
+    import spglib
+    return spglib.standardize_cell(spglib_cell(frame), to_primitive=1, no_idealize=1, symprec=symprec)
+
+
+# the symmetry analyses that can be done by compute_symmetry
+_symmetry_functions = {'spacegroup': get_spacegroup, 'standardize': get_standardized_cell}
+
+
+def _symmetry_block(method, frames, symprec):
+    return [_symmetry_functions[method](frame, symprec) for frame in frames]
+
+
+def compute_symmetry(frames, method='spacegroup', symprec=1e-2, n_process=1, cache=None):
+    """
+    the symmetry analysis of a list of frames, on a pool of processes
+
+    Parameters
+    ----------
+    frames: a list of ASE atom objects
+    method: 'spacegroup' (see get_spacegroup) or 'standardize' (see get_standardized_cell)
+    symprec: float, the tolerance of spglib in Angstrom
+    n_process: int, number of worker processes. The frames are sent to the workers in blocks.
+    cache: a Descriptor_Cache object. The results are keyed by the content of the frame, the method and symprec,
+           so analysing the same structures again takes no time.
+
+    Returns
+    -------
+    a list of the results, one for each frame
+    """
+    if method not in _symmetry_functions:
+        raise ValueError("Cannot understand the symmetry analysis: " + str(method))
+    if n_process < 1:
+        raise ValueError("Please set the number of processes to be a positive integer.")
+    results = [None] * len(frames)
+    missing = list(range(len(frames)))
+    if cache is not None:
+        keys = [cache.frame_key(frame, {'symmetry': method, 'symprec': symprec}) for frame in frames]
+        results = [cache.load(key) for key in keys]
+        missing = [k for k, result in enumerate(results) if result is None]
+    if len(missing) == 0:
+        return results
+
+    if n_process == 1:
+        results_now = _symmetry_block(method, [frames[k] for k in missing], symprec)
+    else:
+        from joblib import Parallel, delayed
+        # a few blocks per process, so that the load is balanced and the overhead per frame is small
+        blocks = [block for block in np.array_split(np.asarray(missing), 4 * n_process) if len(block) > 0]
+        results_now = sum(Parallel(n_jobs=n_process)(delayed(_symmetry_block)(method, [frames[k] for k in block], symprec)
+                                                     for block in blocks), [])
+    for k, result in zip(missing, results_now):
+        results[k] = result
+        # spglib returns None if it fails, which is not cached
+        if cache is not None and result is not None:
+            cache.store(keys[k], result)
+    return results
@@ -0,0 +1,196 @@
+"""
+Byte-offset index for (extended) xyz files,
+which allows random access to the frames without parsing the whole file
+"""
+
+import os
+import re
+from io import StringIO
+from itertools import islice
+from collections import Counter
+
+import numpy as np
+from ase.data import atomic_numbers as symbol_to_number
+from ase.io import read
+from joblib import Parallel, delayed
+
+INDEX_SUFFIX = '.asap-index.npz'
+
+
+def file_stamp(fname):
+    """the size and the modification time of a file, which tell whether it has changed"""
+    stat = os.stat(fname)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def _species_column(comment_line):
+    """find which column of the atom lines holds the chemical species"""
+    properties = re.search(r'Properties=["\']?([^\s"\']+)', comment_line)
+    if properties is None:
+        # plain xyz file
+        return 0
+    fields = properties.group(1).split(':')
+    column = 0
+    for name, n_col in zip(fields[0::3], fields[2::3]):
+        if name.lower() in ('species', 'z'):
+            return column
+        column += int(n_col)
+    raise ValueError('Cannot find the species column in the Properties of the extended xyz file')
+
+
+def _read_byte_ranges(fxyz, fileformat, starts, stops):
+    """parse the frames stored in the byte ranges [starts[k], stops[k]) of the file, adjacent ranges are read in one go"""
+    frames = []
+    with open(fxyz, 'rb') as f:
+        run_start = 0
+        for k in range(1, len(starts) + 1):
+            if k == len(starts) or starts[k] != stops[k - 1]:
+                f.seek(starts[run_start])
+                text = f.read(stops[k - 1] - starts[run_start]).decode()
+                frames += read(StringIO(text), index=':', **fileformat)
+                run_start = k
+    return frames
+
+
+def _to_atomic_number(symbol):
+    if symbol.isdigit():
+        return int(symbol)
+    return symbol_to_number[symbol.capitalize()]
+
+
+class XYZ_Index:
+    def __init__(self, fxyz, fileformat={}, rebuild=False):
+        """
+        A sidecar index of an extended xyz file.
+        For each frame we record the byte offset, the number of atoms and the number of atoms of each species.
+        The index is written next to the xyz file (fxyz + '.asap-index.npz')
+        and is rebuilt automatically when the size or the modification time of the xyz file changes.
+
+        Parameters
+        ----------
+        fxyz: string_like, the path to the extended xyz file
+        fileformat: dictionary, additional arguments passed to ase.io.read when parsing the frames
+        rebuild: bool, ignore the existing index file and build a new one
+        """
+        self.fxyz = fxyz
+        self.findex = str(fxyz) + INDEX_SUFFIX
+        self.fileformat = dict(fileformat)
+        if 'format' not in self.fileformat:
+            self.fileformat['format'] = 'extxyz'
+
+        self.offsets = None # byte offsets of the frames, with the end of the last frame appended [nframes+1]
+        self.natoms = None # number of atoms of each frame [nframes]
+        self.species = [] # sorted list of the atomic numbers in the file
+        self.species_count = None # number of atoms of each species in each frame [nframes, n_species]
+
+        if rebuild or not self.load():
+            self.build()
+            self.save()
+
+    @staticmethod
+    def is_indexable(fxyz, fileformat={}):
+        """only the (extended) xyz format has the simple layout that we can index"""
+        if fileformat.get('format', 'extxyz') not in ('extxyz', 'xyz'):
+            return False
+        return os.path.isfile(fxyz) and os.path.splitext(fxyz)[1].lower() in ('.xyz', '.extxyz')
+
+    def get_num_frames(self):
+        return len(self.natoms)
+
+    def _file_stamp(self):
+        return file_stamp(self.fxyz)
+
+    def load(self):
+        """load the index file, return False if it does not exist or is outdated"""
+        if not os.path.isfile(self.findex):
+            return False
+        try:
+            with np.load(self.findex) as index:
+                if not np.array_equal(index['stamp'], self._file_stamp()):
+                    print("The xyz file has changed since the index was built: ", self.fxyz)
+                    return False
+                self.offsets = index['offsets']
+                self.natoms = index['natoms']
+                self.species = index['species'].tolist()
+                self.species_count = index['species_count']
+        except:
+            return False
+        return True
+
+    def save(self):
+        try:
+            with open(self.findex, 'wb') as f:
+                np.savez(f, stamp=self._file_stamp(), offsets=self.offsets, natoms=self.natoms,
+                         species=np.asarray(self.species, dtype=np.int64), species_count=self.species_count)
+        except OSError:
+            print("Warning: cannot write the index file ", self.findex, ", the index is only kept in memory.")
+
+    def build(self):
+        """scan through the file once, without parsing the coordinates"""
+        offsets, natoms, counters = [], [], []
+        offset = 0
+        with open(self.fxyz, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    # blank lines between or after the frames
+                    offset += len(line)
+                    continue
+                natom_now = int(line)
+                comment = f.readline()
+                column = _species_column(comment.decode())
+                lines = list(islice(f, natom_now))
+                if len(lines) < natom_now:
+                    raise ValueError('The xyz file ' + str(self.fxyz) + ' is truncated')
+                offsets.append(offset)
+                natoms.append(natom_now)
+                counters.append(Counter(l.split()[column] for l in lines))
+                offset += len(line) + len(comment) + sum(len(l) for l in lines)
+        offsets.append(offset)
+
+        symbols = sorted(set().union(*counters), key=lambda s: _to_atomic_number(s.decode()))
+        self.species = [_to_atomic_number(s.decode()) for s in symbols]
+        self.species_count = np.zeros((len(counters), len(symbols)), dtype=np.int64)
+        for i, counter in enumerate(counters):
+            for j, s in enumerate(symbols):
+                self.species_count[i, j] = counter.get(s, 0)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.natoms = np.asarray(natoms, dtype=np.int64)
+        print("Built the index of the xyz file: ", self.fxyz, " with ", len(self.natoms), " frames.")
+
+    def get_natom_list_by_species(self, species_name):
+        if species_name not in self.species:
+            return np.zeros(len(self.natoms), dtype=np.int64)
+        return self.species_count[:, self.species.index(species_name)]
+
+    def read_frames(self, frame_ids, n_process=1):
+        """
+        parse the selected frames, consecutive frames are read in one go
+
+        Parameters
+        ----------
+        frame_ids: array, integer. The frames to read, in the order they are returned.
+        n_process: int, split the frames into blocks of roughly equal size in bytes,
+                   and parse the blocks in a pool of processes
+
+        Returns
+        -------
+        a list of ase.Atoms objects
+        """
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        if len(frame_ids) == 0:
+            return []
+        starts, stops = self.offsets[frame_ids], self.offsets[frame_ids + 1]
+        if n_process == 1 or len(frame_ids) == 1:
+            return _read_byte_ranges(self.fxyz, self.fileformat, starts, stops)
+
+        # a few blocks per process, cut on frame boundaries, to balance the load
+        cumulative_bytes = np.cumsum(stops - starts)
+        n_blocks = min(len(frame_ids), 4 * n_process)
+        cuts = np.searchsorted(cumulative_bytes, np.linspace(0, cumulative_bytes[-1], n_blocks + 1)[1:-1])
+        blocks = [b for b in np.split(np.arange(len(frame_ids)), np.unique(cuts)) if len(b) > 0]
+        results = Parallel(n_jobs=n_process)(delayed(_read_byte_ranges)(self.fxyz, self.fileformat, starts[b], stops[b])
+                                             for b in blocks)
+        return [frame for frames_now in results for frame in frames_now]
@@ -11,20 +11,24 @@ based on the coordinates of descriptors d(a) and d(b)
 """
 import numpy as np
 import json
-from .ml_kernel_operations import normalizekernel
+from ..io import NpEncoder
 
 class Descriptors_to_Kernels:
-    def __init__(self, k_spec_dict={}):
+    def __init__(self, k_spec_dict={}, memory_budget=None):
         """
         Object handing the specification and the computation of atomic descriptors
         Parameters
         ----------
+        memory_budget: float, in MB. If given, the kernel matrix is computed in blocks of rows,
+                       so the temporary arrays of each block fit in the budget (see compute and iter_blocks).
         k_spec_dict: dictionaries that specify which way to convert descriptors into kernel matrix
         e.g.
         k_spec_dict = {
         "first_kernel": {"type": 'linear', "normalize" = True},
         "second_kernel": {"type": 'cosine'},
-        "third_kernel": {"type": 'polynormial', "d":3, "normalize" = True}
+        "third_kernel": {"type": 'polynormial', "d":3, "normalize" = True},
+        "fourth_kernel": {"type": 'tanimoto'},
+        "fifth_kernel": {"type": 'rbf', "gamma": 0.5}
         }
 
         Notice that we can specify multiple kernels here.
@@ -37,6 +41,7 @@ class Descriptors_to_Kernels:
         # list of kernel (similarity measurement) objects
         self.engines = {}
         self.acronym = ""
+        self.memory_budget = memory_budget
 
         self.bind()
 
@@ -82,45 +87,189 @@ class Descriptors_to_Kernels:
             return Kernel_Function_Polynomial(k_spec)
         if k_spec["type"] == "cosine":
             return Kernel_Function_Cosine(k_spec)
+        if k_spec["type"] == "tanimoto":
+            return Kernel_Function_Tanimoto(k_spec)
+        if k_spec["type"] == "rbf":
+            return Kernel_Function_RBF(k_spec)
+        if k_spec["type"] == "laplacian":
+            return Kernel_Function_Laplacian(k_spec)
         else:
             raise NotImplementedError 
 
-    def compute(self, desc_a, desc_b=None):
+    def block_rows(self, n_b, memory_budget=None):
+        """the number of rows of a block of the kernel matrix with n_b columns, within the memory budget"""
+        if memory_budget is None: memory_budget = self.memory_budget
+        if memory_budget is None:
+            return None
+        # the block itself, and the temporary block of one kernel function
+        return max(1, int(memory_budget * 1024 ** 2 // (2 * 8 * max(1, n_b))))
+
+    def iter_blocks(self, desc_a, desc_b=None, memory_budget=None, upper=False):
+        """
+        compute the kernel matrix block by block of rows of desc_a, see compute
+
+        Parameters
+        ----------
+        upper: bool, only for desc_b=None: compute the upper triangle of the symmetric kernel matrix,
+               i.e. each block only has the columns from start on
+
+        Returns
+        -------
+        a generator of (start, stop, k_block), k_block is the kernel matrix between desc_a[start:stop] and desc_b
+        (or desc_a[start:] if upper)
+        """
+        if upper and desc_b is not None:
+            raise ValueError("Only the kernel matrix of desc_a with itself is symmetric.")
+        if desc_b is None:
+            desc_b = desc_a
+        for element in self.k_spec_dict.keys():
+            self.engines[element].check_input(desc_a, desc_b)
+        n_a = len(desc_a)
+        n_b = len(desc_b)
+        rows = self.block_rows(n_b, memory_budget)
+        if rows is None:
+            # the upper triangle is still done in a few blocks, so most of the lower triangle is skipped
+            rows = max(1, -(-n_a // 8)) if upper else max(1, n_a)
+
+        # the normalization needs the "diagonal" k(a_i, b_i) of the whole matrix,
+        # and the norms of the rows (if an engine needs them) are computed once for all the blocks
+        diagonals, norms = {}, {}
+        for element in self.k_spec_dict.keys():
+            if self.engines[element].normalize and n_a == n_b:
+                diagonals[element] = np.sqrt(self.engines[element].pair_kernel(desc_a, desc_b))
+            norms_a = self.engines[element].row_norms(desc_a)
+            norms[element] = (norms_a, norms_a if desc_b is desc_a else self.engines[element].row_norms(desc_b))
+
+        for start in range(0, n_a, rows):
+            stop = min(start + rows, n_a)
+            col_start = start if upper else 0
+            k_block = np.zeros((stop - start, n_b - col_start), dtype=float)
+            for element in self.k_spec_dict.keys():
+                norms_a, norms_b = norms[element]
+                k_now = self.engines[element].transform_block(desc_a[start:stop], desc_b[col_start:],
+                                                              None if norms_a is None else norms_a[start:stop],
+                                                              None if norms_b is None else norms_b[col_start:])
+                if element in diagonals:
+                    k_now = normalize_block(k_now, diagonals[element], start, col_start)
+                k_block += k_now
+            yield start, stop, k_block
+
+    def compute(self, desc_a, desc_b=None, memory_budget=None, out=None, packed=False):
         """
         compute the global descriptor vector for a frame from atomic contributions
         Parameters
         ----------
         desc : array-like, shape=[n_descriptors, n_samples]
             design matrix
+        desc_b: array-like, shape=[n_descriptors_b, n_samples]. None means desc_a,
+                and then only the upper triangle of the symmetric kernel matrix is computed, and mirrored.
+        memory_budget: float, in MB, the memory of the temporary arrays of each block of rows.
+                       Default is self.memory_budget. None computes the whole matrix in one block.
+        out: None, an array of shape [n_a, n_b] to write into, or the name of a .npy file,
+             which is written as a memory-mapped array
+        packed: bool, only for desc_b=None: return the upper triangle of the kernel matrix row by row,
+                as an array [n_a*(n_a+1)/2], see unpack_triangle
 
         Returns
         -------
         k_mat : array-like, shape=[n_samples, n_samples]
             design matrix
         """
+        symmetric = desc_b is None
+        if packed and not symmetric:
+            raise ValueError("Only the kernel matrix of desc_a with itself can be packed.")
         if desc_b is None:
             desc_b = desc_a
 
         n_a = len(desc_a)
         n_b = len(desc_b)
 
-        k_mat = np.zeros((n_a,n_b), dtype=float)
-        for element in self.k_spec_dict.keys():
-            #print(np.shape(k_mat), np.shape(self.engines[element].transform(desc_a, desc_b)))
-            k_mat += self.engines[element].transform(desc_a, desc_b)
+        shape = (n_a * (n_a + 1) // 2,) if packed else (n_a, n_b)
+        if out is None:
+            k_mat = np.zeros(shape, dtype=float)
+        elif isinstance(out, str):
+            k_mat = np.lib.format.open_memmap(out, mode='w+', dtype=float, shape=shape)
+        else:
+            k_mat = out
+            if np.shape(k_mat) != shape:
+                raise ValueError("The output array does not have the shape of the kernel matrix.")
+        for start, stop, k_block in self.iter_blocks(desc_a, None if symmetric else desc_b, memory_budget, upper=symmetric):
+            if packed:
+                # row i of the upper triangle starts at i*n_a - i*(i-1)/2
+                offset = start * n_a - start * (start - 1) // 2
+                k_upper = k_block[np.triu(np.ones(k_block.shape, dtype=bool))]
+                k_mat[offset:offset + len(k_upper)] = k_upper
+            elif symmetric:
+                k_mat[start:stop, start:] = k_block
+                k_mat[start:, start:stop] = k_block.T
+            else:
+                k_mat[start:stop] = k_block
+        if isinstance(k_mat, np.memmap):
+            k_mat.flush()
             
         # this is not normalized!
         return k_mat
 
+def unpack_triangle(packed, n=None):
+    """
+    the symmetric matrix [n, n] from its upper triangle stored row by row (see Descriptors_to_Kernels.compute)
+    """
+    if n is None:
+        n = int(round((np.sqrt(8 * len(packed) + 1) - 1) / 2))
+    if len(packed) != n * (n + 1) // 2:
+        raise ValueError("The length of the packed array does not match a triangle.")
+    k_mat = np.zeros((n, n), dtype=np.asarray(packed).dtype)
+    rows, cols = np.triu_indices(n)
+    k_mat[rows, cols] = packed
+    k_mat[cols, rows] = packed
+    return k_mat
+
+def normalize_block(k_block, diagonal, start=0, col_start=0):
+    """
+    normalize the block at rows start:start+len(k_block) and columns from col_start on of a square kernel matrix,
+    k_ij / sqrt(k_ii k_jj), same as normalizekernel for the whole matrix
+
+    Parameters
+    ----------
+    k_block: array [n_rows, n_cols], it is normalized in place
+    diagonal: array [n], the square roots of the diagonal of the whole kernel matrix
+    """
+    k_block /= diagonal[start:start + len(k_block), None]
+    k_block /= diagonal[None, col_start:col_start + k_block.shape[1]]
+    rows = np.arange(len(k_block))
+    on_block = (start + rows >= col_start) & (start + rows < col_start + k_block.shape[1])
+    k_block[rows[on_block], start + rows[on_block] - col_start] = 1.0
+    return np.minimum(k_block, 1, out=k_block)
+
 class Kernel_Function_Base:
     def __init__(self, k_spec):
         self.acronym = ""
+        self.normalize = False
         pass
     def get_acronym(self):
         # we use an acronym for each descriptor, so it's easy to find it and refer to it
         return self.acronym
-    def transform(self, desc_a, desc_b):
+    def row_norms(self, desc):
+        # what transform_block needs to know about each row of the descriptors (if anything),
+        # which iter_blocks computes once per kernel matrix and slices for each block
+        return None
+    def check_input(self, desc_a, desc_b):
+        # the fingerprints packed into np.uint64 words are bits, not features
+        if np.asarray(desc_a).dtype == np.uint64 or np.asarray(desc_b).dtype == np.uint64:
+            raise ValueError("The " + self.acronym + " kernel cannot use packed fingerprints (np.uint64 words), "
+                             "use the tanimoto kernel, or unpack them with unpack_bits.")
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        # the kernel matrix between desc_a and desc_b, without the normalization
         return []
+    def pair_kernel(self, desc_a, desc_b):
+        # the kernels k(a_i, b_i) between the rows of desc_a and desc_b
+        return np.array([self.transform_block(desc_a[i:i + 1], desc_b[i:i + 1])[0, 0] for i in range(len(desc_a))])
+    def transform(self, desc_a, desc_b):
+        self.check_input(desc_a, desc_b)
+        if self.normalize and len(desc_a) == len(desc_b):
+            return normalize_block(self.transform_block(desc_a, desc_b), np.sqrt(self.pair_kernel(desc_a, desc_b)))
+        else:
+            return self.transform_block(desc_a, desc_b)
 
 class Kernel_Function_Linear(Kernel_Function_Base):
     def __init__(self, k_spec):
@@ -129,11 +278,10 @@ class Kernel_Function_Linear(Kernel_Function_Base):
             self.normalize =  k_spec['normalize']
         except:
             self.normalize = False
-    def transform(self, desc_a, desc_b):
-        if self.normalize and len(desc_a) == len(desc_b):
-            return normalizekernel(np.dot(desc_a, desc_b.T))
-        else:
-            return np.dot(desc_a, desc_b.T)
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        return np.dot(desc_a, desc_b.T)
+    def pair_kernel(self, desc_a, desc_b):
+        return np.einsum('ij,ij->i', desc_a, desc_b)
 
 class Kernel_Function_Polynomial(Kernel_Function_Base):
     def __init__(self, k_spec):
@@ -143,16 +291,142 @@ class Kernel_Function_Polynomial(Kernel_Function_Base):
             self.normalize =  k_spec['normalize']
         except:
             self.normalize = False
-    def transform(self, desc_a, desc_b):
-        if self.normalize and len(desc_a) == len(desc_b):
-            return normalizekernel(np.power(np.dot(desc_a, desc_b.T),self.d))
-        else:
-            return np.power(np.dot(desc_a, desc_b.T),self.d)
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        k_block = np.dot(desc_a, desc_b.T)
+        return np.power(k_block, self.d, out=k_block)
+    def pair_kernel(self, desc_a, desc_b):
+        return np.power(np.einsum('ij,ij->i', desc_a, desc_b), self.d)
 
 class Kernel_Function_Cosine(Kernel_Function_Base):
     def __init__(self, k_spec):
         self.acronym = 'cos'
-    def transform(self, desc_a, desc_b):
-        from sklearn.metrics.pairwise import cosine_similarity as sk_cos_sim
-        return sk_cos_sim(desc_a, desc_b)
+        self.normalize = False
+    def row_norms(self, desc):
+        return squared_norms(desc)
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        k_block = np.dot(desc_a, desc_b.T)
+        if norms_a is None: norms_a = self.row_norms(desc_a)
+        if norms_b is None: norms_b = self.row_norms(desc_b)
+        norms_a, norms_b = np.sqrt(norms_a), np.sqrt(norms_b)
+        # zero vectors have zero similarity to everything, same as sklearn
+        k_block /= np.where(norms_a > 0, norms_a, 1)[:, None]
+        k_block /= np.where(norms_b > 0, norms_b, 1)[None, :]
+        return k_block
+
+class Kernel_Function_RBF(Kernel_Function_Base):
+    def __init__(self, k_spec):
+        """
+        Gaussian (RBF) kernel, k(a,b) = exp(-gamma |a-b|^2)
+
+        Parameters
+        ----------
+        k_spec: {"type": 'rbf', "gamma": gamma}, the default gamma is 1/n_descriptors
+        """
+        self.acronym = 'rbf'
+        self.normalize = False
+        self.gamma = k_spec.get('gamma', None)
+        if self.gamma is not None: self.acronym += '-' + str(self.gamma)
+    def _gamma(self, desc):
+        return 1. / np.shape(desc)[1] if self.gamma is None else self.gamma
+    def row_norms(self, desc):
+        return squared_norms(desc)
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        k_block = negative_squared_distances(desc_a, desc_b, norms_a, norms_b)
+        k_block *= self._gamma(desc_a)
+        return np.exp(k_block, out=k_block)
+    def pair_kernel(self, desc_a, desc_b):
+        return np.exp(-self._gamma(desc_a) * np.sum((desc_a - desc_b) ** 2, axis=1))
+
+class Kernel_Function_Laplacian(Kernel_Function_RBF):
+    def __init__(self, k_spec):
+        """
+        Laplacian kernel on the Euclidean distance, k(a,b) = exp(-gamma |a-b|)
+
+        Parameters
+        ----------
+        k_spec: {"type": 'laplacian', "gamma": gamma}, the default gamma is 1/n_descriptors
+        """
+        super().__init__(k_spec)
+        self.acronym = self.acronym.replace('rbf', 'laplacian')
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        k_block = negative_squared_distances(desc_a, desc_b, norms_a, norms_b)
+        np.negative(k_block, out=k_block)
+        np.sqrt(k_block, out=k_block)
+        k_block *= -self._gamma(desc_a)
+        return np.exp(k_block, out=k_block)
+    def pair_kernel(self, desc_a, desc_b):
+        return np.exp(-self._gamma(desc_a) * np.sqrt(np.sum((desc_a - desc_b) ** 2, axis=1)))
+
+def squared_norms(desc):
+    """the squared norms of the rows of the descriptors"""
+    desc = np.asarray(desc)
+    return np.einsum('ij,ij->i', desc, desc)
+
+def negative_squared_distances(desc_a, desc_b, norms_a=None, norms_b=None):
+    """
+    -|a_i - b_j|^2 for the rows of desc_a and desc_b, from -|a|^2 - |b|^2 + 2 a.b, clipped to be non-positive
+
+    Parameters
+    ----------
+    norms_a, norms_b: the squared norms of the rows of desc_a and desc_b (see squared_norms), if they are known
+    """
+    if norms_a is None: norms_a = squared_norms(desc_a)
+    if norms_b is None: norms_b = squared_norms(desc_b)
+    k_block = np.dot(desc_a, desc_b.T)
+    k_block *= 2
+    k_block -= norms_a[:, None]
+    k_block -= norms_b[None, :]
+    return np.minimum(k_block, 0, out=k_block)
+
+class Kernel_Function_Tanimoto(Kernel_Function_Base):
+    def __init__(self, k_spec):
+        """
+        Tanimoto (Jaccard) similarity of binary fingerprints, k(a,b) = <a,b> / (<a,a> + <b,b> - <a,b>).
+        The fingerprints are either bit vectors of 0 and 1, or packed bits. For fingerprints packed into np.uint64 words (see pack_bits in descriptors),
+        the counts of common and set bits are computed from the packed words in blocks,
+        so the fingerprints are never unpacked.
+
+        Parameters
+        ----------
+        k_spec: {"type": 'tanimoto', "block_size": the number of words handled at a time (default 2**22)}
+        """
+        self.acronym = 'tanimoto'
+        self.normalize = False
+        try:
+            self.block_size = k_spec['block_size']
+        except:
+            self.block_size = 2 ** 22
+    def check_input(self, desc_a, desc_b):
+        if (np.asarray(desc_a).dtype == np.uint64) != (np.asarray(desc_b).dtype == np.uint64):
+            raise ValueError("The tanimoto kernel needs either packed fingerprints (np.uint64 words) on both sides, or neither.")
+        for desc in [desc_a, desc_b]:
+            desc = np.asarray(desc)
+            if desc.dtype != np.uint64 and not np.all((desc == 0) | (desc == 1)):
+                raise ValueError("The tanimoto kernel needs binary fingerprints (0 and 1, or packed with pack_bits), "
+                                 "use another kernel for real-valued descriptors.")
+    def row_norms(self, desc):
+        # the number of set bits, or <a,a> for dense descriptors
+        desc = np.asarray(desc)
+        return popcount(desc) if desc.dtype == np.uint64 else squared_norms(desc)
+    def transform_block(self, desc_a, desc_b, norms_a=None, norms_b=None):
+        desc_a, desc_b = np.asarray(desc_a), np.asarray(desc_b)
+        n_a = self.row_norms(desc_a) if norms_a is None else norms_a
+        n_b = self.row_norms(desc_b) if norms_b is None else norms_b
+        if desc_a.dtype == np.uint64 and desc_b.dtype == np.uint64:
+            common = np.zeros((len(desc_a), len(desc_b)))
+            rows = max(1, self.block_size // max(1, desc_b.size))
+            for start in range(0, len(desc_a), rows):
+                common[start:start + rows] = popcount(desc_a[start:start + rows, None, :] & desc_b[None, :, :])
+        else:
+            common = np.dot(desc_a, desc_b.T)
+        union = n_a[:, None] + n_b[None, :] - common
+        # two empty fingerprints are the same
+        return np.divide(common, union, out=np.ones_like(common, dtype=float), where=union > 0)
+
+# the number of set bits of each byte
+_byte_popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
 
+def popcount(packed):
+    """the number of set bits of the packed bit vectors [..., N_words] of np.uint64, summed over the last axis"""
+    packed = np.ascontiguousarray(packed)
+    return np.sum(_byte_popcount[packed.view(np.uint8)], axis=-1, dtype=np.int64)
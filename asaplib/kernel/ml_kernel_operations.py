@@ -1,35 +1,83 @@
 """
 some operations for kernel and distance matrices
-"""
 
-import copy
+The operations work on blocks of rows, so the kernel and distance matrices can be np.memmap arrays
+(e.g. from Descriptors_to_Kernels.compute(..., out='kernel.npy')) without any full-size temporary array.
+"""
 
 import numpy as np
 
+# the default number of matrix elements in a block of rows
+_block_elements = 2 ** 22
 
-def normalizekernel(kernel):
-    # first normalize the kernel matrix
-    nkernel = copy.deepcopy(kernel)
-    size = len(kernel)
-    for i in range(size):
-        nkernel[i, :] /= np.sqrt(kernel[i, i])
-        nkernel[:, i] /= np.sqrt(kernel[i, i])
-        nkernel[i, i] = 1.0
-    return nkernel.clip(max=1)
 
+def _row_blocks(n_rows, n_cols, block_size=None):
+    """the (start, stop) of the blocks of rows, block_size is the number of rows of a block"""
+    if block_size is None:
+        block_size = max(1, _block_elements // max(1, n_cols))
+    return [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
 
-def kerneltodis(kernel):
-    # there can be many transformations between the k-matrix and the distance matrix
-    # Here we use d_ij = sqrt(2 - 2*k_ij)
-    # (k_ij is a normalized symmetric kernel)
-    nk = normalizekernel(kernel)
-    size = len(kernel)
-    dis = np.zeros((size, size), dtype=np.float64)
-    for i in range(size):
-        for j in range(i - 1):
-            dis[i, j] = dis[j, i] = np.sqrt(2. - 2. * nk[i, j])
 
-    return dis.clip(min=0)
+def _output(kernel, out):
+    if out is None:
+        return np.empty(np.shape(kernel), dtype=np.float64)
+    if np.shape(out) != np.shape(kernel):
+        raise ValueError("The output array does not have the shape of the kernel matrix.")
+    return out
+
+
+def _normalize_rows(kernel, diagonal, start, stop, out):
+    """out[start:stop] = the normalized rows start:stop of the kernel matrix, diagonal is the sqrt of its diagonal"""
+    np.divide(kernel[start:stop], np.outer(diagonal[start:stop], diagonal), out=out[start:stop])
+    rows = np.arange(start, stop)
+    out[rows, rows] = 1.0
+    np.minimum(out[start:stop], 1, out=out[start:stop])
+
+
+def normalizekernel(kernel, out=None, block_size=None):
+    """
+    normalize the kernel matrix, k_ij / sqrt(k_ii k_jj)
+
+    Parameters
+    ----------
+    kernel: array-like [N, N]
+    out: the array [N, N] to write into. It can be the kernel matrix itself, which is then normalized in place.
+         None means a new array.
+    block_size: int, the number of rows that are handled at a time
+
+    Returns
+    -------
+    the normalized kernel matrix
+    """
+    # first normalize the kernel matrix
+    diagonal = np.sqrt(np.diagonal(kernel)).astype(np.float64)
+    nkernel = _output(kernel, out)
+    for start, stop in _row_blocks(len(kernel), len(kernel), block_size):
+        _normalize_rows(kernel, diagonal, start, stop, nkernel)
+    return nkernel
+
+
+def kerneltodis(kernel, out=None, block_size=None):
+    """
+    there can be many transformations between the k-matrix and the distance matrix
+    Here we use d_ij = sqrt(2 - 2*k_ij)
+    (k_ij is a normalized symmetric kernel)
+
+    Parameters
+    ----------
+    kernel: array-like [N, N]
+    out: the array [N, N] to write into, which can be the kernel matrix itself. None means a new array.
+    block_size: int, the number of rows that are handled at a time
+    """
+    diagonal = np.sqrt(np.diagonal(kernel)).astype(np.float64)
+    dis = _output(kernel, out)
+    for start, stop in _row_blocks(len(kernel), len(kernel), block_size):
+        _normalize_rows(kernel, diagonal, start, stop, dis)
+        block = dis[start:stop]
+        block *= -2.
+        block += 2.
+        np.sqrt(np.maximum(block, 0, out=block), out=block)
+    return dis
 
 
 def kerneltodis_linear(kernel):
@@ -41,28 +89,27 @@ def kerneltodis_linear(kernel):
     return dis.clip(min=0)
 
 
-def kerneltorho(kernel, delta):
-    # we compute the "density" of the data from kernel matrix
-    # delta is the charecteristic spread in similarity
-
+def kerneltorho(kernel, delta, block_size=None):
+    """
+    we compute the "density" of the data from kernel matrix,
+    rho_i = sum_j exp((k_ij - 1) / delta)
+    delta is the charecteristic spread in similarity
+    """
     rho = np.zeros(len(kernel))
-    allrhofromdis = np.exp((np.asmatrix(kernel) - 1.0) / delta)
-
-    for i in range(len(allrhofromdis)):
-        rho[i] = np.sum(allrhofromdis[i])
-
+    for start, stop in _row_blocks(len(kernel), np.shape(kernel)[1], block_size):
+        rho[start:stop] = np.sum(np.exp((np.asarray(kernel[start:stop]) - 1.0) / delta), axis=1)
     return rho
 
 
-def distorho_quick(dis, delta):
-    # we compute the "density" of the data from distance matrix
-    # the distance matrix can be computed such as
-    # dis = kerneltodis(kernel)
-    # delta is the charecteristic distance
+def distorho_quick(dis, delta, block_size=None):
+    """
+    we compute the "density" of the data from distance matrix,
+    rho_i = sum_j exp(-d_ij / delta)
+    the distance matrix can be computed such as
+    dis = kerneltodis(kernel)
+    delta is the charecteristic distance
+    """
     rho = np.zeros(len(dis))
-    allrhofromdis = np.exp(dis * (-1. / delta))
-
-    for i in range(len(allrhofromdis)):
-        rho[i] += np.sum(allrhofromdis[i])
-
+    for start, stop in _row_blocks(len(dis), np.shape(dis)[1], block_size):
+        rho[start:stop] = np.sum(np.exp(np.asarray(dis[start:stop]) * (-1. / delta)), axis=1)
     return rho
@@ -0,0 +1 @@
+from .neighbor_list import *
@@ -0,0 +1,324 @@
+"""
+Cell-list neighbor search for finite and periodic (including triclinic) systems
+"""
+
+import itertools
+
+import numpy as np
+
+
+def _cell_widths(cell):
+    """the distances between the opposite faces of the cell"""
+    volume = abs(np.linalg.det(cell))
+    return np.array([volume / np.linalg.norm(np.cross(cell[(k + 1) % 3], cell[(k + 2) % 3])) for k in range(3)])
+
+
+def _periodic_images(positions, cell, pbc, cutoff):
+    """
+    wrap the atoms into the cell along the periodic directions,
+    and make the periodic images that are within the cutoff of the cell
+
+    Returns
+    -------
+    wrapped: np.array [N_atoms, 3], the positions of the atoms wrapped into the cell
+    wrap_shifts: np.array of int [N_atoms, 3], positions = wrapped + wrap_shifts @ cell
+    image_atoms: np.array of int [N_images], the atom of each image
+    image_shifts: np.array of int [N_images, 3], image = wrapped[image_atoms] + image_shifts @ cell
+    """
+    n_atoms = len(positions)
+    pbc = np.asarray(pbc, dtype=bool)
+    if not np.any(pbc):
+        return positions, np.zeros((n_atoms, 3), dtype=int), np.zeros(0, dtype=int), np.zeros((0, 3), dtype=int)
+
+    if abs(np.linalg.det(cell)) < 1e-12:
+        raise ValueError("The system is periodic but its cell has no volume.")
+    scaled = np.linalg.solve(cell.T, positions.T).T
+    wrap_shifts = np.where(pbc, np.floor(scaled), 0).astype(int)
+    scaled = scaled - wrap_shifts
+    wrapped = positions - np.dot(wrap_shifts, cell)
+
+    # the margin of the images around the cell, in scaled coordinates
+    margin = np.where(pbc, cutoff / _cell_widths(cell), 0)
+    n_images = np.ceil(margin).astype(int)
+    shifts = np.array([shift for shift in itertools.product(*[range(-n, n + 1) for n in n_images]) if any(shift)],
+                      dtype=int).reshape(-1, 3)
+    # all the shifts of all the atoms at once, [N_shifts, N_atoms, 3]
+    scaled_all = scaled[None, :, :] + shifts[:, None, :]
+    keep = np.all((scaled_all >= -margin) & (scaled_all < 1 + margin) | ~pbc, axis=2)
+    shift_ids, image_atoms = np.nonzero(keep)
+    return wrapped, wrap_shifts, image_atoms, shifts[shift_ids]
+
+
+def _cell_list_pairs(points, n_centers, cutoff):
+    """
+    all the pairs (i, j) with i < n_centers and |points[j] - points[i]| < cutoff,
+    found by binning the points into cubic bins of side cutoff
+
+    Returns
+    -------
+    i, j: np.array of int
+    """
+    n_points = len(points)
+    if n_points == 0 or n_centers == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    origin = np.min(points, axis=0)
+    bins = np.floor((points - origin) / cutoff).astype(np.int64)
+    n_bins = np.max(bins, axis=0) + 1
+    bin_ids = np.ravel_multi_index(bins.T, n_bins)
+
+    # the points sorted by bin, the points of a bin are found by bisection,
+    # so no array over all the (mostly empty) bins is needed
+    order = np.argsort(bin_ids, kind='stable')
+    sorted_ids = bin_ids[order]
+
+    # the 27 neighboring bins of all the centers at once
+    offsets = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+    neighbor_bins = (bins[:n_centers, None, :] + offsets[None, :, :]).reshape(-1, 3)
+    inside = np.flatnonzero(np.all((neighbor_bins >= 0) & (neighbor_bins < n_bins), axis=1))
+    neighbor_ids = np.ravel_multi_index(neighbor_bins[inside].T, n_bins)
+    starts = np.searchsorted(sorted_ids, neighbor_ids, side='left')
+    n_candidates = np.searchsorted(sorted_ids, neighbor_ids, side='right') - starts
+    # enumerate all the points in the neighboring bins of each center
+    i = np.repeat(inside // len(offsets), n_candidates)
+    first = np.repeat(starts - np.cumsum(n_candidates) + n_candidates, n_candidates)
+    j = order[first + np.arange(len(i))]
+    d2 = np.sum((points[j] - points[i]) ** 2, axis=1)
+    keep = (d2 < cutoff ** 2) & (i != j)
+    return i[keep], j[keep]
+
+
+def _unique_images(atoms, shifts):
+    """the distinct (atom, shift) pairs, found by sorting one integer key per pair rather than the rows"""
+    if len(atoms) == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, 3), dtype=int)
+    low = np.min(shifts, axis=0)
+    span = np.max(shifts, axis=0) - low + 1
+    keys = np.unique(np.ravel_multi_index(np.column_stack([atoms, shifts - low]).T, (np.max(atoms) + 1,) + tuple(span)))
+    unique = np.column_stack(np.unravel_index(keys, (np.max(atoms) + 1,) + tuple(span)))
+    return unique[:, 0], unique[:, 1:] + low
+
+
+class Neighbor_List:
+    def __init__(self, cutoff, skin=0.0):
+        """
+        Neighbor list built with cell lists, for finite and periodic systems.
+        The list is built for cutoff + skin, so it stays valid while no atom has moved
+        more than skin/2 since the last build, and can be reused for the following frames of a trajectory.
+
+        Parameters
+        ----------
+        cutoff: float, the cutoff radius
+        skin: float, the Verlet skin
+        """
+        self.cutoff = cutoff
+        self.skin = skin
+        self.n_builds = 0
+        self.reset()
+
+    def reset(self):
+        self.positions = None # the positions at the last build
+        self.cell = None
+        self.pbc = None
+        self.i = np.zeros(0, dtype=int)
+        self.j = np.zeros(0, dtype=int)
+        self.shifts = np.zeros((0, 3), dtype=int)
+        # the periodic images within cutoff + skin of the atoms: the atom and the shift of each image
+        self.image_atoms = np.zeros(0, dtype=int)
+        self.image_shifts = np.zeros((0, 3), dtype=int)
+
+    def build(self, frame):
+        """
+        find all the pairs within cutoff + skin
+
+        Parameters
+        ----------
+        frame: ASE atom object
+        """
+        positions = np.array(frame.get_positions(), dtype=float)
+        cell = np.array(frame.get_cell()[:], dtype=float)
+        pbc = np.array(frame.get_pbc(), dtype=bool)
+        cutoff = self.cutoff + self.skin
+
+        wrapped, wrap_shifts, image_atoms, image_shifts = _periodic_images(positions, cell, pbc, cutoff)
+        points = np.concatenate([wrapped, wrapped[image_atoms] + np.dot(image_shifts, cell)])
+        atoms = np.concatenate([np.arange(len(positions)), image_atoms])
+        shifts = np.concatenate([np.zeros((len(positions), 3), dtype=int), image_shifts])
+
+        i, k = _cell_list_pairs(points, len(positions), cutoff)
+        self.i, self.j = i, atoms[k]
+        # the shifts in units of the cell vectors, so that the pair vector is positions[j] - positions[i] + shifts @ cell
+        self.shifts = shifts[k] - wrap_shifts[self.j] + wrap_shifts[self.i]
+        has_shift = np.any(self.shifts != 0, axis=1)
+        self.image_atoms, self.image_shifts = _unique_images(self.j[has_shift], self.shifts[has_shift])
+        self.positions, self.cell, self.pbc = positions, cell, pbc
+        self.n_builds += 1
+
+    def needs_rebuild(self, frame):
+        """whether an atom has moved more than skin/2 since the last build, or the cell has changed"""
+        if self.positions is None or len(frame) != len(self.positions):
+            return True
+        if not np.array_equal(frame.get_pbc(), self.pbc) or not np.allclose(frame.get_cell()[:], self.cell):
+            return True
+        displacements = frame.get_positions() - self.positions
+        if np.any(self.pbc):
+            # the atoms may have been wrapped back into the cell
+            displacements = pbc_vectors(displacements, self.cell, self.pbc)
+        return bool(np.max(np.sum(displacements ** 2, axis=1), initial=0) > (0.5 * self.skin) ** 2)
+
+    def update(self, frame):
+        """
+        rebuild the list for the frame if needed
+
+        Returns
+        -------
+        bool, whether the list has been rebuilt
+        """
+        if self.needs_rebuild(frame):
+            self.build(frame)
+            return True
+        return False
+
+    def _jumps(self, positions):
+        """the atoms that have been wrapped back into the cell since the last build, in units of the cell vectors"""
+        jumps = np.linalg.solve(self.cell.T, (positions - self.positions).T).T
+        return np.where(self.pbc, np.round(jumps), 0).astype(int)
+
+    def _check_cutoff(self, cutoff):
+        if cutoff is None: cutoff = self.cutoff
+        if cutoff > self.cutoff + 1e-12:
+            raise ValueError("The cutoff is larger than the cutoff of the neighbor list.")
+        return cutoff
+
+    def get_pairs(self, frame=None, cutoff=None):
+        """
+        the pairs of atoms within the cutoff
+
+        Parameters
+        ----------
+        frame: ASE atom object, the current positions of the atoms. None means the frame of the last build.
+               The list is updated first if needed.
+        cutoff: float, not larger than self.cutoff. Default is self.cutoff
+
+        Returns
+        -------
+        i, j: np.array of int [N_pairs], the atoms of each pair
+        vectors: np.array [N_pairs, 3], the vector from atom i to atom j
+        distances: np.array [N_pairs]
+        """
+        cutoff = self._check_cutoff(cutoff)
+        if frame is not None:
+            self.update(frame)
+            positions = frame.get_positions()
+            shifts = self.shifts
+            if np.any(self.pbc):
+                jumps = self._jumps(positions)
+                if np.any(jumps):
+                    shifts = self.shifts - jumps[self.j] + jumps[self.i]
+        else:
+            positions, shifts = self.positions, self.shifts
+        vectors = positions[self.j] - positions[self.i] + np.dot(shifts, self.cell)
+        distances = np.sqrt(np.sum(vectors ** 2, axis=1))
+        keep = distances < cutoff
+        return self.i[keep], self.j[keep], vectors[keep], distances[keep]
+
+    def get_extended_system(self, frame, cutoff=None, centers=None):
+        """
+        a finite system with the atoms of the frame, followed by their periodic images
+        that are within the cutoff of any of them. Computing local descriptors of the first len(frame) atoms
+        of this system as a finite system gives the same result as for the periodic frame.
+        The images are taken from the pairs found at the last build (within cutoff + skin),
+        so while the list is valid this takes no neighbor search at all.
+        A smaller cutoff, or a list of centers, only keeps the images within the cutoff of the centers,
+        so one list built at the largest cutoff serves the descriptors with smaller cutoffs.
+        The atoms that have been wrapped back into the cell since the last build are put at their unwrapped positions,
+        which does not change their environments.
+
+        Parameters
+        ----------
+        frame: ASE atom object. The list is updated first if needed.
+        cutoff: float, not larger than self.cutoff. Default is self.cutoff
+        centers: list of int, the atoms whose environments are needed. None means all the atoms.
+
+        Returns
+        -------
+        ASE atom object
+        """
+        from ase import Atoms
+        cutoff = self._check_cutoff(cutoff)
+        self.update(frame)
+        positions = frame.get_positions()
+        if np.any(self.pbc):
+            positions = positions - np.dot(self._jumps(positions), self.cell)
+        image_atoms, image_shifts = self.image_atoms, self.image_shifts
+        if cutoff < self.cutoff + self.skin or centers is not None:
+            # the pairs with a periodic image, within the cutoff of a center
+            keep = np.any(self.shifts != 0, axis=1)
+            if centers is not None:
+                keep &= np.isin(self.i, centers)
+            i, j, shifts = self.i[keep], self.j[keep], self.shifts[keep]
+            vectors = positions[j] - positions[i] + np.dot(shifts, self.cell)
+            within = np.sum(vectors ** 2, axis=1) < cutoff ** 2
+            image_atoms, image_shifts = _unique_images(j[within], shifts[within])
+        numbers = frame.get_atomic_numbers()
+        return Atoms(numbers=np.concatenate([numbers, numbers[image_atoms]]),
+                     positions=np.concatenate([positions, positions[image_atoms] + np.dot(image_shifts, self.cell)]))
+
+    def get_neighbors(self, i, frame=None, cutoff=None):
+        """the neighbors of atom i, and the vectors to them"""
+        i_all, j_all, vectors, _ = self.get_pairs(frame, cutoff)
+        mask = i_all == i
+        return j_all[mask], vectors[mask]
+
+
+def pbc_vectors(vectors, cell, pbc=(True, True, True)):
+    """
+    the minimum image of the vectors [N, 3] along the periodic directions.
+    The images are found by rounding the scaled coordinates,
+    which gives the shortest image unless the cell is very skewed.
+    """
+    pbc = np.asarray(pbc, dtype=bool)
+    scaled = np.linalg.solve(np.asarray(cell).T, np.asarray(vectors, dtype=float).T).T
+    scaled -= np.where(pbc, np.round(scaled), 0)
+    return np.dot(scaled, cell)
+
+
+def neighbor_pairs(frame, cutoff):
+    """
+    all the pairs of atoms in the frame within the cutoff, see Neighbor_List.get_pairs
+    """
+    neighbor_list = Neighbor_List(cutoff)
+    neighbor_list.build(frame)
+    return neighbor_list.get_pairs()
+
+
+def extended_systems(frame, cutoffs):
+    """
+    the finite systems with the atoms of the frame (wrapped into the cell), followed by their periodic images
+    within each of the cutoffs of the cell, see Neighbor_List.get_extended_system.
+    The images are made once for the largest cutoff, and filtered for the smaller ones.
+
+    Parameters
+    ----------
+    frame: ASE atom object
+    cutoffs: list of float
+
+    Returns
+    -------
+    a list of ASE atom objects, one for each cutoff
+    """
+    from ase import Atoms
+    cell = np.array(frame.get_cell()[:], dtype=float)
+    pbc = np.array(frame.get_pbc(), dtype=bool)
+    wrapped, _, image_atoms, image_shifts = _periodic_images(np.array(frame.get_positions(), dtype=float),
+                                                           cell, pbc, max(cutoffs))
+    numbers = frame.get_atomic_numbers()
+    # the scaled coordinates of the images, to keep the ones within the margin of each cutoff
+    scaled = np.linalg.solve(cell.T, wrapped[image_atoms].T).T + image_shifts if np.any(pbc) else np.zeros((0, 3))
+    widths = _cell_widths(cell) if np.any(pbc) else np.ones(3)
+    systems = []
+    for cutoff in cutoffs:
+        margin = np.where(pbc, cutoff / widths, 0)
+        keep = np.all((scaled >= -margin) & (scaled < 1 + margin) | ~pbc, axis=1)
+        systems.append(Atoms(numbers=np.concatenate([numbers, numbers[image_atoms[keep]]]),
+                             positions=np.concatenate([wrapped, wrapped[image_atoms[keep]] + np.dot(image_shifts[keep], cell)])))
+    return systems
@@ -94,6 +94,15 @@ class Dimension_Reducers:
         else:
             raise NotImplementedError 
 
+    def _check_packed(self, X):
+        """
+        the fingerprints packed into np.uint64 words (e.g. MORGAN-packed) are bits, not features,
+        so only a kernel PCA with the tanimoto kernel (which checks them itself) can reduce them
+        """
+        first = list(self.dreduce_spec_dict.keys())[0] if len(self.dreduce_spec_dict) > 0 else None
+        if np.asarray(X).dtype == np.uint64 and (first is None or self.dreduce_spec_dict[first]['type'] != 'SPARSE_KPCA'):
+            raise ValueError("Packed fingerprints (np.uint64 words) can only be reduced by SPARSE_KPCA with the tanimoto kernel.")
+
     def fit(self, X):
         """
         compute the global descriptor vector for a frame from atomic contributions
@@ -102,6 +111,7 @@ class Dimension_Reducers:
         X : array-like, shape=[n_samples,n_dim_high]
             Input points.
         """
+        self._check_packed(X)
         for element in self.dreduce_spec_dict.keys():
             X = self.engines[element].fit(X)
         self._fitted = True
@@ -118,6 +128,7 @@ class Dimension_Reducers:
         -------
         x: array-like, shape=[n_samples,n_dim_low]
         """
+        self._check_packed(X)
         X = X.copy()
         for element in self.dreduce_spec_dict.keys():
             X = self.engines[element].fit_transform(X)
@@ -138,6 +149,7 @@ class Dimension_Reducers:
         """
         if self._fitted == False:
             raise ValueError("Haven't fit the dimensionality reducer. Use .fit or .fit_transform first")
+        self._check_packed(X)
         X = X.copy()
         for element in self.dreduce_spec_dict.keys():
             if self.dreduce_spec_dict[element]['type'] == 'TSNE':
@@ -9,7 +9,7 @@ from ..kernel import Descriptors_to_Kernels
 from .ml_kpca import KernelPCA
 
 class SPARSE_KPCA:
-    def __init__(self, n_components=2, kernel={}, sparse_mode="fps", n_sparse=None):
+    def __init__(self, n_components=2, kernel={}, sparse_mode="fps", n_sparse=None, memory_budget=None):
         """
         Parameters
         ----------
@@ -26,10 +26,14 @@ class SPARSE_KPCA:
         {'k0':{"type": "cosine"}} 
         e.g.
         { 'k1': {"type": "polynomial", "d": power}}
+        e.g.
+        { 'k2': {"type": "rbf", "gamma": gamma}}
 
         sparsemode: str, default='fps', 
                     possible method to use ([fps], [cur],[random],[sequential])'
         n_sparse: int, number of the representative samples, negative means no sparsification
+        memory_budget: float, in MB. If given, the kernel matrices are computed in blocks of rows within the budget,
+                       and transform projects one block at a time, so the full kNM is never held in memory.
          
         """
 
@@ -45,7 +49,7 @@ class SPARSE_KPCA:
             self.sparsifier = None
 
         # object for transform design matrix to kernel matrix
-        self.k_transform = Descriptors_to_Kernels(kernel)
+        self.k_transform = Descriptors_to_Kernels(kernel, memory_budget)
         # object for doing kpca
         self.kpca = KernelPCA(self.n_components)
 
@@ -109,8 +113,9 @@ class SPARSE_KPCA:
         if not self._fitted:
             raise RuntimeError("The model has not been fitted yet, please fit it and then use transform.")
 
-        kNM = self.k_transform.compute(desc_test, self.desc_sbs)
-        return self.kpca.transform(kNM)
+        # the projection of each row only depends on the row of kNM
+        return np.concatenate([self.kpca.transform(kNM, copy=False)
+                               for _, _, kNM in self.k_transform.iter_blocks(desc_test, self.desc_sbs)])
 
     
     def fit_transform(self, desc):
@@ -0,0 +1,53 @@
+"""
+Testing appending frames to a data set and resuming the computation of descriptors
+"""
+import os
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_append_and_resume(tmpdir):
+    from ase.io import read, write
+    frames = read(fxyz, ':')
+    write(str(tmpdir / 'old.xyz'), frames[:30])
+    write(str(tmpdir / 'new.xyz'), frames[30:])
+    full = ASAPXYZ(fxyz, periodic=False)
+    full.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm')
+    cm_acronym = full.tag_to_acronym['global']['cm']
+
+    old = ASAPXYZ(str(tmpdir / 'old.xyz'), periodic=False)
+    # the same padding as the full data set
+    old.max_atoms = full.max_atoms
+    old.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm')
+    old.write(str(tmpdir / 'old-desc'))
+
+    for lazy in [False, True]:
+        asapxyz = ASAPXYZ(str(tmpdir / 'old-desc.xyz'), periodic=False, lazy=lazy)
+        asapxyz.append(str(tmpdir / 'new.xyz'))
+        assert asapxyz.get_num_frames() == full.get_num_frames()
+        assert asapxyz.get_natom_list() == full.get_natom_list()
+        asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm', resume=True)
+        assert np.allclose(asapxyz.get_descriptors([cm_acronym])[0], full.get_descriptors([cm_acronym])[0])
+
+    # the frames that have the descriptors are not computed again
+    full.global_desc.blocks['cm'][0] = -1.
+    full.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm', resume=True)
+    assert np.all(full.global_desc.blocks['cm'][0] == -1.)
+
+
+def test_resume_acronyms():
+    acsf_spec = {'acsf': {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1], [1, 2]]}}
+    reducer_spec = {'avg': {'reducer_type': 'average', 'element_wise': False}}
+    computed = ASAPXYZ(fxyz, periodic=False)
+    computed.compute_global_descriptors({'acsf-avg': {'atomic_descriptor': acsf_spec, 'reducer_function': reducer_spec}},
+                                        sbs=[0, 1], keep_atomic=True, tag='acsf-avg')
+    resumed = ASAPXYZ(fxyz, periodic=False)
+    resumed.compute_global_descriptors({'acsf-avg': {'atomic_descriptor': acsf_spec, 'reducer_function': reducer_spec}},
+                                       sbs=[0, 1], keep_atomic=True, tag='acsf-avg', resume=True)
+    assert resumed.tag_to_acronym == computed.tag_to_acronym
+    assert np.allclose(resumed.fetch_computed_descriptors(['acsf-avg'], [0, 1]),
+                       computed.fetch_computed_descriptors(['acsf-avg'], [0, 1]))
@@ -0,0 +1,110 @@
+"""
+Testing the computation of atomic descriptors
+"""
+import os
+
+import numpy as np
+import pytest
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_atomic_descriptor_centers():
+    from asaplib.descriptors import Atomic_Descriptors
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    frames = asapxyz.frames[:5]
+    acsf_spec = {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1]], 'species': [1, 6, 7, 8], 'periodic': False}
+    all_atoms = Atomic_Descriptors({'acsf': dict(acsf_spec)}).compute_batch(frames)
+    for centers in [{'species': [8]}, {'fraction': 0.3, 'method': 'random'}, {'fraction': 0.3, 'method': 'fps'}]:
+        batch = Atomic_Descriptors({'acsf': dict(acsf_spec, centers=centers)}).compute_batch(frames)
+        for frame, atomic_desc_dict, atomic_desc_dict_all in zip(frames, batch, all_atoms):
+            desc = atomic_desc_dict['acsf']['atomic_descriptors']
+            computed = ~np.isnan(desc[:, 0])
+            if 'species' in centers:
+                assert np.array_equal(computed, frame.get_atomic_numbers() == 8)
+            assert np.allclose(desc[computed], atomic_desc_dict_all['acsf']['atomic_descriptors'][computed])
+
+
+def test_atomic_descriptor_symmetry_unique():
+    from ase.build import molecule
+    from asaplib.descriptors import Atomic_Descriptors
+    methane = molecule('CH4')
+    # the mapping found by spglib for crystals, given here for a molecule
+    methane.set_array('equivalent_atoms', np.array([0, 1, 1, 1, 1]))
+    methane.info['equivalent_atoms_symprec'] = 0.01
+    acsf_spec = {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1]], 'g4_params': [[1, 1, 1]], 'species': [1, 6], 'periodic': False}
+    all_atoms = Atomic_Descriptors({'acsf': dict(acsf_spec)}).compute(methane)['acsf']['atomic_descriptors']
+    for centers in [None, {'species': [1]}]:
+        spec = dict(acsf_spec, symmetry_unique=0.01)
+        if centers is not None: spec['centers'] = centers
+        desc = Atomic_Descriptors({'acsf': spec}).compute(methane)['acsf']['atomic_descriptors']
+        computed = ~np.isnan(desc[:, 0])
+        assert np.sum(computed) == (5 if centers is None else 4)
+        assert np.allclose(desc[computed], all_atoms[computed], atol=1e-5)
+
+
+def test_atomic_descriptor_symmetry_unique_crystal():
+    pytest.importorskip('spglib')
+    from ase.build import bulk
+    from asaplib.descriptors import Atomic_Descriptors
+    from asaplib.io import get_equivalent_atoms
+    rocksalt = bulk('NaCl', 'rocksalt', a=5.64, cubic=True)
+    # all the Na atoms are equivalent, and so are all the Cl atoms
+    equivalent = get_equivalent_atoms(rocksalt, 0.01)
+    assert len(np.unique(equivalent)) == 2
+    assert np.array_equal(rocksalt.get_atomic_numbers()[equivalent], rocksalt.get_atomic_numbers())
+    # DScribe only supports ACSF for finite systems, so the crystal takes SOAP
+    soap_spec = {'type': 'SOAP', 'cutoff': 4.0, 'n': 2, 'l': 2, 'atom_gaussian_width': 0.5,
+                 'species': [11, 17], 'periodic': True}
+    all_atoms = Atomic_Descriptors({'soap': dict(soap_spec)}).compute(rocksalt)['soap']['atomic_descriptors']
+    desc = Atomic_Descriptors({'soap': dict(soap_spec, symmetry_unique=0.01)}).compute(rocksalt)['soap']['atomic_descriptors']
+    assert np.allclose(desc, all_atoms, atol=1e-5)
+
+
+def test_shared_periodic_soap():
+    from ase.build import bulk
+    from asaplib.descriptors import Atomic_Descriptors
+    nacl = bulk('NaCl', 'rocksalt', a=5.64, cubic=True)
+    nacl.rattle(0.05, seed=5)
+    frames = [nacl, nacl * (2, 1, 1)]
+    soap_spec = {'soap-small': {'type': 'SOAP', 'cutoff': 2.5, 'n': 2, 'l': 2, 'atom_gaussian_width': 0.3,
+                                'species': [11, 17], 'periodic': True},
+                 'soap-large': {'type': 'SOAP', 'cutoff': 4.0, 'n': 2, 'l': 2, 'atom_gaussian_width': 0.5,
+                                'species': [11, 17], 'periodic': True, 'centers': {'species': [11]}}}
+    # the SOAPs with different cutoffs share the periodic images of the frames
+    shared = Atomic_Descriptors({element: dict(spec) for element, spec in soap_spec.items()})
+    assert len(shared.shared_soap) == 2
+    batch = shared.compute_batch(frames)
+    for element, spec in soap_spec.items():
+        alone = Atomic_Descriptors({element: dict(spec)})
+        assert len(alone.shared_soap) == 0
+        for atomic_desc_dict, atomic_desc_dict_alone in zip(batch, alone.compute_batch(frames)):
+            desc = atomic_desc_dict[element]['atomic_descriptors']
+            desc_alone = atomic_desc_dict_alone[element]['atomic_descriptors']
+            assert np.array_equal(np.isnan(desc), np.isnan(desc_alone))
+            assert np.allclose(desc[~np.isnan(desc)], desc_alone[~np.isnan(desc_alone)], atol=1e-5)
+
+
+def test_periodic_soap_neighbor_skin():
+    from ase.build import bulk
+    from asaplib.descriptors import Atomic_Descriptors
+    nacl = bulk('NaCl', 'rocksalt', a=5.64, cubic=True) * (2, 1, 1)
+    rng = np.random.RandomState(6)
+    # a short trajectory with small moves, where the atoms are also wrapped back into the cell
+    frames = []
+    for step in range(6):
+        nacl = nacl.copy()
+        nacl.positions += rng.normal(0, 0.02, nacl.positions.shape)
+        if step == 3: nacl.wrap()
+        frames.append(nacl)
+    soap_spec = {'type': 'SOAP', 'cutoff': 3.5, 'n': 2, 'l': 2, 'atom_gaussian_width': 0.4,
+                 'species': [11, 17], 'periodic': True}
+    no_skin = Atomic_Descriptors({'soap': dict(soap_spec)}).compute_batch(frames)
+    with_skin = Atomic_Descriptors({'soap': dict(soap_spec)})
+    with_skin.set_neighbor_skin(0.5)
+    for atomic_desc_dict, atomic_desc_dict_skin in zip(no_skin, with_skin.compute_batch(frames)):
+        assert np.allclose(atomic_desc_dict['soap']['atomic_descriptors'],
+                           atomic_desc_dict_skin['soap']['atomic_descriptors'], atol=1e-5)
+    assert with_skin.neighbor_list.n_builds < len(frames)
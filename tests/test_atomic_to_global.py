@@ -0,0 +1,23 @@
+"""
+Testing the reduction of atomic descriptors into global ones
+"""
+import os
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_reduce_atomic_descriptors():
+    acsf_spec = {'acsf': {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1], [1, 2]]}}
+    reducer_spec = {'avg': {'reducer_type': 'average', 'element_wise': True},
+                    'sum': {'reducer_type': 'moment_sum', 'zeta': 2, 'element_wise': False}}
+    sbs = [4, 0, 9, 2]
+    asapxyz = ASAPXYZ(fxyz, periodic=False, chunk_size=3)
+    asapxyz.compute_global_descriptors({'g': {'atomic_descriptor': acsf_spec, 'reducer_function': reducer_spec}},
+                                       sbs=sbs, keep_atomic=True, tag='g')
+    acronym = asapxyz.tag_to_acronym['atomic']['g']['acsf']
+    asapxyz.reduce_atomic_descriptors([acronym], reducer_spec, sbs=sbs, tag='reduced')
+    assert np.allclose(asapxyz.fetch_computed_descriptors(['reduced'], sbs), asapxyz.fetch_computed_descriptors(['g'], sbs))
@@ -0,0 +1,46 @@
+"""
+Testing the binary container of the computed descriptors
+"""
+import os
+import shutil
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_desc_container(tmpdir):
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    asapxyz = ASAPXYZ(fxyz_tmp, periodic=False)
+    asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm')
+    atomic_desc = np.random.rand(asapxyz.get_total_natoms(), 2)
+    asapxyz.set_atomic_descriptors(atomic_desc, 'atomic_label')
+    cm_acronym = asapxyz.tag_to_acronym['global']['cm']
+    desc = asapxyz.fetch_computed_descriptors(['cm'])
+
+    prefix = str(tmpdir / 'binary')
+    asapxyz.write(prefix, [4, 0, 2], binary_desc=True)
+    assert os.path.isfile(prefix + '.asapdesc/manifest.json')
+    # the descriptors are not in the xyz file, but are loaded from the container
+    reloaded = ASAPXYZ(prefix + '.xyz', periodic=False)
+    assert cm_acronym not in reloaded.get_xyz()[0].info
+    desc_reloaded, _ = reloaded.get_descriptors([cm_acronym])
+    assert isinstance(desc_reloaded, np.memmap)
+    assert np.allclose(desc_reloaded, desc[[4, 0, 2]])
+    offsets = asapxyz.atomic_desc.frame_offsets
+    assert np.allclose(reloaded.get_atomic_descriptors(['atomic_label']),
+                       np.concatenate([atomic_desc[offsets[i]:offsets[i + 1]] for i in [4, 0, 2]]))
+    assert reloaded.tag_to_acronym['global']['cm'] == cm_acronym
+
+    # a container that was written for another version of the xyz file is ignored
+    with open(prefix + '.xyz', 'a') as f:
+        f.write(' ')
+    assert not ASAPXYZ(prefix + '.xyz', periodic=False).global_desc.has_acronym(cm_acronym)
+    # and writing without the container removes the old one
+    with tmpdir.as_cwd():
+        asapxyz.write('binary', [4, 0, 2])
+    assert not os.path.isdir(prefix + '.asapdesc')
+    assert cm_acronym in ASAPXYZ(prefix + '.xyz', periodic=False).get_xyz()[0].info
@@ -0,0 +1,72 @@
+"""
+Testing the on-disk descriptor cache
+"""
+import os
+
+import numpy as np
+import pytest
+
+from asaplib.data import ASAPXYZ
+from asaplib.descriptors import Descriptor_Cache
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_descriptor_cache(tmpdir):
+    cache = Descriptor_Cache(str(tmpdir / 'cache'))
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    nframes = asapxyz.get_num_frames()
+
+    asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm', cache=cache)
+    desc = np.array(asapxyz.fetch_computed_descriptors(['cm']))
+    assert cache.get_state()['misses'] == nframes
+
+    # the second time everything comes from the cache, also when using a pool of processes
+    for n_process in [1, 2]:
+        asapxyz = ASAPXYZ(fxyz, periodic=False)
+        asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm', n_process=n_process, cache=cache)
+        assert np.allclose(asapxyz.fetch_computed_descriptors(['cm']), desc)
+    assert cache.get_state()['hits'] == 2 * nframes
+    assert asapxyz.computed_desc_dict['cache']['hits'] == 2 * nframes
+
+    # moving an atom changes the key
+    frame = asapxyz.get_xyz()[0]
+    key = cache.frame_key(frame, {'cm': {'type': 'CM'}})
+    frame.positions[0, 0] += 0.1
+    assert cache.frame_key(frame, {'cm': {'type': 'CM'}}) != key
+
+    # and so do the entries of frame.info that the descriptors read
+    morgan_spec = {'morgan': {'type': 'MORGAN'}}
+    frame.info['smiles'] = 'CO'
+    key = cache.frame_key(frame, morgan_spec)
+    key_cm = cache.frame_key(frame, {'cm': {'type': 'CM'}})
+    frame.info['smiles'] = 'CCO'
+    assert cache.frame_key(frame, morgan_spec) != key
+    assert cache.frame_key(frame, {'cm': {'type': 'CM'}}) == key_cm
+    acsf_spec = {'acsf': {'type': 'ACSF', 'cutoff': 3.0, 'centers': {'info_key': 'centers'}}}
+    frame.info['centers'] = np.array([0, 1])
+    key = cache.frame_key(frame, acsf_spec)
+    frame.info['centers'] = np.array([0, 2])
+    assert cache.frame_key(frame, acsf_spec) != key
+
+
+def test_descriptor_cache_eviction(tmpdir):
+    cache = Descriptor_Cache(str(tmpdir / 'cache'), max_size=0.01)
+    for i in range(20):
+        cache.store('%040x' % i, np.zeros(200))
+    assert sum(size for _, _, size in cache._entries()) <= 0.01 * 1024 ** 2
+    # the most recent entry is kept
+    assert cache.load('%040x' % 19) is not None
+
+
+def test_symmetry_cache(tmpdir):
+    pytest.importorskip('spglib')
+    cache = Descriptor_Cache(str(tmpdir / 'cache'))
+    asapxyz = ASAPXYZ(os.path.join(os.path.split(__file__)[0], 'ice_test.xyz'), periodic=True)
+    asapxyz.symmetrise(symprec=1e-1)
+    space_groups = [frame.info['space_group'] for frame in asapxyz.get_xyz()]
+    for n_process in [1, 2]:
+        asapxyz.symmetrise(symprec=1e-1, n_process=n_process, cache=cache)
+        assert [frame.info['space_group'] for frame in asapxyz.get_xyz()] == space_groups
+    # the second time everything comes from the cache
+    assert cache.get_state()['hits'] == asapxyz.get_num_frames()
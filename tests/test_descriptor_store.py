@@ -0,0 +1,65 @@
+"""
+Testing the stores of the computed descriptors
+"""
+import os
+import shutil
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_atomic_descriptor_store(tmpdir):
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    for lazy in [False, True]:
+        asapxyz = ASAPXYZ(fxyz_tmp, periodic=False, lazy=lazy)
+        atomic_desc = np.random.rand(asapxyz.get_total_natoms(), 3)
+        asapxyz.set_atomic_descriptors(atomic_desc, 'atomic_label')
+        # the whole matrix is not copied
+        assert asapxyz.get_atomic_descriptors(['atomic_label']) is asapxyz.atomic_desc.get('atomic_label')
+        n_o = np.sum(asapxyz.get_natom_list_by_species(8))
+        desc_o = asapxyz.get_atomic_descriptors(['atomic_label'], species_name=8)
+        assert np.shape(desc_o) == (n_o, 3)
+        asapxyz.set_atomic_descriptors(desc_o[:, 0], 'oxygen_label', species_name=8)
+
+        asapxyz.write(str(tmpdir / ('atomic-' + str(lazy))))
+        written = ASAPXYZ(str(tmpdir / ('atomic-' + str(lazy) + '.xyz')), periodic=False)
+        assert np.allclose(written.get_atomic_descriptors(['atomic_label']), atomic_desc)
+        assert np.allclose(written.get_atomic_descriptors(['oxygen_label'], species_name=8)[:, 0], desc_o[:, 0])
+
+
+def test_global_descriptor_store(tmpdir):
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    asapxyz = ASAPXYZ(fxyz_tmp, periodic=False)
+    asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm')
+    # a single key is returned without copying
+    desc = asapxyz.fetch_computed_descriptors(['cm'])
+    assert desc is asapxyz.global_desc.blocks['cm']
+    assert np.shape(desc) == (asapxyz.get_num_frames(), asapxyz.max_atoms ** 2)
+    cm_acronym = asapxyz.tag_to_acronym['global']['cm']
+    assert np.allclose(asapxyz.get_descriptors([cm_acronym])[0], desc)
+
+    asapxyz.set_descriptors(np.arange(asapxyz.get_num_frames()), 'frame_label')
+    both = asapxyz.fetch_computed_descriptors(['cm', 'frame_label'], [4, 2])
+    assert np.allclose(both[:, -1], [4, 2])
+    assert np.allclose(both[:, :-1], desc[[4, 2]])
+
+
+def test_set_descriptors_property(tmpdir):
+    # the lazy mode writes an index next to the xyz file
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    for lazy in [False, True]:
+        asapxyz = ASAPXYZ(fxyz_tmp, periodic=False, lazy=lazy)
+        labels = np.arange(asapxyz.get_num_frames()) * 2.
+        asapxyz.set_descriptors(labels, 'frame_label')
+        assert np.allclose(asapxyz.get_property('frame_label'), labels)
+        assert np.allclose(asapxyz.get_property('frame_label', sbs=[4, 2]), [8., 4.])
+        natoms = np.asarray(asapxyz.get_natom_list())
+        assert np.allclose(asapxyz.get_property('frame_label', extensive=True), labels / natoms)
+        assert np.allclose(asapxyz.get_atomic_property('frame_label', sbs=[0, 1]),
+                           np.repeat(labels[:2], natoms[:2]))
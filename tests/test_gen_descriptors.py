@@ -8,6 +8,8 @@ import numpy as np
 from asaplib.data import ASAPXYZ
 from asaplib.hypers import universal_soap_hyper
 
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
 
 def main(fxyz, prefix):
     """
@@ -70,6 +72,55 @@ def test_gen(tmpdir):
     inp_file = os.path.join(os.path.split(__file__)[0], 'small_molecules-1000.xyz')
     main(inp_file, str(tmpdir / 'ASAP-test'))
 
+
+def test_compute_batch():
+    from asaplib.descriptors import Global_Descriptors
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    frames = asapxyz.frames[:6]
+    acsf_spec = {'acsf': {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1], [1, 2]]}}
+    reducer_spec = {'avg': {'reducer_type': 'average', 'element_wise': False}}
+    global_desc = Global_Descriptors({'acsf-avg': {'atomic_descriptor': acsf_spec, 'reducer_function': reducer_spec,
+                                                   'species': [1, 6, 7, 8], 'periodic': False}})
+    batch = global_desc.compute_batch(frames)
+    assert len(batch) == len(frames)
+    for frame, (desc_dict, atomic_desc_dict) in zip(frames, batch):
+        desc_dict_single, atomic_desc_dict_single = global_desc.compute(frame)
+        assert atomic_desc_dict['acsf-avg']['acsf']['atomic_descriptors'].shape[0] == len(frame)
+        assert np.allclose(atomic_desc_dict['acsf-avg']['acsf']['atomic_descriptors'],
+                           atomic_desc_dict_single['acsf-avg']['acsf']['atomic_descriptors'])
+        assert np.allclose(desc_dict['acsf-avg']['acsf']['avg']['descriptors'],
+                           desc_dict_single['acsf-avg']['acsf']['avg']['descriptors'])
+
+
+def test_compute_batch_keep_atomic():
+    from asaplib.descriptors import Global_Descriptors
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    frames = asapxyz.frames[:6]
+    acsf_spec = {'acsf': {'type': 'ACSF', 'cutoff': 3.0, 'g2_params': [[1, 1], [1, 2]]}}
+    reducer_spec = {'avg': {'reducer_type': 'average', 'element_wise': False}}
+    global_desc = Global_Descriptors({'acsf-avg': {'atomic_descriptor': acsf_spec, 'reducer_function': reducer_spec,
+                                                   'species': [1, 6, 7, 8], 'periodic': False}})
+    batch = global_desc.compute_batch(frames)
+    # without keep_atomic, only the global descriptors are returned
+    for (desc_dict, atomic_desc_dict), (desc_dict_kept, _) in zip(global_desc.compute_batch(frames, keep_atomic=False), batch):
+        assert atomic_desc_dict == {'acsf-avg': {}}
+        assert np.allclose(desc_dict['acsf-avg']['acsf']['avg']['descriptors'],
+                           desc_dict_kept['acsf-avg']['acsf']['avg']['descriptors'])
+
+
+def test_coulomb_matrix_batch():
+    from dscribe.descriptors import CoulombMatrix
+    from asaplib.descriptors import Global_Descriptors
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    frames = asapxyz.frames[:50]
+    cm = Global_Descriptors({'cm': {'type': 'CM', 'max_atoms': 30}})
+    # small chunks, so that the batch is cut into several of them
+    cm.engines['cm'].chunk_elements = 10 * 30 ** 2
+    for frame, (desc_dict, _) in zip(frames, cm.compute_batch(frames)):
+        assert desc_dict['cm']['descriptors'].shape == (30 ** 2,)
+        assert np.allclose(desc_dict['cm']['descriptors'], np.ravel(CoulombMatrix(30).create(frame)))
+
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -0,0 +1,113 @@
+"""
+Testing the kernel functions
+"""
+import numpy as np
+import pytest
+
+from asaplib.descriptors import pack_bits, unpack_bits
+from asaplib.kernel import Descriptors_to_Kernels, normalizekernel, unpack_triangle
+
+
+def test_tanimoto_packed():
+    rng = np.random.RandomState(0)
+    bits = (rng.rand(20, 1000) < 0.1).astype(float)
+    bits[3] = 0 # an empty fingerprint
+    packed = pack_bits(bits)
+    assert packed.dtype == np.uint64 and packed.shape == (20, 16)
+    assert np.array_equal(unpack_bits(packed, 1000), bits)
+
+    # a small block size, so that the popcounts are done in several blocks
+    k_transform = Descriptors_to_Kernels({'k': {'type': 'tanimoto', 'block_size': 500}})
+    kernel = k_transform.compute(packed, packed[:7])
+    common = np.dot(bits, bits[:7].T)
+    union = np.sum(bits, axis=1)[:, None] + np.sum(bits[:7], axis=1)[None, :] - common
+    assert np.allclose(kernel[union > 0], common[union > 0] / union[union > 0])
+    assert kernel[3, 3] == 1
+    assert np.allclose(kernel, k_transform.compute(bits, bits[:7]))
+
+    # the packed words are not features
+    with pytest.raises(ValueError):
+        k_transform.compute(packed, bits)
+    with pytest.raises(ValueError):
+        Descriptors_to_Kernels({'k': {'type': 'linear'}}).compute(packed)
+    # and real-valued descriptors are not fingerprints
+    with pytest.raises(ValueError):
+        k_transform.compute(rng.rand(5, 10))
+
+
+def test_blocked_kernel(tmpdir):
+    rng = np.random.RandomState(1)
+    desc_a, desc_b = rng.rand(50, 8), rng.rand(20, 8)
+    k_spec = {'k1': {'type': 'linear', 'normalize': True}, 'k2': {'type': 'polynomial', 'd': 2, 'normalize': True},
+              'k3': {'type': 'cosine'}}
+    full = Descriptors_to_Kernels(k_spec).compute(desc_a)
+    reference = normalizekernel(np.dot(desc_a, desc_a.T)) + normalizekernel(np.dot(desc_a, desc_a.T) ** 2)
+    assert np.allclose(full, reference + Descriptors_to_Kernels({'k3': {'type': 'cosine'}}).compute(desc_a))
+
+    # blocks of 7 rows
+    k_transform = Descriptors_to_Kernels(k_spec, memory_budget=2 * 8 * 50 * 7 / 1024 ** 2)
+    assert k_transform.block_rows(50) == 7
+    assert np.allclose(k_transform.compute(desc_a), full)
+    k_mat = k_transform.compute(desc_a, desc_b, out=str(tmpdir / 'kNM.npy'))
+    assert np.allclose(np.load(str(tmpdir / 'kNM.npy')), Descriptors_to_Kernels(k_spec).compute(desc_a, desc_b))
+    assert np.allclose(k_mat, Descriptors_to_Kernels(k_spec).compute(desc_a, desc_b))
+
+
+def test_symmetric_kernel():
+    rng = np.random.RandomState(2)
+    desc = rng.rand(40, 6)
+    k_spec = {'k1': {'type': 'linear', 'normalize': True}, 'k2': {'type': 'polynomial', 'd': 3}}
+    # the full product of desc with a copy of itself
+    full = Descriptors_to_Kernels(k_spec).compute(desc, desc.copy())
+    for memory_budget in [None, 2 * 8 * 40 * 6 / 1024 ** 2]:
+        k_transform = Descriptors_to_Kernels(k_spec, memory_budget)
+        assert np.allclose(k_transform.compute(desc), full)
+        packed = k_transform.compute(desc, packed=True)
+        assert len(packed) == 40 * 41 // 2
+        assert np.allclose(unpack_triangle(packed), full)
+
+
+def test_kernel_operations(tmpdir):
+    from asaplib.kernel import kerneltodis, kerneltorho, distorho_quick
+    rng = np.random.RandomState(3)
+    desc = rng.rand(30, 5)
+    kernel = np.dot(desc, desc.T)
+    diagonal = np.sqrt(np.diag(kernel))
+    nk = np.minimum(kernel / np.outer(diagonal, diagonal), 1)
+    np.fill_diagonal(nk, 1)
+    dis = np.sqrt(np.maximum(2 - 2 * nk, 0))
+    for block_size in [None, 7]:
+        assert np.allclose(normalizekernel(kernel, block_size=block_size), nk)
+        assert np.allclose(kerneltodis(kernel, block_size=block_size), dis)
+        assert np.allclose(kerneltorho(nk, 0.1, block_size=block_size), np.sum(np.exp((nk - 1) / 0.1), axis=1))
+        assert np.allclose(distorho_quick(dis, 0.1, block_size=block_size), np.sum(np.exp(-dis / 0.1), axis=1))
+    # in place, on a memory-mapped kernel matrix
+    k_mat = np.lib.format.open_memmap(str(tmpdir / 'kernel.npy'), mode='w+', dtype=float, shape=kernel.shape)
+    k_mat[:] = kernel
+    assert kerneltodis(k_mat, out=k_mat, block_size=4) is k_mat
+    assert np.allclose(k_mat, dis)
+    assert np.all(np.diag(k_mat) == 0)
+
+
+def test_distance_kernels():
+    from sklearn.metrics.pairwise import rbf_kernel, cosine_similarity, euclidean_distances
+    rng = np.random.RandomState(4)
+    desc_a, desc_b = rng.rand(40, 6), rng.rand(15, 6)
+    desc_a[5] = 0
+    references = {'rbf': lambda a, b: rbf_kernel(a, b, gamma=0.5),
+                  'laplacian': lambda a, b: np.exp(-0.5 * euclidean_distances(a, b)),
+                  'cosine': cosine_similarity}
+    for kernel, reference in references.items():
+        # blocks of 5 rows
+        k_transform = Descriptors_to_Kernels({'k': {'type': kernel, 'gamma': 0.5}}, memory_budget=2 * 8 * 40 * 5 / 1024 ** 2)
+        assert np.allclose(k_transform.compute(desc_a, desc_b), reference(desc_a, desc_b))
+        assert np.allclose(k_transform.compute(desc_a), reference(desc_a, desc_a))
+        # the norms of the rows are computed once per matrix, not once per block
+        engine = k_transform.engines['k']
+        n_calls = []
+        row_norms = engine.row_norms
+        engine.row_norms = lambda desc: n_calls.append(len(desc)) or row_norms(desc)
+        assert np.allclose(k_transform.compute(desc_a), reference(desc_a, desc_a))
+        assert n_calls == [40]
+    # the default gamma is 1/n_descriptors
+    assert np.allclose(Descriptors_to_Kernels({'k': {'type': 'rbf'}}).compute(desc_a, desc_b), rbf_kernel(desc_a, desc_b))
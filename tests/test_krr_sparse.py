@@ -53,6 +53,22 @@ def test_gen(tmpdir):
     """Test the generation using pytest"""
     main()
 
+def test_fit_blocks():
+    """the fit with kNM in blocks of rows is the same as with the full kNM"""
+    rng = np.random.RandomState(0)
+    X, y = rng.rand(60, 5), rng.rand(60)
+    k_spec = {'k0': {"type": "polynomial", "d": 2}}
+    full = SPARSE_KRR_Wrapper(k_spec, KRRSparse(1e-10, None, None), n_sparse=-1)
+    full.fit(X, y)
+    # blocks of 7 rows
+    blocked = SPARSE_KRR_Wrapper(k_spec, KRRSparse(1e-10, None, None), n_sparse=-1,
+                                 memory_budget=2 * 8 * 60 * 7 / 1024 ** 2)
+    blocked.fit(X, y)
+    krr = KRRSparse(1e-10, None, None)
+    krr.fit(full.k_transform.compute(X), y, full.k_transform.compute(X, X))
+    assert np.allclose(blocked.krr.alpha, krr.alpha)
+    assert np.allclose(blocked.predict(X), full.predict(X))
+
 if __name__ == '__main__':
 
     main()
@@ -0,0 +1,90 @@
+"""
+Testing the cell-list neighbor search against the one of ASE
+"""
+import numpy as np
+from ase.build import bulk, molecule
+from ase.neighborlist import neighbor_list
+
+from asaplib.io import pbcdist
+from asaplib.neighbors import Neighbor_List, neighbor_pairs, extended_systems
+
+
+def _sorted_pairs(i, j, d):
+    return sorted(zip(i, j, np.round(d, 8)))
+
+
+def test_neighbor_pairs():
+    cu = bulk('Cu', 'fcc', a=3.6) * (2, 2, 2) # small triclinic cell, several images within the cutoff
+    cu.rattle(0.2, seed=1)
+    si = bulk('Si', 'diamond', a=5.4, cubic=True) * (2, 2, 1)
+    si.pbc = [True, True, False]
+    si.rattle(0.1, seed=2)
+    si.positions += 7.0 # outside of the cell
+    for frame, cutoff in [(cu, 5.0), (si, 4.5), (molecule('C60'), 3.0)]:
+        i, j, vectors, d = neighbor_pairs(frame, cutoff)
+        i_ase, j_ase, vectors_ase, d_ase = neighbor_list('ijDd', frame, cutoff)
+        assert _sorted_pairs(i, j, d) == _sorted_pairs(i_ase, j_ase, d_ase)
+        assert np.allclose(np.linalg.norm(vectors, axis=1), d)
+
+
+def test_verlet_skin():
+    frame = bulk('Cu', 'fcc', a=3.6, cubic=True) * (3, 3, 3)
+    neighbor_list_skin = Neighbor_List(4.0, skin=0.6)
+    rng = np.random.RandomState(0)
+    for step in range(10):
+        frame.positions += rng.normal(scale=0.05, size=frame.positions.shape)
+        if step == 5:
+            frame.wrap()
+        i, j, _, d = neighbor_list_skin.get_pairs(frame)
+        i_ase, j_ase, d_ase = neighbor_list('ijd', frame, 4.0)
+        assert _sorted_pairs(i, j, d) == _sorted_pairs(i_ase, j_ase, d_ase)
+    assert neighbor_list_skin.n_builds < 10
+
+
+def test_pbcdist():
+    h = np.array([[4.0, 1.0, 0.5], [0.0, 5.0, 0.3], [0.0, 0.0, 6.0]])
+    ih = np.linalg.inv(h)
+    rng = np.random.RandomState(0)
+    q1, q2 = rng.uniform(0, 10, (20, 3)), rng.uniform(0, 10, (20, 3))
+    d = pbcdist(q1, q2, h, ih)
+    for k in range(20):
+        assert np.allclose(d[k], pbcdist(q1[k], q2[k], h, ih))
+        # the separation only changes by lattice vectors
+        n = np.dot(ih, q1[k] - q2[k] - d[k])
+        assert np.allclose(n, np.round(n))
+
+
+def test_extended_system():
+    from dscribe.descriptors import ACSF
+    from dscribe.utils.geometry import get_extended_system
+    nacl = bulk('NaCl', 'rocksalt', a=5.6) * (2, 2, 1)
+    acsf = ACSF(species=[11, 17], rcut=5.0, g2_params=[[1, 1], [0.5, 2]], g4_params=[[1, 1, 1]])
+    neighbor_list = Neighbor_List(5.0, skin=0.5)
+    rng = np.random.RandomState(3)
+    for step in range(5):
+        # a short trajectory with small moves, where the atoms are also shifted into the next cell
+        nacl.positions += rng.normal(0, 0.02, nacl.positions.shape) + nacl.cell[0]
+        centers = list(range(len(nacl)))
+        extended = neighbor_list.get_extended_system(nacl)
+        assert np.allclose(acsf.create(extended, positions=centers),
+                           acsf.create(get_extended_system(nacl, 5.0), positions=centers), atol=1e-5)
+    assert neighbor_list.n_builds == 1
+
+
+def test_extended_systems_cutoffs():
+    from dscribe.descriptors import ACSF
+    from dscribe.utils.geometry import get_extended_system
+    nacl = bulk('NaCl', 'rocksalt', a=5.6) * (2, 2, 1)
+    nacl.rattle(0.1, seed=4)
+    nacl.positions += nacl.cell[1] # outside of the cell
+    centers = list(range(len(nacl)))
+    neighbor_list = Neighbor_List(5.0, skin=0.5)
+    # the images made for the largest cutoff, filtered for the smaller ones
+    for cutoff, extended in zip([3.0, 5.0], extended_systems(nacl, [3.0, 5.0])):
+        acsf = ACSF(species=[11, 17], rcut=cutoff, g2_params=[[1, 1], [0.5, 2]], g4_params=[[1, 1, 1]])
+        reference = acsf.create(get_extended_system(nacl, cutoff), positions=centers)
+        assert np.allclose(acsf.create(extended, positions=centers), reference, atol=1e-5)
+        # and the images of the neighbor list within the cutoff of some of the centers
+        extended = neighbor_list.get_extended_system(nacl, cutoff, centers[::3])
+        assert np.allclose(acsf.create(extended, positions=centers[::3]), reference[::3], atol=1e-5)
+    assert len(extended_systems(nacl, [3.0, 5.0])[0]) < len(extended_systems(nacl, [3.0, 5.0])[1])
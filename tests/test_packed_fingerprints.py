@@ -0,0 +1,27 @@
+"""
+Testing the fingerprints packed into np.uint64 words in the xyz files
+"""
+import os
+
+import numpy as np
+import pytest
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+fmat = ['SOAP-n4-l3-c1.9-g0.23']
+
+
+def test_packed_fingerprints(tmpdir):
+    from asaplib.descriptors import pack_bits
+    asapxyz = ASAPXYZ(fxyz, periodic=False)
+    bits = np.random.RandomState(0).rand(asapxyz.get_num_frames(), 100) < 0.5
+    packed = pack_bits(bits)
+    asapxyz.set_descriptors(packed, 'FP-packed')
+    asapxyz.write(str(tmpdir / 'packed'))
+    written = ASAPXYZ(str(tmpdir / 'packed.xyz'), periodic=False)
+    desc, _ = written.get_descriptors(['FP-packed'])
+    assert desc.dtype == np.uint64
+    assert np.array_equal(desc, packed)
+    with pytest.raises(ValueError):
+        written.get_descriptors(['FP-packed', fmat[0]])
@@ -0,0 +1,20 @@
+"""
+Testing the computation of descriptors over several processes
+"""
+import os
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_parallel_compute():
+    sbs = [5, 3, 7, 40, 41, 1, 2]
+    serial = ASAPXYZ(fxyz, periodic=False)
+    serial.compute_global_descriptors({'cm': {'type': 'CM'}}, sbs=sbs, tag='cm')
+    parallel = ASAPXYZ(fxyz, periodic=False, chunk_size=4)
+    parallel.compute_global_descriptors({'cm': {'type': 'CM'}}, sbs=sbs, tag='cm', n_process=2)
+    assert np.array_equal(parallel.global_desc.filled['cm'], serial.global_desc.filled['cm'])
+    assert np.allclose(parallel.fetch_computed_descriptors(['cm'], sbs), serial.fetch_computed_descriptors(['cm'], sbs))
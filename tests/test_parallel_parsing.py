@@ -0,0 +1,23 @@
+"""
+Testing the parsing of an xyz file over several processes
+"""
+import os
+import shutil
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+fmat = ['SOAP-n4-l3-c1.9-g0.23']
+
+
+def test_parallel_parsing(tmpdir):
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    serial = ASAPXYZ(fxyz_tmp, periodic=False)
+    parallel = ASAPXYZ(fxyz_tmp, periodic=False, n_process=2)
+    assert parallel.get_num_frames() == serial.get_num_frames()
+    for frame_s, frame_p in zip(serial.get_xyz(), parallel.get_xyz()):
+        assert np.allclose(frame_s.get_positions(), frame_p.get_positions())
+        assert np.allclose(frame_s.info[fmat[0]], frame_p.info[fmat[0]])
@@ -0,0 +1,36 @@
+"""
+Testing the byte-offset index of the xyz files
+"""
+import os
+import shutil
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+from asaplib.io import XYZ_Index
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+
+
+def test_xyz_index(tmpdir):
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    eager = ASAPXYZ(fxyz_tmp, stride=2, periodic=False)
+
+    xyz_index = XYZ_Index(fxyz_tmp)
+    assert os.path.isfile(fxyz_tmp + '.asap-index.npz')
+    assert xyz_index.natoms[::2].tolist() == eager.get_natom_list()
+    # random access to single frames
+    for i in [7, 0, 3]:
+        frame = xyz_index.read_frames([2 * i])[0]
+        assert np.allclose(frame.get_positions(), eager.get_xyz()[i].get_positions())
+
+    lazy = ASAPXYZ(fxyz_tmp, stride=2, periodic=False, lazy=True)
+    assert lazy.get_natom_list() == eager.get_natom_list()
+    assert lazy.get_natom_list_by_species(8) == eager.get_natom_list_by_species(8)
+    assert [i for i, _ in lazy.iter_frames([5, 1, 2])] == [5, 1, 2]
+
+    # the index is rebuilt when the xyz file changes
+    with open(fxyz_tmp, 'a') as f:
+        f.write(open(fxyz).read())
+    assert XYZ_Index(fxyz_tmp).get_num_frames() == 2 * xyz_index.get_num_frames()
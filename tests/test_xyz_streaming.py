@@ -0,0 +1,72 @@
+"""
+Testing the lazy (streaming) mode of ASAPXYZ
+"""
+import os
+import shutil
+
+import numpy as np
+
+from asaplib.data import ASAPXYZ
+
+fxyz = os.path.join(os.path.split(__file__)[0], 'small_molecules-SOAP.xyz')
+fmat = ['SOAP-n4-l3-c1.9-g0.23']
+fy = 'dft_formation_energy_per_atom_in_eV'
+
+
+def test_lazy_matches_eager(tmpdir):
+    # the lazy mode writes an index next to the xyz file
+    fxyz_tmp = str(tmpdir / 'frames.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    eager = ASAPXYZ(fxyz_tmp, periodic=False)
+    lazy = ASAPXYZ(fxyz_tmp, periodic=False, lazy=True, chunk_size=7)
+
+    assert lazy.frames is None
+    assert lazy.get_natom_list() == eager.get_natom_list()
+    assert lazy.get_global_species() == eager.get_global_species()
+
+    desc_eager, _ = eager.get_descriptors(fmat)
+    desc_lazy, _ = lazy.get_descriptors(fmat)
+    assert np.allclose(desc_eager, desc_lazy)
+    assert np.allclose(eager.get_property(fy), lazy.get_property(fy))
+
+    for asapxyz in [eager, lazy]:
+        asapxyz.compute_global_descriptors({'cm': {'type': 'CM'}}, sbs=[3, 1, 5], tag='cm')
+    assert np.allclose(eager.fetch_computed_descriptors(['cm'], [1, 3, 5]),
+                       lazy.fetch_computed_descriptors(['cm'], [1, 3, 5]))
+
+    lazy.set_descriptors(np.arange(lazy.get_num_frames()), 'frame_label')
+    lazy.write(str(tmpdir / 'lazy'), [1, 3, 5])
+    written = ASAPXYZ(str(tmpdir / 'lazy.xyz'), periodic=False)
+    assert written.get_num_frames() == 3
+    assert np.allclose(written.get_property('frame_label'), [1, 3, 5])
+
+
+def test_lazy_order(tmpdir):
+    # without a byte-offset index the frames are streamed, but still come in the order of the selection
+    fxyz_tmp = str(tmpdir / 'frames.txt')
+    shutil.copy(fxyz, fxyz_tmp)
+    eager = ASAPXYZ(fxyz, periodic=False)
+    for chunk_size in [2, 100]:
+        lazy = ASAPXYZ(fxyz_tmp, periodic=False, lazy=True, chunk_size=chunk_size, fileformat="{'format': 'extxyz'}")
+        sbs = [5, 3, 7, 3, 0]
+        assert [i for i, _ in lazy.iter_frames(sbs)] == sbs
+        assert np.allclose([frame.get_positions()[0] for _, frame in lazy.iter_frames(sbs)],
+                           [frame.get_positions()[0] for _, frame in eager.iter_frames(sbs)])
+        assert np.allclose(lazy.get_property(fy, sbs=sbs), eager.get_property(fy, sbs=sbs))
+
+
+def test_lazy_write_to_input(tmpdir):
+    # the output replaces the input file that the frames are read from
+    fxyz_tmp = str(tmpdir / 'out.xyz')
+    shutil.copy(fxyz, fxyz_tmp)
+    lazy = ASAPXYZ(fxyz_tmp, periodic=False, lazy=True, chunk_size=7)
+    lazy.compute_global_descriptors({'cm': {'type': 'CM'}}, tag='cm')
+    cm_acronym = lazy.tag_to_acronym['global']['cm']
+    desc = lazy.fetch_computed_descriptors(['cm'])
+    lazy.write(str(tmpdir / 'out'))
+    assert os.path.isfile(str(tmpdir / 'bck.out.xyz'))
+    written = ASAPXYZ(fxyz_tmp, periodic=False)
+    assert written.get_num_frames() == lazy.get_num_frames()
+    assert np.allclose(written.get_descriptors([cm_acronym])[0], desc)
+    # the frames can still be read after the input has been moved
+    assert np.allclose(lazy.get_property(fy), written.get_property(fy))
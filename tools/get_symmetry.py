@@ -5,10 +5,12 @@ TODO: Module-level description
 
 import argparse
 
-import spglib
 from ase import Atoms as atom
 from ase.io import read, write
 
+from asaplib.descriptors import Descriptor_Cache
+from asaplib.io import compute_symmetry
+
 
 def show_symmetry(symmetry):
     for i in range(symmetry['rotations'].shape[0]):
@@ -35,21 +37,22 @@ def show_cell(lattice, positions, numbers):
         print("%2d %10.5f %10.5f %10.5f" % ((s,) + tuple(p)))
 
 
-def main(fxyz, prefix, verbose):
+def main(fxyz, prefix, verbose, n_process, cache_dir):
     # read frames
     if fxyz != 'none':
         frames = read(fxyz, ':')
         nframes = len(frames)
         print("read xyz file:", fxyz, ", a total of", nframes, "frames")
 
+    cache = None if cache_dir is None else Descriptor_Cache(cache_dir)
+    space_groups = compute_symmetry(frames, 'spacegroup', 1e-1, n_process, cache)
+    cells = compute_symmetry(frames, 'standardize', 1e-2, n_process, cache)
+
     standardized_frames = []
 
-    for frame in frames:
-        print(spglib.get_spacegroup(frame, symprec=1e-1))  # spglib.get_symmetry(frame, symprec=1e-1))
-        lattice, scaled_positions, numbers = spglib.standardize_cell(frame,
-                                                                     to_primitive=1,
-                                                                     no_idealize=1,
-                                                                     symprec=1e-2)
+    for frame, space_group, cell in zip(frames, space_groups, cells):
+        print(space_group)
+        lattice, scaled_positions, numbers = cell
         if verbose:
             show_cell(lattice, scaled_positions, numbers)
         # output
@@ -64,6 +67,8 @@ if __name__ == '__main__':
     parser.add_argument('-fxyz', type=str, required=True, help='Location of xyz file')
     parser.add_argument('--prefix', type=str, default='output', help='Filename prefix')
     parser.add_argument('--verbose', type=bool, default=False, help='Screen output cell information [True/False]')
+    parser.add_argument('--n_process', type=int, default=1, help='Number of processes')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Directory of the cache of the results')
     args = parser.parse_args()
 
-    main(args.fxyz, args.prefix, args.verbose)
+    main(args.fxyz, args.prefix, args.verbose, args.n_process, args.cache_dir)